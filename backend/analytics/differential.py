@@ -0,0 +1,165 @@
+# analytics/differential.py
+"""
+Differential network between two graphs, over the genes present in both.
+
+Each graph interns its own genes, so the shared genes are first given common
+codes (one pandas indexer lookup), and every edge among them becomes a sorted
+integer key u * S + v (u < v, S shared genes). Set operations on the key
+arrays then give the edges gained, lost and kept, and bincounts over their
+endpoints the per-gene degree changes, neighbourhood Jaccard indices and
+rewired edge counts.
+
+The diff is computed once per pair of graph versions; pages of genes or edges
+are cut from it per request.
+"""
+import numpy as np
+import pandas as pd
+
+EDGE_VIEWS = ("gained", "lost", "reweighted")
+GENE_SORTS = ("rewired_edges", "jaccard", "degree_change")
+
+
+def _shared_edges(graph, codes, size):
+    """Sorted keys and weights of the graph's live edges between shared genes."""
+    sources, targets, weights = graph.edges()
+    u, v = codes[sources], codes[targets]
+    keep = (u >= 0) & (v >= 0)
+    u, v, weights = u[keep], v[keep], weights[keep]
+    keys = np.minimum(u, v) * size + np.maximum(u, v)
+    order = np.argsort(keys)
+    return keys[order], weights[order].astype(np.float64)
+
+
+class NetworkDiff:
+    def __init__(self, graph1, graph2):
+        # 1) Common codes for the genes live in both graphs
+        ids1, ids2 = graph1.node_ids(), graph2.node_ids()
+        genes1 = pd.Index(np.asarray(graph1.genes, dtype=object)[ids1])
+        genes2 = pd.Index(np.asarray(graph2.genes, dtype=object)[ids2])
+        where = genes1.get_indexer(genes2)
+        in_both = where >= 0
+        positions = np.sort(where[in_both])
+        size = len(positions)
+        codes1 = np.full(len(graph1.genes), -1, dtype=np.int64)
+        codes1[ids1[positions]] = np.arange(size)
+        codes2 = np.full(len(graph2.genes), -1, dtype=np.int64)
+        codes2[ids2[in_both]] = codes1[ids1[where[in_both]]]
+        self.genes = genes1[positions].tolist()
+        self.only_in_graph1 = len(ids1) - size
+        self.only_in_graph2 = len(ids2) - size
+
+        # 2) Gained, lost and kept edges by set operations on the keys
+        keys1, weights1 = _shared_edges(graph1, codes1, size)
+        keys2, weights2 = _shared_edges(graph2, codes2, size)
+        kept, kept1, kept2 = np.intersect1d(keys1, keys2, assume_unique=True, return_indices=True)
+        lost = np.ones(len(keys1), dtype=bool)
+        lost[kept1] = False
+        gained = np.ones(len(keys2), dtype=bool)
+        gained[kept2] = False
+        self.size = size
+        self.edges1, self.edges2 = len(keys1), len(keys2)
+        self.gained = (keys2[gained], weights2[gained])
+        self.lost = (keys1[lost], weights1[lost])
+        self.kept = (kept, weights1[kept1], weights2[kept2])
+
+        # 3) Per-gene degrees, shared neighbours and rewired edges
+        self.degree1 = self._endpoint_counts(keys1)
+        self.degree2 = self._endpoint_counts(keys2)
+        self.shared_neighbors = self._endpoint_counts(kept)
+        self.gained_edges = self._endpoint_counts(self.gained[0])
+        self.lost_edges = self._endpoint_counts(self.lost[0])
+        union = self.degree1 + self.degree2 - self.shared_neighbors
+        # Genes without neighbours in either graph keep their (empty) neighbourhood
+        self.jaccard = np.divide(self.shared_neighbors, union, out=np.ones(size), where=union > 0)
+
+    def _endpoint_counts(self, keys):
+        """Edges per shared gene among the given edge keys."""
+        if not self.size:
+            return np.zeros(0, dtype=np.int64)
+        return np.bincount(np.concatenate([keys // self.size, keys % self.size]), minlength=self.size)
+
+    def _reweighted(self, min_weight_change):
+        keys, weights1, weights2 = self.kept
+        changed = np.abs(weights2 - weights1) > min_weight_change
+        return keys[changed], weights1[changed], weights2[changed]
+
+    def summary(self, min_weight_change=0.0):
+        kept = len(self.kept[0])
+        union = self.edges1 + self.edges2 - kept
+        reweighted = len(self._reweighted(min_weight_change)[0])
+        return {
+            "shared_genes": self.size,
+            "only_in_graph1": self.only_in_graph1,
+            "only_in_graph2": self.only_in_graph2,
+            "edges1": self.edges1,
+            "edges2": self.edges2,
+            "gained_edges": len(self.gained[0]),
+            "lost_edges": len(self.lost[0]),
+            "reweighted_edges": reweighted,
+            "unchanged_edges": kept - reweighted,
+            "edge_jaccard": kept / union if union else 1.0,
+            "mean_gene_jaccard": float(self.jaccard.mean()) if self.size else 1.0,
+            "rewired_genes": int(((self.gained_edges + self.lost_edges) > 0).sum()),
+        }
+
+    def gene_page(self, sort="rewired_edges", offset=0, limit=100):
+        """
+        Shared genes, most rewired first.
+
+        Args:
+            sort: "rewired_edges" (gained + lost edges, then lowest Jaccard),
+                "jaccard" (lowest first, then most rewired edges) or
+                "degree_change" (largest absolute change first)
+
+        Returns:
+            (number of genes, items of the page)
+        """
+        rewired = self.gained_edges + self.lost_edges
+        change = self.degree2 - self.degree1
+        if sort == "jaccard":
+            order = np.lexsort((-rewired, self.jaccard))
+        elif sort == "degree_change":
+            order = np.lexsort((self.jaccard, -np.abs(change)))
+        else:
+            order = np.lexsort((self.jaccard, -rewired))
+        page = order[offset:offset + limit]
+        return self.size, [{
+            "rank": offset + rank + 1,
+            "gene": self.genes[i],
+            "degree1": int(self.degree1[i]),
+            "degree2": int(self.degree2[i]),
+            "degree_change": int(change[i]),
+            "shared_neighbors": int(self.shared_neighbors[i]),
+            "jaccard": float(self.jaccard[i]),
+            "gained_edges": int(self.gained_edges[i]),
+            "lost_edges": int(self.lost_edges[i]),
+            "rewired_edges": int(rewired[i]),
+        } for rank, i in enumerate(page.tolist())]
+
+    def edge_page(self, view, offset=0, limit=100, min_weight_change=0.0):
+        """
+        Gained or lost edges (heaviest first) or reweighted edges (largest
+        absolute weight change first).
+
+        Returns:
+            (number of edges in the view, items of the page)
+        """
+        if view == "reweighted":
+            keys, weights1, weights2 = self._reweighted(min_weight_change)
+            order = np.argsort(-np.abs(weights2 - weights1), kind="stable")
+        elif view == "gained":
+            keys, weights2 = self.gained
+            weights1 = np.zeros(len(keys))
+            order = np.argsort(-weights2, kind="stable")
+        else:
+            keys, weights1 = self.lost
+            weights2 = np.zeros(len(keys))
+            order = np.argsort(-weights1, kind="stable")
+        page = order[offset:offset + limit]
+        return len(keys), [{
+            "source": self.genes[keys[i] // self.size],
+            "target": self.genes[keys[i] % self.size],
+            "weight1": float(weights1[i]) if view != "gained" else None,
+            "weight2": float(weights2[i]) if view != "lost" else None,
+            "weight_change": float(weights2[i] - weights1[i]),
+        } for i in page.tolist()]
@@ -0,0 +1,220 @@
+# analytics/graphlet_sampling.py
+"""
+Approximate 4-node graphlet counts by 3-path sampling (Jha, Seshadhri and
+Pinar, "Path sampling: a fast and provable method for estimating 4-vertex
+subgraph counts", WWW 2015), for graphs too dense to count exactly.
+
+A 3-edge path a-u-v-d is drawn uniformly at random by picking its middle edge
+(u, v) with probability proportional to (d_u - 1)(d_v - 1), then a random
+other neighbour of each end. The induced subgraph on {a, u, v, d} is a path,
+cycle, paw, diamond or clique, each of which contains a known number of 3-edge
+paths, so every sample is an unbiased estimate of the five class counts
+(a = d closes a triangle instead). The remaining classes follow from exact
+degree totals with the same formulas as the exact counter.
+
+Samples are drawn in batches of SAMPLES_PER_BATCH. Confidence intervals come
+from the spread of the per-batch estimates (batch means), and sampling stops
+once the classes with three or more edges (G4..G8) are within the requested
+relative error or the time budget is spent. A sampling state can be extended later with more
+batches (merge_samples) to tighten the intervals.
+"""
+import time
+from math import comb
+
+import numpy as np
+from scipy.stats import t as student_t
+
+from analytics.graphlets import GRAPHLET_KEYS, classes_from_connected_4, legacy_counts_4
+from analytics.metrics import live_adjacency
+
+SAMPLES_PER_BATCH = 10000
+MIN_BATCHES = 10
+CONFIDENCE = 0.95
+DEFAULT_MAX_ERROR = 0.05
+DEFAULT_TIME_BUDGET = 5.0
+# Batch tallies: samples drawn, samples closing a triangle, then samples per class
+TALLY = ("samples", "triangles", "path", "cycle", "paw", "diamond", "clique")
+# Number of 3-edge paths inside each class
+PATH_MULTIPLICITY = {"path": 1, "cycle": 4, "paw": 2, "diamond": 6, "clique": 12}
+# Buckets of the classes with three or more edges, on which the relative error is measured
+CONNECTED_KEYS = ("G4", "G5", "G6", "G7", "G8")
+
+
+class PathSampler:
+    def __init__(self, graph):
+        _, A, _ = live_adjacency(graph)
+        n = A.shape[0]
+        self.n = n
+        self.indptr = A.indptr.astype(np.int64)
+        self.indices = A.indices.astype(np.int64)
+        self.degree = np.diff(self.indptr)
+        rows = np.repeat(np.arange(n, dtype=np.int64), self.degree)
+        # Sorted, since the CSR rows and their columns are
+        self.keys = rows * n + self.indices
+
+        # Middle edges u < v, with the position of each end in the other's list
+        middle = np.flatnonzero(rows < self.indices)
+        self.u, self.v = rows[middle], self.indices[middle]
+        self.u_position = middle - self.indptr[self.u]
+        self.v_position = np.searchsorted(self.keys, self.v * n + self.u) - self.indptr[self.v]
+        weights = (self.degree[self.u] - 1) * (self.degree[self.v] - 1)
+        self.cumulative = np.cumsum(weights)
+        self.three_paths = int(self.cumulative[-1]) if len(weights) else 0
+
+        motifs = graph.motif_counts() if graph.has_motif_counts else None
+        self.totals = {
+            "nodes": n,
+            "edges": len(middle),
+            "wedges": int((self.degree * (self.degree - 1) // 2).sum()),
+            "stars": int((self.degree * (self.degree - 1) * (self.degree - 2) // 6).sum()),
+            "three_paths": self.three_paths,
+            # Estimated from the samples when not maintained by the graph
+            "triangles": motifs["triangles"] if motifs else None,
+        }
+
+    def _other_end(self, nodes, excluded, rng):
+        """A random neighbour of each node other than the one at position `excluded`."""
+        picks = (rng.random(len(nodes)) * (self.degree[nodes] - 1)).astype(np.int64)
+        picks += picks >= excluded
+        return self.indices[self.indptr[nodes] + picks]
+
+    def _has_edge(self, a, b):
+        keys = a * self.n + b
+        found = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        return self.keys[found] == keys
+
+    def batch(self, rng, size=SAMPLES_PER_BATCH):
+        """Tally (see TALLY) of `size` sampled 3-edge paths."""
+        edges = np.searchsorted(self.cumulative, rng.random(size) * self.three_paths, side="right")
+        u, v = self.u[edges], self.v[edges]
+        a = self._other_end(u, self.u_position[edges], rng)
+        d = self._other_end(v, self.v_position[edges], rng)
+        closed = a == d
+        a, u, v, d = a[~closed], u[~closed], v[~closed], d[~closed]
+
+        chord = self._has_edge(a, d)
+        extra = self._has_edge(a, v).astype(np.int64) + self._has_edge(u, d) + chord
+        return [
+            size,
+            int(closed.sum()),
+            int((extra == 0).sum()),
+            int(((extra == 1) & chord).sum()),
+            int(((extra == 1) & ~chord).sum()),
+            int((extra == 2).sum()),
+            int((extra == 3).sum()),
+        ]
+
+
+def _batch_counts(totals, tallies):
+    """Legacy G0..G8 count estimates per batch (one row of `tallies` each)."""
+    column = {name: tallies[:, i] for i, name in enumerate(TALLY)}
+    scale = totals["three_paths"] / column["samples"]
+    connected = {name: scale * column[name] / multiplicity for name, multiplicity in PATH_MULTIPLICITY.items()}
+    triangles = totals["triangles"]
+    if triangles is None:
+        # Every triangle closes three of the sampled paths
+        triangles = scale * column["triangles"] / 3
+    classes = classes_from_connected_4(totals["nodes"], totals["edges"], totals["wedges"], triangles,
+                                       totals["stars"], connected["path"], connected["cycle"],
+                                       connected["paw"], connected["diamond"], connected["clique"])
+    counts = legacy_counts_4(classes)
+    return {key: np.broadcast_to(np.asarray(counts[key], dtype=np.float64), len(tallies)) for key in GRAPHLET_KEYS[4]}
+
+
+def _intervals(totals, batches, confidence=CONFIDENCE):
+    """Point estimates, interval half-widths and relative error over the batches."""
+    tallies = np.asarray(batches, dtype=np.float64).reshape(-1, len(TALLY))
+    if not len(tallies):
+        # No 3-edge paths at all: the connected classes are exactly empty
+        tallies = np.zeros((1, len(TALLY)))
+        tallies[0, 0] = 1
+    per_batch = _batch_counts(totals, tallies)
+    point = {key: float(values.mean()) for key, values in per_batch.items()}
+    if len(tallies) > 1:
+        quantile = student_t.ppf((1 + confidence) / 2, len(tallies) - 1)
+        half = {key: float(quantile * values.std(ddof=1) / np.sqrt(len(tallies))) for key, values in per_batch.items()}
+    else:
+        half = {key: 0.0 for key in per_batch}
+    errors = [half[key] / point[key] for key in CONNECTED_KEYS if point[key] > 0]
+    return point, half, max(errors, default=0.0)
+
+
+def sample_graphlets(graph, size=4, max_error=DEFAULT_MAX_ERROR, time_budget=DEFAULT_TIME_BUDGET, seed=0):
+    """
+    Sample 3-edge paths of a CompactGraph until the G4..G8 estimates are
+    within `max_error` (relative half-width of their confidence intervals)
+    or `time_budget` seconds have passed.
+
+    Returns:
+        sampling state for estimate_graphlets / merge_samples
+    """
+    if size != 4:
+        raise ValueError("Graphlet sampling estimates 4-node graphlets")
+    start = time.perf_counter()
+    sampler = PathSampler(graph)
+    rng = np.random.default_rng(seed)
+    batches = []
+    while sampler.three_paths:
+        batches.append(sampler.batch(rng))
+        if len(batches) >= MIN_BATCHES and (time.perf_counter() - start >= time_budget
+                                            or _intervals(sampler.totals, batches)[2] <= max_error):
+            break
+    return {"totals": sampler.totals, "batches": batches, "seconds": time.perf_counter() - start}
+
+
+def merge_samples(state, more):
+    """A sampling state holding the batches of both (for the same graph version)."""
+    return {
+        "totals": more["totals"],
+        "batches": state["batches"] + more["batches"],
+        "seconds": state["seconds"] + more["seconds"],
+    }
+
+
+def estimate_graphlets(state, max_error=DEFAULT_MAX_ERROR, confidence=CONFIDENCE):
+    """
+    Graphlet counts and frequencies estimated from a sampling state, in the
+    shape count_graphlets_from_adjacency returns plus confidence intervals.
+    """
+    totals = state["totals"]
+    total = comb(totals["nodes"], 4)
+    if totals["nodes"] < 4:
+        return exact_estimate({"counts": {key: 0 for key in GRAPHLET_KEYS[4]},
+                               "frequencies": {key: 0 for key in GRAPHLET_KEYS[4]},
+                               "total_graphlets": 0}, max_error)
+
+    point, half, relative_error = _intervals(totals, state["batches"], confidence)
+    intervals = {key: [max(0.0, point[key] - half[key]), point[key] + half[key]] for key in point}
+    return {
+        "counts": {key: int(round(value)) for key, value in point.items()},
+        "frequencies": {key: value / total for key, value in point.items()},
+        "total_graphlets": total,
+        "method": "path-sampling",
+        "confidence": confidence,
+        "confidence_intervals": {key: [int(round(low)), int(round(high))] for key, (low, high) in intervals.items()},
+        "frequency_intervals": {key: [low / total, high / total] for key, (low, high) in intervals.items()},
+        "relative_error": relative_error,
+        "target_error": max_error,
+        "converged": relative_error <= max_error,
+        "samples": int(sum(batch[0] for batch in state["batches"])),
+        "batches": len(state["batches"]),
+        "sampling_seconds": state["seconds"],
+    }
+
+
+def exact_estimate(summary, max_error=DEFAULT_MAX_ERROR):
+    """Exact counts in the shape of estimate_graphlets (zero-width intervals)."""
+    counts, frequencies = summary["counts"], summary["frequencies"]
+    return {
+        **summary,
+        "method": "exact",
+        "confidence": 1.0,
+        "confidence_intervals": {key: [value, value] for key, value in counts.items()},
+        "frequency_intervals": {key: [value, value] for key, value in frequencies.items()},
+        "relative_error": 0.0,
+        "target_error": max_error,
+        "converged": True,
+        "samples": 0,
+        "batches": 0,
+        "sampling_seconds": 0.0,
+    }
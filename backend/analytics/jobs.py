@@ -0,0 +1,344 @@
+# analytics/jobs.py
+"""
+CPU-heavy graph analytics run as jobs in a pool of worker processes.
+
+A job ships its graphs to the workers as one shared-memory block per graph
+holding the CSR arrays, the removal state (see graph_store.CompactGraph) and
+the gene names, so nothing is pickled but a small layout description. The
+block is freed as soon as the job finishes or is cancelled, or right away if
+the job could not be submitted.
+
+Jobs are identified by their kind (and optional scope), the versions of their
+graphs and their parameters: submitting an identical job while one is queued, running or
+retained as finished returns that job instead of starting another.
+
+Cancelling a queued job removes it from the pool. A job that already started
+cannot be interrupted; it is marked cancelled and its result discarded.
+
+A job may belong to an owner (the session that submitted it); get() and
+cancel() then treat it as unknown for anyone else. The caller's `finish` step
+runs on the event loop the job was submitted from, like the request handlers
+that share its data.
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from analytics.graphlet_sampling import sample_graphlets
+from analytics.graphlets import count_graphlets_from_adjacency, graphlet_counts_3, summarize_counts
+from analytics.metrics import calculate_graph_metrics
+from graph_store import CompactGraph
+
+ANALYTICS_WORKERS = int(os.getenv("ANALYTICS_WORKERS", str(max(1, min(4, (os.cpu_count() or 2) - 1)))))
+MAX_FINISHED_JOBS = 256
+SHARED_ARRAYS = ("indptr", "indices", "weights", "alive", "degree")
+FINISHED = ("done", "failed", "cancelled")
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def graphlet_summary(graph, size):
+    """Graphlet counts and frequencies of a CompactGraph, as /graphlet-analysis returns them."""
+    if size == 3:
+        # Triangle and wedge totals are kept up to date across removals
+        motifs = graph.motif_counts()
+        counts = graphlet_counts_3(graph.num_nodes, graph.num_edges, motifs["triangles"], motifs["wedges"])
+        return summarize_counts(counts)
+    return count_graphlets_from_adjacency(graph.adjacency_sets(), size, num_nodes=graph.num_nodes)
+
+
+# Work a job can run on each of its graphs: task(graph, **params)
+TASKS = {
+    "graphlets": graphlet_summary,
+    "graphlets-approx": sample_graphlets,
+    "metrics": calculate_graph_metrics,
+}
+
+
+def export_graph(graph):
+    """
+    Copy a graph's arrays into a new shared-memory block.
+
+    Returns:
+        (SharedMemory, handle) where the picklable handle lets a worker
+        attach to the block with attached_graph
+    """
+    arrays = [np.ascontiguousarray(getattr(graph, name)) for name in SHARED_ARRAYS]
+    # Gene names as one newline-separated UTF-8 buffer
+    arrays.append(np.frombuffer("\n".join(map(str, graph.genes)).encode(), dtype=np.uint8))
+    layout, offset = [], 0
+    for name, array in zip(SHARED_ARRAYS + ("genes",), arrays):
+        offset = -(-offset // 8) * 8
+        layout.append((name, array.dtype.str, array.shape, offset))
+        offset += array.nbytes
+    shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+    try:
+        for (_, dtype, shape, start), array in zip(layout, arrays):
+            np.ndarray(shape, dtype, buffer=shm.buf, offset=start)[...] = array
+    except BaseException:
+        release_blocks([shm])
+        raise
+    handle = {"name": shm.name, "layout": layout, "num_nodes": graph.num_nodes, "num_edges": graph.num_edges,
+              "motifs": dict(graph.motif_counts()) if graph.has_motif_counts else None}
+    return shm, handle
+
+
+def release_blocks(blocks):
+    """Close and unlink shared-memory blocks created by export_graph."""
+    for shm in blocks:
+        shm.close()
+        shm.unlink()
+
+
+@contextmanager
+def attached_graph(handle):
+    """
+    A CompactGraph over the arrays of an exported graph, without copying
+    them.
+    """
+    shm = shared_memory.SharedMemory(name=handle["name"])
+    arrays = {name: np.ndarray(shape, dtype, buffer=shm.buf, offset=start)
+              for name, dtype, shape, start in handle["layout"]}
+    n = len(arrays["indptr"]) - 1
+    genes = arrays.pop("genes").tobytes().decode()
+    genes = genes.split("\n") if n else []
+    graph = CompactGraph(genes, arrays["indptr"], arrays["indices"], arrays["weights"],
+                         np.zeros(n, dtype=np.int32))
+    graph.alive = arrays["alive"]
+    graph.degree = arrays["degree"]
+    graph.num_nodes = handle["num_nodes"]
+    graph.num_edges = handle["num_edges"]
+    graph._motifs = handle["motifs"]
+    try:
+        yield graph
+    finally:
+        # Views into the block must be gone before it can be closed
+        graph.__dict__.clear()
+        arrays.clear()
+        try:
+            shm.close()
+        except BufferError:
+            # Still referenced (e.g. by a traceback); unmapped when collected
+            pass
+
+
+def _run(task, handles, params):
+    """Worker entry point: TASKS[task] on each exported graph."""
+    results = []
+    for handle in handles:
+        with attached_graph(handle) as graph:
+            results.append(TASKS[task](graph, **params))
+    return results
+
+
+class AnalyticsJobs:
+    def __init__(self, max_workers=ANALYTICS_WORKERS, max_finished=MAX_FINISHED_JOBS):
+        self.max_workers = max_workers
+        self.max_finished = max_finished
+        self.jobs = OrderedDict()  # job id -> job record
+        self._futures = {}  # job id -> (pool future, future of the finished result)
+        self._by_key = {}  # (kind, scope, graph versions, params) -> job id
+        self._pool = None
+        # Reentrant: cancelling a queued job runs its done callback right away
+        self._lock = threading.RLock()
+
+    def _executor(self, fresh=False):
+        # Worker processes are started on first use; "spawn" keeps them clear
+        # of the server's threads and locks
+        if self._pool is None or fresh:
+            self._pool = ProcessPoolExecutor(self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    def submit(self, kind, task, graphs, params=None, finish=None, scope=None, owner=None):
+        """
+        Run TASKS[task](graph, **params) on every graph in a worker process.
+
+        Args:
+            kind: name of the job kind, e.g. "compare-graphlets"
+            graphs: CompactGraphs, copied to shared memory right away so later
+                edits do not affect the job
+            finish: called in this process with the list of per-graph results;
+                its return value becomes the job result (default: the list)
+            scope: hashable that also tells jobs apart, for callers whose
+                `finish` depends on more than the graphs (e.g. their order)
+            owner: who may read or cancel the job (None: anyone)
+
+        Returns:
+            the job record; an existing one if an identical job (same kind,
+            scope, graph versions and params) is queued, running or finished
+        """
+        params = dict(params or {})
+        versions = tuple(graph.version for graph in graphs)
+        key = (kind, scope, owner, versions, tuple(sorted(params.items())))
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        with self._lock:
+            job_id = self._by_key.get(key)
+            if job_id in self.jobs and self.jobs[job_id]["status"] not in ("failed", "cancelled"):
+                self.jobs[job_id]["deduplicated"] += 1
+                return self.jobs[job_id]
+
+            job_id = uuid.uuid4().hex[:12]
+            job = {
+                "job_id": job_id,
+                "kind": kind,
+                "owner": owner,
+                "params": params,
+                "graph_versions": list(versions),
+                "status": "queued",
+                "submitted_at": time.time(),
+                "seconds": None,
+                "deduplicated": 0,
+                "error": None,
+                "result": None
+            }
+            exports = []
+            try:
+                for graph in graphs:
+                    exports.append(export_graph(graph))
+                handles = [handle for _, handle in exports]
+                try:
+                    future = self._executor().submit(_run, task, handles, params)
+                except BrokenProcessPool:
+                    # A worker died (e.g. killed for memory); start a new pool
+                    future = self._executor(fresh=True).submit(_run, task, handles, params)
+            except BaseException:
+                # No worker will attach to the blocks, and _complete will never run
+                release_blocks([shm for shm, _ in exports])
+                raise
+            self.jobs[job_id] = job
+            self._by_key[key] = job_id
+            self._futures[job_id] = (future, Future())
+        future.add_done_callback(lambda done: self._complete(job_id, done, [shm for shm, _ in exports], finish, loop))
+        return job
+
+    def _complete(self, job_id, future, blocks, finish, loop):
+        # Runs on the pool's callback thread (or the canceller's): free the
+        # blocks, then hand the rest to the submitter's event loop if it runs
+        release_blocks(blocks)
+        if loop is not None and not loop.is_closed():
+            try:
+                loop.call_soon_threadsafe(self._finish, job_id, future, finish)
+                return
+            except RuntimeError:
+                # Closed in the meantime
+                pass
+        self._finish(job_id, future, finish)
+
+    def _finish(self, job_id, future, finish):
+        job = self.jobs.get(job_id)
+        if job is None:
+            return
+        status, result, error = "done", None, None
+        if job["status"] != "cancelled":
+            try:
+                result = future.result()
+                if finish is not None:
+                    result = finish(result)
+            except CancelledError:
+                status = "cancelled"
+            except Exception as e:
+                print(f"Analytics job {job_id} failed: {e}")
+                status, error = "failed", str(e)
+        with self._lock:
+            if job["status"] != "cancelled":
+                job["status"], job["result"], job["error"] = status, result, error
+                job["seconds"] = time.time() - job["submitted_at"]
+            status = job["status"]
+            entry = self._futures.get(job_id)
+        result_future = entry[1] if entry is not None else Future()
+        if not result_future.done():
+            if status == "done":
+                result_future.set_result(job["result"])
+            elif status == "cancelled":
+                result_future.set_exception(JobCancelled(job_id))
+            else:
+                result_future.set_exception(RuntimeError(job["error"]))
+        self._evict()
+
+    def _evict(self):
+        with self._lock:
+            finished = [job_id for job_id, job in self.jobs.items() if job["status"] in FINISHED]
+            evicted = finished[:max(0, len(finished) - self.max_finished)]
+            for job_id in evicted:
+                del self.jobs[job_id]
+                del self._futures[job_id]
+            if evicted:
+                self._by_key = {key: job_id for key, job_id in self._by_key.items() if job_id in self.jobs}
+
+    def _owned(self, job_id, owner):
+        job = self.jobs.get(job_id)
+        if job is None or job["owner"] not in (None, owner):
+            return None
+        return job
+
+    def get(self, job_id, include_result=True, owner=None):
+        """
+        A copy of the job record, or None for an unknown (or evicted) job or
+        one belonging to another owner.
+        """
+        with self._lock:
+            job = self._owned(job_id, owner)
+            if job is None:
+                return None
+            if job["status"] == "queued" and self._futures[job_id][0].running():
+                job["status"] = "running"
+            job = dict(job)
+        if not include_result:
+            job.pop("result")
+        return job
+
+    def cancel(self, job_id, owner=None):
+        """
+        Cancel a job that has not finished.
+
+        Returns:
+            the job record, or None for an unknown job (or another owner's)
+        """
+        with self._lock:
+            job = self._owned(job_id, owner)
+            if job is None:
+                return None
+            future, result_future = self._futures[job_id]
+            if job["status"] not in FINISHED:
+                job["status"] = "cancelled"
+                job["seconds"] = time.time() - job["submitted_at"]
+                # A queued job leaves the pool; one already running in a
+                # worker is left to finish and its result dropped
+                future.cancel()
+                if not result_future.done():
+                    result_future.set_exception(JobCancelled(job_id))
+        return self.get(job_id, owner=owner)
+
+    async def wait(self, job):
+        """
+        The job's result once it finishes. Raises JobCancelled if it is
+        cancelled, RuntimeError if it fails. Cancelling the waiter does not
+        cancel the job.
+        """
+        entry = self._futures.get(job["job_id"])
+        if entry is None:
+            # Evicted, so long finished
+            if job["status"] == "done":
+                return job["result"]
+            raise JobCancelled(job["job_id"]) if job["status"] == "cancelled" else RuntimeError(job["error"])
+        return await asyncio.shield(asyncio.wrap_future(entry[1]))
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
@@ -0,0 +1,259 @@
+# analytics/metrics.py
+"""
+Whole-graph summary metrics shown by /comparative-analysis, computed on the
+CSR arrays of a CompactGraph (live genes only) with numpy / scipy.sparse:
+
+  - degree: average degree centrality, mean and maximum degree;
+  - clustering: triangles per node as the diagonal of A^3, obtained as the
+    row sums of (A @ A) * A in row blocks, giving local clustering (averaged
+    like networkx.average_clustering) and transitivity;
+  - k-core: core numbers by peeling, one vectorized step per wave of
+    removals that only touches the neighbours of the removed genes;
+  - PageRank: power iteration on the weight-normalized sparse matrix, with
+    networkx's defaults (alpha 0.85, tolerance, dangling nodes spread evenly);
+    weights are taken in absolute value, so a negative (inhibitory) edge
+    counts as strongly as a positive one;
+  - betweenness: Brandes' algorithm from BETWEENNESS_SAMPLES sources drawn
+    with a fixed seed (exact when the graph has no more genes than that),
+    each breadth-first search running level by level on the CSR arrays;
+  - degree assortativity (Pearson correlation of the degrees at either end
+    of the edges), None when undefined: no edges, or every edge joining genes
+    of equal degree.
+
+Kept free of any app state so that analytics worker processes (see
+analytics/jobs.py) can import it cheaply.
+"""
+import numpy as np
+import scipy.sparse as sp
+
+BETWEENNESS_SAMPLES = 64
+PAGERANK_ALPHA = 0.85
+PAGERANK_TOLERANCE = 1e-6
+PAGERANK_MAX_ITERATIONS = 100
+TOP_GENES = 5
+TRIANGLE_BLOCK_ROWS = 4096
+
+
+def _gather(indptr, indices, rows):
+    """(row, neighbour) pairs for every CSR entry of `rows`."""
+    starts = indptr[rows]
+    counts = indptr[rows + 1] - starts
+    total = int(counts.sum())
+    owners = np.repeat(rows, counts)
+    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+    return owners, indices[np.repeat(starts, counts) + offsets]
+
+
+def live_adjacency(graph):
+    """
+    Symmetric CSR matrices (0/1 and weighted) over the live genes of a graph.
+
+    Returns:
+        (gene ids of the rows, binary matrix, weight matrix)
+    """
+    ids = graph.node_ids()
+    position = np.full(len(graph.genes), -1, dtype=np.int64)
+    position[ids] = np.arange(len(ids))
+    sources, targets, weights = graph.edges()
+    rows = np.concatenate([position[sources], position[targets]])
+    cols = np.concatenate([position[targets], position[sources]])
+    n = len(ids)
+    A = sp.csr_matrix((np.ones(len(rows), dtype=np.int64), (rows, cols)), shape=(n, n))
+    W = sp.csr_matrix((np.concatenate([weights, weights]).astype(np.float64), (rows, cols)), shape=(n, n))
+    A.sort_indices()
+    return ids, A, W
+
+
+def triangle_counts(A):
+    """Triangles through each node: diag(A^3) / 2, computed blockwise."""
+    n = A.shape[0]
+    triangles = np.zeros(n, dtype=np.int64)
+    for start in range(0, n, TRIANGLE_BLOCK_ROWS):
+        block = A[start:start + TRIANGLE_BLOCK_ROWS]
+        triangles[start:start + block.shape[0]] = np.asarray((block @ A).multiply(block).sum(axis=1)).ravel() // 2
+    return triangles
+
+
+def core_numbers(A, degree):
+    """k-core number of every node (Batagelj-Zaversnik peeling, vectorized per wave)."""
+    n = A.shape[0]
+    degree = degree.astype(np.int64).copy()
+    core = np.zeros(n, dtype=np.int64)
+    remaining = np.ones(n, dtype=bool)
+    left = n
+    k = 0
+    while left:
+        k = max(k, int(degree[remaining].min()))
+        frontier = np.flatnonzero(remaining & (degree <= k))
+        while len(frontier):
+            core[frontier] = k
+            remaining[frontier] = False
+            left -= len(frontier)
+            _, neighbors = _gather(A.indptr, A.indices, frontier)
+            candidates, lost = np.unique(neighbors[remaining[neighbors]], return_counts=True)
+            degree[candidates] -= lost
+            frontier = candidates[degree[candidates] <= k]
+    return core
+
+
+def pagerank(W):
+    """
+    PageRank over |W|: transition probabilities must be non-negative, so the
+    sign of a weight is dropped and only its magnitude is kept.
+    """
+    W = abs(W)
+    n = W.shape[0]
+    out_weight = np.asarray(W.sum(axis=1)).ravel()
+    dangling = out_weight == 0
+    inverse = np.divide(1.0, out_weight, out=np.zeros(n), where=~dangling)
+    # x_next = alpha * (x / out_weight) @ W + teleport + dangling mass, spread evenly
+    transposed = W.T.tocsr()
+    x = np.full(n, 1.0 / n)
+    for _ in range(PAGERANK_MAX_ITERATIONS):
+        previous = x
+        x = PAGERANK_ALPHA * (transposed @ (x * inverse))
+        x += (PAGERANK_ALPHA * previous[dangling].sum() + 1 - PAGERANK_ALPHA) / n
+        if np.abs(x - previous).sum() < n * PAGERANK_TOLERANCE:
+            break
+    return x
+
+
+def betweenness(A, samples=BETWEENNESS_SAMPLES, seed=0):
+    """
+    Normalized betweenness centrality estimated from `samples` BFS sources
+    (every node when there are no more than that).
+    """
+    n = A.shape[0]
+    if n < 3:
+        return np.zeros(n)
+    if samples >= n:
+        sources = np.arange(n)
+    else:
+        sources = np.random.default_rng(seed).choice(n, size=samples, replace=False)
+
+    scores = np.zeros(n)
+    for source in sources.tolist():
+        distance = np.full(n, -1, dtype=np.int64)
+        paths = np.zeros(n)
+        distance[source] = 0
+        paths[source] = 1.0
+        levels = [np.array([source])]
+        # 1) Count shortest paths level by level
+        while True:
+            parents, children = _gather(A.indptr, A.indices, levels[-1])
+            depth = len(levels)
+            new = np.unique(children[distance[children] == -1])
+            if not len(new):
+                break
+            distance[new] = depth
+            on_path = distance[children] == depth
+            np.add.at(paths, children[on_path], paths[parents[on_path]])
+            levels.append(new)
+        # 2) Accumulate dependencies from the deepest level up
+        dependency = np.zeros(n)
+        for depth in range(len(levels) - 2, -1, -1):
+            nodes, children = _gather(A.indptr, A.indices, levels[depth])
+            below = distance[children] == depth + 1
+            nodes, children = nodes[below], children[below]
+            np.add.at(dependency, nodes, paths[nodes] / paths[children] * (1 + dependency[children]))
+        dependency[source] = 0
+        scores += dependency
+
+    # Undirected pairs are counted from both ends; scale up the sample
+    scale = (n / len(sources)) / ((n - 1) * (n - 2))
+    return scores * scale
+
+
+def degree_assortativity(A, degree):
+    """
+    Pearson correlation of the degrees at either end of the edges, or None
+    when it is undefined (no edges, or no variance in the end degrees).
+    """
+    rows, cols = A.nonzero()
+    if not len(rows):
+        return None
+    x = degree[rows].astype(np.float64)
+    y = degree[cols].astype(np.float64)
+    if x.std() == 0 or y.std() == 0:
+        return None
+    return float(np.corrcoef(x, y)[0, 1])
+
+
+def _top_genes(graph, ids, scores):
+    top = np.argsort(-scores, kind="stable")[:TOP_GENES]
+    return [{"gene": graph.genes[ids[i]], "score": float(scores[i])} for i in top.tolist()]
+
+
+def calculate_graph_metrics(graph):
+    """
+    Summary metrics of the live part of a CompactGraph (see the module
+    docstring). The first five keys are the original networkx-based metrics.
+    """
+    if not graph or not graph.num_nodes or not graph.num_edges:
+        return {
+            "density": 0.0,
+            "avg_clustering_coefficient": 0.0,
+            "avg_degree_centrality": 0.0,
+            "num_nodes": 0,
+            "num_edges": 0,
+            "avg_degree": 0.0,
+            "max_degree": 0,
+            "transitivity": 0.0,
+            "triangles": 0,
+            "degeneracy": 0,
+            "avg_core_number": 0.0,
+            "max_core_size": 0,
+            "max_pagerank": 0.0,
+            "top_pagerank": [],
+            "avg_betweenness": 0.0,
+            "max_betweenness": 0.0,
+            "top_betweenness": [],
+            "betweenness_samples": 0,
+            "degree_assortativity": None,
+        }
+
+    ids, A, W = live_adjacency(graph)
+    num_nodes = len(ids)
+    num_edges = A.nnz // 2
+    degree = np.diff(A.indptr)
+
+    # 1) Degree
+    density = 2 * num_edges / (num_nodes * (num_nodes - 1)) if num_nodes > 1 else 0.0
+    avg_degree_centrality = float(degree.mean() / (num_nodes - 1)) if num_nodes > 1 else 0.0
+
+    # 2) Clustering from triangle counts
+    triangles = triangle_counts(A)
+    pairs = degree * (degree - 1) / 2
+    clustering = np.divide(triangles, pairs, out=np.zeros(num_nodes), where=pairs > 0)
+    wedges = pairs.sum()
+    transitivity = float(triangles.sum() / wedges) if wedges else 0.0
+
+    # 3) k-cores
+    core = core_numbers(A, degree)
+    degeneracy = int(core.max())
+
+    # 4) PageRank and sampled betweenness
+    rank = pagerank(W)
+    between = betweenness(A)
+
+    return {
+        "density": density,
+        "avg_clustering_coefficient": float(clustering.mean()),
+        "avg_degree_centrality": avg_degree_centrality,
+        "num_nodes": num_nodes,
+        "num_edges": num_edges,
+        "avg_degree": float(degree.mean()),
+        "max_degree": int(degree.max()),
+        "transitivity": transitivity,
+        "triangles": int(triangles.sum() // 3),
+        "degeneracy": degeneracy,
+        "avg_core_number": float(core.mean()),
+        "max_core_size": int((core == degeneracy).sum()),
+        "max_pagerank": float(rank.max()),
+        "top_pagerank": _top_genes(graph, ids, rank),
+        "avg_betweenness": float(between.mean()),
+        "max_betweenness": float(between.max()),
+        "top_betweenness": _top_genes(graph, ids, between),
+        "betweenness_samples": min(BETWEENNESS_SAMPLES, num_nodes),
+        "degree_assortativity": degree_assortativity(A, degree),
+    }
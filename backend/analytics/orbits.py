@@ -0,0 +1,162 @@
+# analytics/orbits.py
+"""
+Per-node graphlet degree vectors (GDVs) for orbits 0-14, i.e. every node
+position in the 2-, 3- and 4-node connected graphlets.
+
+All nodes are handled at once with sparse matrix products over the adjacency
+matrix A: we first count, for every node, the non-induced occurrences of each
+orbit (wedges, triangle-edge counts, common neighbours, ...) and then recover
+the induced orbit counts with the fixed overlap equations between orbits. Only
+4-cliques are enumerated explicitly, via neighbourhood intersections.
+
+Orbit numbering follows Przulj's convention:
+    0: edge
+    1, 2: path end / path centre
+    3: triangle
+    4, 5: 4-path end / 4-path inner node
+    6, 7: star leaf / star centre
+    8: 4-cycle
+    9, 10, 11: paw pendant / paw triangle node / paw centre
+    12, 13: diamond degree-2 node / diamond degree-3 node
+    14: 4-clique
+"""
+import numpy as np
+import scipy.sparse as sp
+
+from analytics.graphlets import iter_four_cliques
+
+ORBIT_COUNT = 15
+
+# Number of orbits that affect each orbit, used to weight the GDV similarity
+# (Milenkovic & Przulj, 2008).
+ORBIT_DEPENDENCIES = np.array([1, 2, 2, 2, 3, 4, 3, 3, 4, 3, 4, 4, 4, 4, 3])
+ORBIT_WEIGHTS = 1 - np.log(ORBIT_DEPENDENCIES) / np.log(ORBIT_COUNT)
+
+
+def adjacency_matrix(G):
+    """
+    Build a symmetric 0/1 CSR adjacency matrix from a networkx graph.
+
+    Returns:
+        (nodes, A) where nodes[i] is the node id of row i
+    """
+    nodes = list(G.nodes())
+    index = {node: i for i, node in enumerate(nodes)}
+    rows, cols = [], []
+    for u, v in G.edges():
+        if u == v:
+            continue
+        rows.append(index[u])
+        cols.append(index[v])
+    return nodes, symmetric_binary(rows, cols, len(nodes))
+
+
+def symmetric_binary(rows, cols, n):
+    """Symmetric, deduplicated 0/1 CSR matrix with an empty diagonal."""
+    rows = np.asarray(rows, dtype=np.int64)
+    cols = np.asarray(cols, dtype=np.int64)
+    keep = rows != cols
+    rows, cols = rows[keep], cols[keep]
+    data = np.ones(2 * len(rows), dtype=np.int64)
+    A = sp.csr_matrix((data, (np.concatenate([rows, cols]), np.concatenate([cols, rows]))), shape=(n, n))
+    A.data[:] = 1
+    return A
+
+
+def _pairs(x):
+    return x * (x - 1) // 2
+
+
+def _row_sums(M):
+    return np.asarray(M.sum(axis=1)).ravel().astype(np.int64)
+
+
+def compute_gdv(A):
+    """
+    Compute the graphlet degree vector of every node.
+
+    Args:
+        A: symmetric 0/1 scipy.sparse matrix without self-loops
+
+    Returns:
+        int64 NumPy array of shape (n, 15); row i is the GDV of node i
+    """
+    A = sp.csr_matrix(A, dtype=np.int64)
+    n = A.shape[0]
+    gdv = np.zeros((n, ORBIT_COUNT), dtype=np.int64)
+    if n == 0:
+        return gdv
+
+    d = _row_sums(A)
+    A2 = A @ A
+    # Number of triangles on each edge, and on each node
+    T = A.multiply(A2).tocsr()
+    t = _row_sums(T) // 2
+    S = A @ (d - 1)
+
+    # 2- and 3-node orbits
+    gdv[:, 0] = d
+    gdv[:, 1] = S - 2 * t
+    gdv[:, 2] = _pairs(d) - t
+    gdv[:, 3] = t
+
+    # Non-induced 4-node orbit counts
+    clique_counts = np.zeros(n, dtype=np.int64)
+    adj = [set(A.indices[A.indptr[i]:A.indptr[i + 1]].tolist()) for i in range(n)]
+    for clique in iter_four_cliques(adj):
+        clique_counts[list(clique)] += 1
+
+    T_pairs = T.copy()
+    T_pairs.data = _pairs(T_pairs.data)
+    A2_pairs = A2.copy()
+    A2_pairs.data = _pairs(A2_pairs.data)
+
+    N4 = A @ S - d * (d - 1) - 2 * t
+    N5 = (d - 1) * S - 2 * t
+    N6 = A @ _pairs(d - 1)
+    N7 = d * (d - 1) * (d - 2) // 6
+    N8 = _row_sums(A2_pairs) - _pairs(d)
+    N9 = A @ t - 2 * t
+    N10 = T @ (d - 2)
+    N11 = t * (d - 2)
+    N12 = _row_sums(A.multiply(A @ T)) // 2 - t
+    N13 = _row_sums(T_pairs)
+    N14 = clique_counts
+
+    # Induced orbit counts, from the densest graphlet downwards
+    O14 = N14
+    O13 = N13 - 3 * O14
+    O12 = N12 - 3 * O14
+    O11 = N11 - 2 * O13 - 3 * O14
+    O10 = N10 - 2 * O12 - 2 * O13 - 6 * O14
+    O9 = N9 - 2 * O12 - 3 * O14
+    O8 = N8 - O12 - O13 - 3 * O14
+    O7 = N7 - O11 - O13 - O14
+    O6 = N6 - O9 - O10 - 2 * O12 - O13 - 3 * O14
+    O5 = N5 - 2 * O8 - O10 - 2 * O11 - 2 * O12 - 4 * O13 - 6 * O14
+    O4 = N4 - 2 * O8 - 2 * O9 - O10 - 4 * O12 - 2 * O13 - 6 * O14
+
+    gdv[:, 4:] = np.column_stack([O4, O5, O6, O7, O8, O9, O10, O11, O12, O13, O14])
+    return gdv
+
+
+def graphlet_degree_vectors(G):
+    """
+    GDVs for a networkx graph.
+
+    Returns:
+        (nodes, gdv) where gdv[i] belongs to nodes[i]
+    """
+    nodes, A = adjacency_matrix(G)
+    return nodes, compute_gdv(A)
+
+
+def gdv_similarity(X, Y):
+    """
+    Row-wise GDV similarity in [0, 1] between two equally shaped GDV matrices,
+    where 1 means identical topological roles.
+    """
+    X = np.asarray(X, dtype=np.float64)
+    Y = np.asarray(Y, dtype=np.float64)
+    distance = np.abs(np.log(X + 1) - np.log(Y + 1)) / np.log(np.maximum(X, Y) + 2)
+    return 1 - (distance * ORBIT_WEIGHTS).sum(axis=1) / ORBIT_WEIGHTS.sum()
@@ -0,0 +1,102 @@
+# benchmarks/bench_reference_loader.py
+"""
+Startup-time benchmark for the reference database loaders.
+
+Compares the original row-by-row (iterrows) loaders with the vectorized
+loaders in file_utils, both without snapshots and when booting from the
+binary snapshots.
+
+Run from the backend directory:
+    python benchmarks/bench_reference_loader.py
+"""
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from file_utils import get_keys_from_file, load_gene_data, load_link_data, merge_data_dict
+from interaction_evidence import InteractionEvidence
+
+GENE_DIRS = ["gene_data/annotations", "gene_data/general"]
+INTERACTION_DIR = "gene_data/interactions"
+
+
+def legacy_update_gene_data_dict(gene_info_db, data_dir, fname, sep=','):
+    dict_key, file_keys = get_keys_from_file(fname)
+    df = pd.read_csv(os.path.join(data_dir, fname), sep=sep)
+    for _, row in df.iterrows():
+        gene = str(row.get("gene") or row.get("gene_name") or row.get("symbol"))
+        if not gene in gene_info_db:
+            gene_info_db[gene.upper()] = {}
+        for file_key in file_keys:
+            if file_key not in gene_info_db[gene.upper()]:
+                gene_info_db[gene.upper()][file_key] = []
+            gene_info_db[gene.upper()][file_key].append(row.to_dict()[file_key])
+
+
+def legacy_update_link_data_dict(link_info_db, data_dir, fname, sep=','):
+    dict_key, file_keys = get_keys_from_file(fname)
+    df = pd.read_csv(os.path.join(data_dir, fname), sep=sep)
+    for _, row in df.iterrows():
+        gene1 = str(row.get(file_keys[0]))
+        gene2 = str(row.get(file_keys[1]))
+        if not gene1 in link_info_db:
+            link_info_db[gene1] = {}
+        if not gene2 in link_info_db:
+            link_info_db[gene2] = {}
+        if not gene2 in link_info_db[gene1]:
+            link_info_db[gene1][gene2] = []
+        if not gene1 in link_info_db[gene2]:
+            link_info_db[gene2][gene1] = []
+        link_info_db[gene1][gene2].append(dict_key)
+        link_info_db[gene2][gene1].append(dict_key)
+
+
+def reference_files():
+    for data_dir in GENE_DIRS:
+        for fname in sorted(os.listdir(data_dir)):
+            if fname.endswith((".csv", ".tsv")):
+                yield "gene", data_dir, fname, "\t" if fname.endswith(".tsv") else ","
+    for fname in sorted(os.listdir(INTERACTION_DIR)):
+        if fname.endswith((".csv", ".tsv")):
+            yield "link", INTERACTION_DIR, fname, ","
+
+
+def boot_legacy():
+    gene_info_db, interaction_info_db = {}, {}
+    for kind, data_dir, fname, sep in reference_files():
+        if kind == "gene":
+            legacy_update_gene_data_dict(gene_info_db, data_dir, fname, sep)
+        else:
+            legacy_update_link_data_dict(interaction_info_db, data_dir, fname, sep)
+    return gene_info_db, interaction_info_db
+
+
+def boot_vectorized(snapshot_dir):
+    gene_info_db, interaction_evidence = {}, InteractionEvidence()
+    for kind, data_dir, fname, sep in reference_files():
+        if kind == "gene":
+            merge_data_dict(gene_info_db, load_gene_data(data_dir, fname, sep, snapshot_dir))
+        else:
+            interaction_evidence.add_source(load_link_data(data_dir, fname, sep, snapshot_dir))
+    return gene_info_db, interaction_evidence.gene_index
+
+
+def timed(label, boot, *args):
+    start = time.perf_counter()
+    gene_info_db, interaction_info_db = boot(*args)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {elapsed:8.3f}s  genes={len(gene_info_db):>6}  interactors={len(interaction_info_db):>6}")
+    return elapsed
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as snapshot_dir:
+        legacy = timed("legacy iterrows", boot_legacy)
+        vectorized = timed("vectorized, no snapshot", boot_vectorized, None)
+        timed("vectorized, writing snapshot", boot_vectorized, snapshot_dir)
+        warm = timed("vectorized, from snapshot", boot_vectorized, snapshot_dir)
+    print(f"\nspeedup: {legacy / vectorized:.1f}x cold, {legacy / warm:.1f}x from snapshot")
@@ -0,0 +1,95 @@
+# benchmarks/bench_retriever.py
+"""
+Latency and recall of the local passage index against the remote retriever.
+
+The remote Pinecone index is replaced by a stand-in that scores the whole
+corpus under a gene/context metadata mask and sleeps for a simulated network
+round trip, so the benchmark runs offline on a synthetic corpus of unit
+vectors. Recall is measured against exact top-k.
+
+Run from the backend directory:
+    python benchmarks/bench_retriever.py [--genes 2000] [--latency-ms 40]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from services.local_index import LocalIndex, build_local_index
+
+CONTEXTS = ["function", "disease", "pathway", "general"]
+
+
+class RemoteStandIn:
+    """Filtered brute-force search plus a fixed simulated round trip."""
+    def __init__(self, chunks, latency):
+        self.vectors = np.asarray([chunk["embedding"] for chunk in chunks], dtype=np.float32)
+        self.genes = np.array([chunk["gene"] for chunk in chunks])
+        self.contexts = np.array([chunk["type"] for chunk in chunks])
+        self.texts = [chunk["text"] for chunk in chunks]
+        self.latency = latency
+
+    def query(self, vector, gene, context, k=5):
+        time.sleep(self.latency)
+        rows = np.flatnonzero((self.genes == gene) & (self.contexts == context))
+        scores = self.vectors[rows] @ np.asarray(vector, dtype=np.float32)
+        return [self.texts[rows[i]] for i in np.argsort(-scores)[:k]]
+
+
+def synthetic_chunks(genes, per_context, dim, rng):
+    vectors = rng.standard_normal((genes * len(CONTEXTS) * per_context, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    chunks = []
+    for g in range(genes):
+        for context in CONTEXTS:
+            for p in range(per_context):
+                chunks.append({"gene": f"G{g}", "type": context, "text": f"G{g} {context} passage {p}",
+                               "embedding": vectors[len(chunks)]})
+    return chunks
+
+
+def timed_queries(retriever, queries, k):
+    start = time.perf_counter()
+    results = [retriever.query(vector, gene, context, k) for vector, gene, context in queries]
+    return (time.perf_counter() - start) / len(queries), results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--genes", type=int, default=2000)
+    parser.add_argument("--passages", type=int, default=20, help="passages per (gene, context)")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--latency-ms", type=float, default=40.0, help="simulated remote round trip")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    chunks = synthetic_chunks(args.genes, args.passages, args.dim, rng)
+    queries = []
+    for _ in range(args.queries):
+        vector = rng.standard_normal(args.dim).astype(np.float32)
+        queries.append((vector / np.linalg.norm(vector), f"G{rng.integers(args.genes)}", str(rng.choice(CONTEXTS))))
+
+    remote = RemoteStandIn(chunks, args.latency_ms / 1000)
+    with tempfile.TemporaryDirectory() as index_dir:
+        start = time.perf_counter()
+        build_local_index(chunks, index_dir)
+        build = time.perf_counter() - start
+        start = time.perf_counter()
+        local = LocalIndex(index_dir)
+        load = time.perf_counter() - start
+
+        remote_latency, remote_results = timed_queries(remote, queries, args.k)
+        local_latency, local_results = timed_queries(local, queries, args.k)
+
+    recall = np.mean([len(set(a) & set(b)) / args.k for a, b in zip(local_results, remote_results)])
+    print(f"corpus: {len(chunks)} passages x {args.dim} dims, k={args.k}")
+    print(f"local index build {build:.2f}s, load {load * 1000:.1f}ms")
+    print(f"remote stand-in  {remote_latency * 1000:8.2f} ms/query")
+    print(f"local index      {local_latency * 1000:8.2f} ms/query")
+    print(f"recall@{args.k} of local vs remote: {recall:.3f}")
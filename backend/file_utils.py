@@ -1,5 +1,9 @@
 import pandas as pd
+import numpy as np
+import hashlib
+import mmap
 import os
+import pickle
 
 def get_keys_from_file(name):
     if "go_biological" in name:
@@ -30,32 +34,176 @@ def get_keys_from_file(name):
     else:
         raise ValueError("Unknown file type")
     
-def update_gene_data_dict(gene_info_db, data_dir, fname, sep=','):
-    dict_key, file_keys = get_keys_from_file(fname)
-    df = pd.read_csv(os.path.join(data_dir, fname), sep=sep)
-    for _, row in df.iterrows():
-        gene = str(row.get("gene") or row.get("gene_name") or row.get("symbol"))
-        if not gene in gene_info_db:
-            gene_info_db[gene.upper()] = {}
+# Parsed reference files are cached as binary snapshots next to the data.
+# Bump SNAPSHOT_VERSION whenever the structure produced by the loaders changes.
+SNAPSHOT_VERSION = 3
+SNAPSHOT_DIR = os.path.join("gene_data", ".snapshots")
+
+def source_fingerprint(path):
+    """Digest of a source file's mtime, size and content."""
+    stat = os.stat(path)
+    digest = hashlib.sha1(f"{SNAPSHOT_VERSION}:{stat.st_mtime_ns}:{stat.st_size}:".encode())
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()[:16]
+
+def load_with_snapshot(path, build, snapshot_dir=SNAPSHOT_DIR):
+    """
+    Return build(), reusing the snapshot written for this exact version of
+    `path` if there is one. Snapshots are read through a memory map so the
+    file is not copied into a separate buffer before unpickling.
+    """
+    if snapshot_dir is None:
+        return build()
+
+    name = os.path.basename(path)
+    snapshot = os.path.join(snapshot_dir, f"{name}.{source_fingerprint(path)}.pkl")
+    if os.path.exists(snapshot):
+        try:
+            with open(snapshot, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return pickle.loads(mm)
+        except Exception as e:
+            print(f"Ignoring unreadable snapshot {snapshot}: {e}")
+
+    data = build()
+    os.makedirs(snapshot_dir, exist_ok=True)
+    # Drop snapshots of older versions of this file, then write atomically
+    for old in os.listdir(snapshot_dir):
+        if old.startswith(f"{name}.") and old.endswith(".pkl"):
+            os.remove(os.path.join(snapshot_dir, old))
+    tmp = f"{snapshot}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp, snapshot)
+    return data
+
+def load_gene_data(data_dir, fname, sep=',', snapshot_dir=SNAPSHOT_DIR):
+    """
+    Parse one annotation file into {GENE: {file_key: [values, ...]}}.
+    """
+    def build():
+        dict_key, file_keys = get_keys_from_file(fname)
+        df = pd.read_csv(os.path.join(data_dir, fname), sep=sep)
+        gene_column = next(c for c in ("gene", "gene_name", "symbol") if c in df.columns)
+        genes = df[gene_column].astype(str).str.upper()
+
+        gene_data = {}
         for file_key in file_keys:
-            if file_key not in gene_info_db[gene.upper()]:
-                gene_info_db[gene.upper()][file_key] = []
-            gene_info_db[gene.upper()][file_key].append(row.to_dict()[file_key])
-
-def update_link_data_dict(link_info_db, data_dir, fname, sep=','):
-    dict_key, file_keys = get_keys_from_file(fname)
-    df = pd.read_csv(os.path.join(data_dir, fname), sep=sep)
-    for _, row in df.iterrows():
-        gene1 = str(row.get(file_keys[0]))
-        gene2 = str(row.get(file_keys[1]))
-        if not gene1 in link_info_db:
-            link_info_db[gene1] = {}
-        if not gene2 in link_info_db:
-            link_info_db[gene2] = {}
-        if not gene2 in link_info_db[gene1]:
-            link_info_db[gene1][gene2] = []
-        if not gene1 in link_info_db[gene2]:
-            link_info_db[gene2][gene1] = []
-        link_info_db[gene1][gene2].append(dict_key)
-        link_info_db[gene2][gene1].append(dict_key)
-        
\ No newline at end of file
+            grouped = df[file_key].groupby(genes, sort=False).agg(list)
+            for gene, values in grouped.items():
+                gene_data.setdefault(gene, {})[file_key] = values
+        return gene_data
+
+    return load_with_snapshot(os.path.join(data_dir, fname), build, snapshot_dir)
+
+# Numeric evidence column kept for each interaction source, if it has one
+LINK_SCORE_COLUMNS = {"string": "score", "intact": "Intact_Miscore"}
+
+def load_link_data(data_dir, fname, sep=',', snapshot_dir=SNAPSHOT_DIR):
+    """
+    Parse one interaction file into parallel arrays, one entry per row.
+
+    Returns:
+        {"source": dict_key, "gene1": str array, "gene2": str array,
+         "score": float64 array (NaN where the source has no score)}
+    """
+    def build():
+        dict_key, file_keys = get_keys_from_file(fname)
+        score_column = LINK_SCORE_COLUMNS.get(dict_key)
+        columns = file_keys + ([score_column] if score_column else [])
+        df = pd.read_csv(os.path.join(data_dir, fname), sep=sep, usecols=columns,
+                         dtype={key: str for key in file_keys})
+        if score_column:
+            score = pd.to_numeric(df[score_column], errors="coerce").to_numpy(dtype=np.float64)
+        else:
+            score = np.full(len(df), np.nan)
+        return {
+            "source": dict_key,
+            "gene1": df[file_keys[0]].astype(str).to_numpy(dtype=object),
+            "gene2": df[file_keys[1]].astype(str).to_numpy(dtype=object),
+            "score": score,
+        }
+
+    return load_with_snapshot(os.path.join(data_dir, fname), build, snapshot_dir)
+
+def merge_data_dict(target, source):
+    """Merge a two-level dict of lists into `target`, extending existing lists."""
+    for outer, inner in source.items():
+        entry = target.setdefault(outer, {})
+        for key, values in inner.items():
+            entry.setdefault(key, []).extend(values)
+
+UPLOAD_CHUNK_ROWS = 200_000
+
+class _CountingReader:
+    """Read-only file wrapper that records how many bytes were consumed."""
+    def __init__(self, raw):
+        self.raw = raw
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = self.raw.read(size)
+        self.bytes_read += len(data)
+        return data
+
+def parse_interaction_file(raw, sep=',', chunk_rows=UPLOAD_CHUNK_ROWS, progress=None):
+    """
+    Stream an uploaded interaction file (header row, then gene1, gene2, weight)
+    in chunks of `chunk_rows` rows, interning genes and dropping duplicate
+    edges as it goes so that only integer arrays are kept in memory.
+
+    Rows without a numeric weight and self-loops are skipped; an edge seen
+    again (in either direction) keeps the weight of its first occurrence.
+
+    Args:
+        raw: binary file object positioned at the start of the file
+        sep: column separator
+        progress: optional callback(bytes_read, edges) called after each chunk
+
+    Returns:
+        (genes, sources, targets, weights) where sources/targets index genes
+    """
+    reader = _CountingReader(raw)
+    gene_ids = {}
+    seen = np.empty(0, dtype=np.int64)  # sorted keys of the edges kept so far
+    sources, targets, weights = [], [], []
+
+    chunks = pd.read_csv(reader, sep=sep, header=0, usecols=[0, 1, 2], dtype=str,
+                         keep_default_na=False, chunksize=chunk_rows, encoding="utf-8")
+    for chunk in chunks:
+        weight = pd.to_numeric(chunk.iloc[:, 2], errors="coerce").to_numpy(dtype=np.float64)
+        valid = ~np.isnan(weight)
+        count = int(valid.sum())
+
+        # Map this chunk's gene names onto the global interned ids
+        names = np.concatenate([chunk.iloc[:, 0].to_numpy()[valid], chunk.iloc[:, 1].to_numpy()[valid]])
+        codes, uniques = pd.factorize(names)
+        lookup = np.fromiter((gene_ids.setdefault(g, len(gene_ids)) for g in uniques),
+                             dtype=np.int64, count=len(uniques))
+        ids = lookup[codes]
+        src, dst, weight = ids[:count], ids[count:], weight[valid]
+
+        # Canonical undirected keys; keep first occurrences not seen before
+        keep = src != dst
+        low = np.minimum(src, dst)[keep]
+        high = np.maximum(src, dst)[keep]
+        keys, first = np.unique((low << 32) | high, return_index=True)
+        if len(seen):
+            position = np.minimum(np.searchsorted(seen, keys), len(seen) - 1)
+            new = seen[position] != keys
+        else:
+            new = np.ones(len(keys), dtype=bool)
+        first = np.sort(first[new])
+
+        sources.append(low[first])
+        targets.append(high[first])
+        weights.append(weight[keep][first])
+        seen = np.sort(np.concatenate([seen, keys[new]]), kind="stable")
+
+        if progress:
+            progress(reader.bytes_read, len(seen))
+
+    if not sources:
+        return [], np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    return list(gene_ids), np.concatenate(sources), np.concatenate(targets), np.concatenate(weights)
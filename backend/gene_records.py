@@ -0,0 +1,113 @@
+# gene_records.py
+"""
+Precomputed gene detail records for /gene/{gene_name} and the search index.
+
+Every gene in gene_info_db is cleaned once (list values deduplicated and
+joined into strings) and its response body serialized once, together with an
+ETag derived from the body. The table is rebuilt only when the reference
+registry's gene generation changes, i.e. when more annotation sources were
+merged into gene_info_db (interaction sources leave it untouched).
+
+orjson is used for serialization when installed, falling back to the standard
+json module otherwise.
+"""
+import hashlib
+import json
+import threading
+
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def dumps(obj):
+    """Serialize to JSON bytes with the fastest encoder available."""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+def clean_gene_info(raw: dict) -> dict:
+    """
+    Normalize any list/np.ndarray/pd.Series into JSON‑serializable strings
+    (repeated values kept once, in first-seen order); turn pandas NA into
+    None; cast everything else to str.
+    """
+    clean: dict = {}
+    for k, v in raw.items():
+        # list, numpy array, or pandas Series → deduplicated list → string
+        if isinstance(v, (list, np.ndarray, pd.Series)):
+            array = v.tolist() if hasattr(v, "tolist") else list(v)
+            clean[k] = ", ".join(dict.fromkeys(str(x) for x in array))
+        # pandas NA (or numpy NaN) → None
+        elif pd.isna(v):
+            clean[k] = None
+        # otherwise → string
+        else:
+            clean[k] = str(v)
+    return clean
+
+
+def etag_for(body):
+    return '"' + hashlib.blake2b(body, digest_size=12).hexdigest() + '"'
+
+
+def etag_matches(if_none_match, etag):
+    """
+    Whether an If-None-Match header lists `etag` (weak comparison, so a W/
+    prefix is ignored) or is `*`.
+    """
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == "*" or tag == etag:
+            return True
+    return False
+
+
+class GeneRecordCache:
+    def __init__(self, reference):
+        """
+        Args:
+            reference: ReferenceRegistry providing gene_info() and gene_generation
+        """
+        self.reference = reference
+        self.generation = None
+        self.records = {}  # gene -> (cleaned record, response body, etag)
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        gene_info_db = self.reference.gene_info()
+        if self.generation == self.reference.gene_generation:
+            return
+        with self._lock:
+            generation = self.reference.gene_generation
+            if self.generation == generation:
+                return
+            records = {}
+            for gene, info in list(gene_info_db.items()):
+                cleaned = clean_gene_info(info)
+                body = dumps({"gene": gene, "data": cleaned})
+                records[gene] = (cleaned, body, etag_for(body))
+            # Swap the whole table so readers never see a partial rebuild
+            self.records = records
+            self.generation = generation
+
+    def get(self, gene):
+        """
+        Returns:
+            (body, etag) for the gene, or None if it has no reference data
+        """
+        self._refresh()
+        record = self.records.get(gene)
+        return None if record is None else record[1:]
+
+    def cleaned(self):
+        """(gene, cleaned record) pairs for every gene."""
+        self._refresh()
+        return ((gene, record[0]) for gene, record in self.records.items())
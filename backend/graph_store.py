@@ -0,0 +1,242 @@
+# graph_store.py
+"""
+Compact storage for uploaded interaction networks.
+
+Each graph keeps an interned gene table plus an undirected CSR adjacency
+(int32 indptr/indices, float32 weights); every edge appears once in each
+direction. The networkx graph and the JSON payload served to the frontend are
+derived views, built on first use and cached on the instance.
+
+The CSR arrays are never modified. Removing a node only flips its entry in the
+`alive` mask and updates the live degree of its neighbours, so edits cost
+O(degree). Every change draws a new `version` from a process-wide counter, which
+callers use to key derived results (graphlets, metrics, ...).
+"""
+import itertools
+import json
+from math import comb
+
+import networkx as nx
+import numpy as np
+import scipy.sparse as sp
+
+from analytics.graphlets import triangles_and_wedges
+
+_versions = itertools.count(1)
+
+
+class CompactGraph:
+    def __init__(self, genes, indptr, indices, weights, cancer_drivers):
+        """
+        Args:
+            genes: list of gene ids; position i is the interned id i
+            indptr, indices, weights: symmetric CSR adjacency
+            cancer_drivers: per-gene cancer driver annotation counts
+        """
+        self.genes = list(genes)
+        self.gene_index = {gene: i for i, gene in enumerate(self.genes)}
+        self.indptr = np.asarray(indptr, dtype=np.int32)
+        self.indices = np.asarray(indices, dtype=np.int32)
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.cancer_drivers = np.asarray(cancer_drivers, dtype=np.int32)
+
+        # Mutable state: which genes are still present and their live degree
+        self.alive = np.ones(len(self.genes), dtype=bool)
+        self.degree = np.diff(self.indptr).astype(np.int32)
+        self.num_nodes = len(self.genes)
+        self.num_edges = len(self.indices) // 2
+        self.version = next(_versions)
+        self._views = {}
+        self._motifs = None
+
+    @classmethod
+    def empty(cls):
+        return cls([], np.zeros(1), [], [], [])
+
+    @classmethod
+    def from_edges(cls, genes, sources, targets, weights, cancer_drivers):
+        """
+        Build a graph from parallel arrays of interned endpoint ids.
+
+        Self-loops are dropped and repeated edges (in either direction) keep
+        the weight of their first occurrence.
+        """
+        n = len(genes)
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        weights = np.asarray(weights, dtype=np.float32)
+
+        keep = sources != targets
+        low = np.minimum(sources, targets)[keep]
+        high = np.maximum(sources, targets)[keep]
+        weights = weights[keep]
+
+        _, first = np.unique(low * max(n, 1) + high, return_index=True)
+        low, high, weights = low[first], high[first], weights[first]
+
+        rows = np.concatenate([low, high])
+        cols = np.concatenate([high, low])
+        order = np.lexsort((cols, rows))
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=n), out=indptr[1:])
+        return cls(genes, indptr, cols[order], np.concatenate([weights, weights])[order], cancer_drivers)
+
+    def copy(self):
+        """
+        A graph sharing this one's (read-only) CSR arrays but with its own
+        removal state. It keeps the same version until it is edited.
+        """
+        clone = CompactGraph.__new__(CompactGraph)
+        clone.__dict__.update(self.__dict__)
+        clone.alive = self.alive.copy()
+        clone.degree = self.degree.copy()
+        clone._views = {}
+        clone._motifs = dict(self._motifs) if self._motifs else None
+        return clone
+
+    def with_alive(self, alive):
+        """
+        A copy sharing this graph's CSR arrays in which exactly the genes
+        flagged in `alive` are present (e.g. to restore a saved removal state).
+        """
+        clone = self.copy()
+        clone.alive = np.asarray(alive, dtype=bool).copy()
+        rows = np.repeat(np.arange(len(self.genes), dtype=np.int32), np.diff(self.indptr))
+        live = clone.alive[rows] & clone.alive[self.indices]
+        clone.degree = np.bincount(rows[live], minlength=len(self.genes)).astype(np.int32)
+        clone.num_nodes = int(clone.alive.sum())
+        clone.num_edges = int(live.sum()) // 2
+        clone.version = next(_versions)
+        clone._motifs = None
+        return clone
+
+    @property
+    def nbytes(self):
+        """Approximate memory held by the arrays (excluding cached views)."""
+        return (self.indptr.nbytes + self.indices.nbytes + self.weights.nbytes
+                + self.cancer_drivers.nbytes + self.alive.nbytes + self.degree.nbytes)
+
+    def has_gene(self, gene):
+        i = self.gene_index.get(gene)
+        return i is not None and bool(self.alive[i])
+
+    def node_ids(self):
+        """Interned ids of the genes still in the graph."""
+        return np.flatnonzero(self.alive)
+
+    def live_genes(self):
+        return [self.genes[i] for i in self.node_ids()]
+
+    def degrees(self):
+        """Live degree per interned id (0 for removed genes)."""
+        return self.degree
+
+    def neighbors(self, i):
+        neighbors = self.indices[self.indptr[i]:self.indptr[i + 1]]
+        return neighbors[self.alive[neighbors]]
+
+    def edges(self):
+        """Each live undirected edge once, as (sources, targets, weights) with source < target."""
+        rows = np.repeat(np.arange(len(self.genes), dtype=np.int32), np.diff(self.indptr))
+        keep = (rows < self.indices) & self.alive[rows] & self.alive[self.indices]
+        return rows[keep], self.indices[keep], self.weights[keep]
+
+    def adjacency_sets(self):
+        """Neighbour sets over all interned ids; removed genes have empty sets."""
+        if "sets" not in self._views:
+            self._views["sets"] = [set(self.neighbors(i).tolist()) if self.alive[i] else set()
+                                   for i in range(len(self.genes))]
+        return self._views["sets"]
+
+    def adjacency_matrix(self):
+        """Symmetric 0/1 scipy CSR matrix over all interned ids."""
+        if "matrix" not in self._views:
+            n = len(self.genes)
+            sources, targets, _ = self.edges()
+            data = np.ones(2 * len(sources), dtype=np.int64)
+            self._views["matrix"] = sp.csr_matrix(
+                (data, (np.concatenate([sources, targets]), np.concatenate([targets, sources]))), shape=(n, n))
+        return self._views["matrix"]
+
+    def to_networkx(self):
+        if "networkx" not in self._views:
+            G = nx.Graph()
+            G.add_nodes_from(self.live_genes())
+            sources, targets, weights = self.edges()
+            G.add_weighted_edges_from(
+                (self.genes[s], self.genes[t], float(w)) for s, t, w in zip(sources, targets, weights))
+            self._views["networkx"] = G
+        return self._views["networkx"]
+
+    def to_json(self):
+        """The {"nodes": [...], "links": [...]} payload used by the frontend."""
+        sources, targets, weights = self.edges()
+        return {
+            "nodes": [{
+                "id": self.genes[i],
+                "val": int(self.degree[i]),
+                "cancer_drivers": int(self.cancer_drivers[i])
+            } for i in self.node_ids().tolist()],
+            "links": [{
+                "source": self.genes[s],
+                "target": self.genes[t],
+                "weight": float(w)
+            } for s, t, w in zip(sources.tolist(), targets.tolist(), weights.tolist())]
+        }
+
+    def json_bytes(self):
+        """Encoded JSON payload, cached so repeated reads are free."""
+        if "json" not in self._views:
+            self._views["json"] = json.dumps(self.to_json()).encode("utf-8")
+        return self._views["json"]
+
+    @property
+    def has_motif_counts(self):
+        """Whether motif_counts() is known, i.e. free to call."""
+        return self._motifs is not None
+
+    def motif_counts(self):
+        """Total triangles and wedges, maintained incrementally across removals."""
+        if self._motifs is None:
+            triangles, wedges = triangles_and_wedges(self.adjacency_sets())
+            self._motifs = {"triangles": triangles, "wedges": wedges}
+        return self._motifs
+
+    def remove_node(self, gene):
+        """
+        Remove `gene` and its edges in place, touching only its neighbours.
+
+        Returns:
+            True if the gene was present
+        """
+        if not self.has_gene(gene):
+            return False
+        v = self.gene_index[gene]
+        neighbors = self.neighbors(v)
+        neighbor_list = neighbors.tolist()
+
+        if self._motifs is not None:
+            # Triangles through v are the edges among its neighbours; wedges
+            # are those centred on v plus those with v as an endpoint
+            closed = sum(int(np.isin(self.neighbors(u), neighbors).sum()) for u in neighbor_list) // 2
+            self._motifs["triangles"] -= closed
+            self._motifs["wedges"] -= comb(len(neighbor_list), 2) + int((self.degree[neighbors] - 1).sum())
+
+        self.alive[v] = False
+        self.degree[neighbors] -= 1
+        self.degree[v] = 0
+        self.num_nodes -= 1
+        self.num_edges -= len(neighbor_list)
+        self.version = next(_versions)
+
+        # Patch the views that can be updated in O(degree), drop the rest
+        sets = self._views.get("sets")
+        if sets is not None:
+            for u in neighbor_list:
+                sets[u].discard(v)
+            sets[v] = set()
+        G = self._views.get("networkx")
+        if G is not None:
+            G.remove_node(gene)
+        self._views = {key: view for key, view in self._views.items() if key in ("sets", "networkx")}
+        return True
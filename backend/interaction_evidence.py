@@ -0,0 +1,153 @@
+# interaction_evidence.py
+"""
+Interaction evidence from the reference PPI sources (STRING, IntAct, BioGRID).
+
+Genes are interned to integer ids and every known pair is stored once in a
+symmetric scipy CSR matrix whose data is an edge id (offset by one). Per edge
+we keep a bitmask of the sources reporting it and the numeric score of each
+scored source (NaN when that source has no score for the pair, the maximum
+when it lists the pair several times).
+
+Because CSR rows are sorted, the flattened (row, column) keys are sorted too,
+so a whole batch of pairs is looked up with one np.searchsorted.
+"""
+import threading
+
+import numpy as np
+import scipy.sparse as sp
+
+from file_utils import LINK_SCORE_COLUMNS
+
+SOURCE_BITS = {"string": 1, "intact": 2, "biogrid": 4}
+SCORED_SOURCES = list(LINK_SCORE_COLUMNS)
+
+
+def sources_from_mask(mask):
+    return [name for name, bit in SOURCE_BITS.items() if mask & bit]
+
+
+class InteractionEvidence:
+    def __init__(self):
+        self.genes = []
+        self.gene_index = {}
+        self.matrix = sp.csr_matrix((0, 0), dtype=np.int32)
+        self.mask = np.zeros(0, dtype=np.uint8)
+        self.scores = np.zeros((0, len(SCORED_SOURCES)), dtype=np.float64)
+        self._keys = np.zeros(0, dtype=np.int64)
+        # Rows of every loaded source, kept so the matrix can be rebuilt when
+        # another source arrives
+        self._rows = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.mask)
+
+    def _intern(self, names):
+        ids = np.empty(len(names), dtype=np.int64)
+        for k, name in enumerate(names):
+            i = self.gene_index.get(name)
+            if i is None:
+                i = self.gene_index[name] = len(self.genes)
+                self.genes.append(name)
+            ids[k] = i
+        return ids
+
+    def add_source(self, table):
+        """
+        Add one interaction table as returned by file_utils.load_link_data.
+        """
+        with self._lock:
+            bit = SOURCE_BITS.get(table["source"], 0)
+            column = SCORED_SOURCES.index(table["source"]) if table["source"] in SCORED_SOURCES else -1
+            self._rows.append((self._intern(table["gene1"]), self._intern(table["gene2"]), bit, column,
+                               np.asarray(table["score"], dtype=np.float64)))
+            self._rebuild()
+
+    def _rebuild(self):
+        n = len(self.genes)
+        low = np.concatenate([np.minimum(a, b) for a, b, _, _, _ in self._rows])
+        high = np.concatenate([np.maximum(a, b) for a, b, _, _, _ in self._rows])
+        bits = np.concatenate([np.full(len(a), bit, dtype=np.uint8) for a, _, bit, _, _ in self._rows])
+
+        # One edge per unordered pair; OR the source bits and keep the best score per source
+        pairs, edge_of_row = np.unique(low * n + high, return_inverse=True)
+        mask = np.zeros(len(pairs), dtype=np.uint8)
+        np.bitwise_or.at(mask, edge_of_row, bits)
+        scores = np.full((len(pairs), len(SCORED_SOURCES)), -np.inf, dtype=np.float64)
+        start = 0
+        for a, _, _, column, score in self._rows:
+            rows = edge_of_row[start:start + len(a)]
+            start += len(a)
+            if column >= 0:
+                valid = ~np.isnan(score)
+                np.maximum.at(scores[:, column], rows[valid], score[valid])
+        scores[np.isneginf(scores)] = np.nan
+
+        # Stored as edge id + 1 so edge 0 is not an explicit zero; self-pairs
+        # (a protein reported with itself) are mirrored only once
+        low, high = pairs // max(n, 1), pairs % max(n, 1)
+        edge_ids = np.arange(1, len(pairs) + 1, dtype=np.int32)
+        off = low != high
+        matrix = sp.csr_matrix(
+            (np.concatenate([edge_ids, edge_ids[off]]),
+             (np.concatenate([low, high[off]]), np.concatenate([high, low[off]]))),
+            shape=(n, n))
+        matrix.sort_indices()
+
+        rows = np.repeat(np.arange(n, dtype=np.int64), np.diff(matrix.indptr))
+        self._keys = rows * n + matrix.indices
+        self.matrix, self.mask, self.scores = matrix, mask, scores
+
+    def lookup(self, ids1, ids2):
+        """
+        Vectorized edge lookup for pairs of interned ids (-1 for unknown genes).
+
+        Returns:
+            int64 array of edge ids, -1 where the pair has no evidence
+        """
+        ids1 = np.asarray(ids1, dtype=np.int64)
+        ids2 = np.asarray(ids2, dtype=np.int64)
+        n = len(self.genes)
+        edges = np.full(len(ids1), -1, dtype=np.int64)
+        known = (ids1 >= 0) & (ids2 >= 0)
+        if not known.any() or len(self._keys) == 0:
+            return edges
+        keys = ids1[known] * n + ids2[known]
+        pos = np.minimum(np.searchsorted(self._keys, keys), len(self._keys) - 1)
+        found = self._keys[pos] == keys
+        edges[np.flatnonzero(known)[found]] = self.matrix.data[pos[found]] - 1
+        return edges
+
+    def ids_for(self, genes):
+        """Interned ids for gene names, -1 for genes without any evidence."""
+        return np.fromiter((self.gene_index.get(gene, -1) for gene in genes), dtype=np.int64, count=len(genes))
+
+    def sources(self, gene1, gene2):
+        """Source names reporting the pair, or None if there is no evidence."""
+        edge = self.lookup(self.ids_for([gene1]), self.ids_for([gene2]))[0]
+        return None if edge < 0 else sources_from_mask(int(self.mask[edge]))
+
+    def annotate(self, genes, sources, targets):
+        """
+        Evidence for a batch of links given as indices into `genes`.
+
+        Returns:
+            one {"sources": [...], "<source>_score": float or None, ...} per link
+        """
+        ids = self.ids_for(genes)
+        edges = self.lookup(ids[np.asarray(sources, dtype=np.int64)], ids[np.asarray(targets, dtype=np.int64)])
+        has_edge = edges >= 0
+        masks = np.zeros(len(edges), dtype=np.uint8)
+        scores = np.full((len(edges), len(SCORED_SOURCES)), np.nan, dtype=np.float64)
+        masks[has_edge] = self.mask[edges[has_edge]]
+        scores[has_edge] = self.scores[edges[has_edge]]
+
+        labels = {mask: sources_from_mask(mask) for mask in np.unique(masks).tolist()}
+        columns = [f"{name}_score" for name in SCORED_SOURCES]
+        annotations = []
+        for mask, row in zip(masks.tolist(), scores.tolist()):
+            entry = {"sources": labels[mask]}
+            for column, score in zip(columns, row):
+                entry[column] = None if score != score else score
+            annotations.append(entry)
+        return annotations
@@ -1,10 +1,13 @@
-from fastapi import FastAPI, File, UploadFile, Request, HTTPException, Query, Body
+from fastapi import FastAPI, File, UploadFile, Request, HTTPException, Query, Body, Header, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
 import sys
 import os
 from dotenv import load_dotenv
 import threading
+import asyncio
+import uuid
 
 # Load environment variables from .env file
 load_dotenv()
@@ -13,54 +16,83 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from pydantic import BaseModel
 from typing import Dict, Optional, List, Union
 
-from file_utils import update_gene_data_dict, update_link_data_dict
-import csv
-import io
+from file_utils import parse_interaction_file
+from reference_data import ReferenceRegistry
+from contextlib import asynccontextmanager
 import os
 import pandas as pd
 import networkx as nx
-import itertools
 from collections import Counter
 import numpy as np
 from gprofiler import GProfiler # Import GProfiler
 from bioservices import KEGG # Import BioServices KEGG
-from services.retriever import get_passages
-from services.prompts   import build_prompt
-from services.llm       import call_llm
+from services.retriever import get_passages, embed_queries, embed_with_queries, query_passages, query_text, warm_embeddings
+from services.semantic_cache import SemanticCache
+from services.prompts   import build_prompt, prompt_version
+from services.llm       import call_llm, call_llm_stream, DEFAULT_MODEL
+from services.annotation_cache import AnnotationCache, AnnotationKey
+from services.upstream  import call_upstream, iterate_upstream, RateLimiter, VIEW_TIMEOUT_SECONDS
+from services.upstream  import metrics as upstream_metrics
+from analytics.orbits import compute_gdv, gdv_similarity, ORBIT_COUNT
+from analytics.jobs import MAX_FINISHED_JOBS, AnalyticsJobs, JobCancelled, graphlet_summary
+from analytics.differential import EDGE_VIEWS, GENE_SORTS, NetworkDiff
+from analytics.graphlet_sampling import (DEFAULT_MAX_ERROR, DEFAULT_TIME_BUDGET, estimate_graphlets,
+                                         exact_estimate, merge_samples)
+from graph_store import CompactGraph
+from search_index import TextIndex, parse_query
+from gene_records import GeneRecordCache, clean_gene_info, etag_matches
+from workspace import DEFAULT_SESSION, WorkspaceStore, backend_from_env, valid_name
+from pathway_index import PathwayDiseaseIndex
 import json
 import re
 import ast
 
+# Annotations are cached per (gene, view, k, model, prompt template and budget) in SQLite
+# (see services/annotation_cache.py); the old JSON cache is imported once.
 ANNOTATION_CACHE_FILE = "annotation_cache.json"
-annotation_cache_lock = threading.Lock()
+ANNOTATION_CACHE_DB = "annotation_cache.db"
+# Failed lookups are cached briefly so transient upstream errors are retried
+ANNOTATION_ERROR_TTL_SECONDS = 3600
 
-def load_annotation_cache():
-    if not os.path.exists(ANNOTATION_CACHE_FILE):
-        return {}
-    try:
-        with open(ANNOTATION_CACHE_FILE, "r") as f:
-            return json.load(f)
-    except Exception:
-        return {}
+def annotation_key(gene, view, k=5):
+    return AnnotationKey(gene, view, k, DEFAULT_MODEL, prompt_version(view))
 
-def save_annotation_cache(cache):
-    with annotation_cache_lock:
-        with open(ANNOTATION_CACHE_FILE, "w") as f:
-            json.dump(cache, f, indent=2)
+annotation_cache = AnnotationCache(ANNOTATION_CACHE_DB)
+annotation_cache.migrate_json(ANNOTATION_CACHE_FILE, annotation_key)
+annotation_cache.purge_expired()
 
 class NodeRequest(BaseModel):
     node_id: str
-    graph_index: int = 0  # Default to first graph
+    graph_index: Union[int, str] = 0  # Default to first graph
 
 class GraphIndexRequest(BaseModel):
-    graph_index: int
+    graph_index: Union[int, str]
 
 class ChatRequest(BaseModel):
     gene: str
     message: str
     conversation_history: str
 
-app = FastAPI()
+class BatchAnnotationRequest(BaseModel):
+    genes: Optional[List[str]] = None
+    graph_index: Optional[Union[int, str]] = None  # annotate every gene of this graph instead
+
+def warm_embedding_cache():
+    try:
+        embedded = warm_embeddings(sorted(indexed_genes))
+        print(f"Embedding cache warm: {embedded} new query embeddings")
+    except Exception as e:
+        print(f"Embedding cache warm-up failed: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    reference.load_in_background()
+    if os.getenv("EMBEDDING_WARMUP", "1") == "1":
+        threading.Thread(target=warm_embedding_cache, name="embedding-warmup", daemon=True).start()
+    yield
+    analytics_jobs.shutdown()
+
+app = FastAPI(lifespan=lifespan)
 # Allow frontend dev server
 app.add_middleware(
     CORSMiddleware,
@@ -72,45 +104,126 @@ app.add_middleware(
 
 api_url = "https://netcancer-rh4m2e306-abhinavs-projects-599e34c1.vercel.app/"
 
-# Store multiple graphs
-original_graphs = [
-    {"nodes": [], "links": []},  # First graph
-    {"nodes": [], "links": []}   # Second graph
-]
-
-current_graphs = [
-    {"nodes": [], "links": []},  # First graph
-    {"nodes": [], "links": []}   # Second graph
-]
+# Graphs (compact CSR structures, see graph_store.py), their expression data
+# and derived results live in per-session workspaces (see workspace.py). The
+# graph_index of the endpoints is the name of a graph in the workspace
+workspaces = WorkspaceStore(backend_from_env())
 
-# In-memory storage for expression data
-expression_data_store: Dict[int, Dict[str, Dict[str, float]]] = {}
+def get_workspace(x_session_id: Optional[str] = Header(None)):
+    """
+    The caller's workspace, chosen by the X-Session-ID header ("default"
+    without one). It is kept in memory for the duration of the request.
+    """
+    session_id = x_session_id or DEFAULT_SESSION
+    if not valid_name(session_id):
+        raise HTTPException(status_code=400, detail="Invalid X-Session-ID. Use 1-64 letters, digits, '_', '-' or '.'.")
+    workspace = workspaces.acquire(session_id)
+    try:
+        yield workspace
+    finally:
+        workspaces.release(workspace)
+
+def invalid_graph_index(workspace, *graph_indices):
+    """A 400 response if any of the graphs is not in the workspace, else None."""
+    for graph_index in graph_indices:
+        if graph_index not in workspace.current_graphs:
+            return JSONResponse(
+                status_code=400,
+                content={"message": f"Invalid graph index. Must be one of: {', '.join(workspace.names())}"}
+            )
+    return None
 
 graph_theory_metrics = [
     {}, {}
 ]
 
-# Load CSV gene annotation data into memory
-gene_info_db = {}
-data_dirs = ["gene_data/annotations", "gene_data/general"]
-for data_dir in data_dirs:
-    for fname in os.listdir(data_dir):
-        if fname.endswith(".csv"):
-            update_gene_data_dict(gene_info_db, data_dir, fname)
-        elif fname.endswith(".tsv"):
-            update_gene_data_dict(gene_info_db, data_dir, fname, sep="\t")
-
-interaction_dir = "gene_data/interactions"
-interaction_info_db = {}
-for fname in os.listdir(interaction_dir):
-    if fname.endswith(".csv"):
-        update_link_data_dict(interaction_info_db, interaction_dir, fname)
-    elif fname.endswith(".tsv"):
-        update_link_data_dict(interaction_info_db, interaction_dir, fname)
-
-# Add cache dictionary at the top level
-graphlet_cache = {}
-shared_genes_cache = None  # Will store the set of shared genes between graphs
+# Reference annotation and interaction data are loaded lazily: each source is
+# read the first time an endpoint needs it, and all of them are warmed up in a
+# background thread at startup (progress is reported by /health)
+reference = ReferenceRegistry(["gene_data/annotations", "gene_data/general"], "gene_data/interactions")
+gene_info_db = reference.gene_info_db
+gene_records = GeneRecordCache(reference)
+interaction_evidence = reference.interaction_evidence
+# Gene -> pathway / disease terms for /multi-annotate, built on first use
+pathway_disease_index = PathwayDiseaseIndex(reference)
+# Enriched terms of each kind handed to the LLM, best first
+MULTI_ANNOTATE_MAX_CANDIDATES = 20
+
+# Derived results are cached together with the version of the graph they were
+# computed from (see graph_store.py), so edits never serve stale results. The
+# caches of per-graph results belong to the workspaces
+search_index_cache = {}  # "reference" -> (gene record generation, index)
+
+def cached_for_graph(cache, key, graph, compute):
+    """
+    Return cache[key] if it was computed for the graph's current version,
+    otherwise recompute it and replace the stale entry.
+    """
+    entry = cache.get(key)
+    if entry is not None and entry[0] == graph.version:
+        return entry[1]
+    result = compute()
+    cache[key] = (graph.version, result)
+    return result
+
+# CPU-heavy analytics run in worker processes (see analytics/jobs.py)
+analytics_jobs = AnalyticsJobs()
+
+def run_on_graphs(workspace, kind, task, cache, items, params, build, refresh=False, combine=None):
+    """
+    build(results) where each result is TASKS[task](graph, **params), taking
+    results of the graphs' current versions from `cache` and computing the
+    others in an analytics job, whose results are stored back in `cache`.
+
+    Args:
+        cache: one of the workspace's caches
+        items: (cache key, graph) pairs
+        refresh: compute every result again, even if cached
+        combine: combine(cached, new) result stored when a result is
+            recomputed for the version already cached (default: replace it)
+
+    Returns:
+        (payload, None) when every result was cached, otherwise (None, job)
+        for a job whose result is the payload
+    """
+    entries = [cache.get(key) for key, _ in items]
+    known = {key: entry[1] for (key, graph), entry in zip(items, entries)
+             if entry is not None and entry[0] == graph.version and not refresh}
+    missing = [(key, graph) for key, graph in items if key not in known]
+    if not missing:
+        return build([known[key] for key, _ in items]), None
+
+    versions = [graph.version for _, graph in missing]
+    def finish(results):
+        computed = {}
+        for (key, _), version, result in zip(missing, versions, results):
+            entry = cache.get(key)
+            if combine is not None and entry is not None and entry[0] == version:
+                result = combine(entry[1], result)
+            # Keep a result computed for a newer version of the graph
+            if entry is None or entry[0] <= version:
+                cache[key] = (version, result)
+            computed[key] = result
+        return build([known[key] if key in known else computed[key] for key, _ in items])
+
+    job = analytics_jobs.submit(kind, task, [graph for _, graph in missing], params, finish,
+                                scope=tuple(key for key, _ in items), owner=workspace.session_id)
+    return None, job
+
+async def analytics_response(job, wait):
+    """
+    The job's result, or (when the caller does not wait) a 202 with the job
+    to poll at /analytics-jobs/{job_id}.
+    """
+    if not wait:
+        return JSONResponse(status_code=202, content=analytics_jobs.get(job["job_id"], include_result=False,
+                                                                        owner=job["owner"]))
+    try:
+        return await analytics_jobs.wait(job)
+    except JobCancelled:
+        return JSONResponse(status_code=409, content={"message": f"Analytics job {job['job_id']} was cancelled"})
+    except Exception as e:
+        return JSONResponse(status_code=500, content={"message": f"Analytics job failed: {e}"})
 
 # Load indexed genes at startup
 INDEXED_GENE_FILE = "indexed_gene.txt"
@@ -127,6 +240,16 @@ def record_not_indexed_gene(gene):
     with open(NOT_INDEXED_GENE_FILE, "a") as f:
         f.write(gene + "\n")
 
+@app.get("/health")
+def health():
+    """
+    Liveness plus readiness of the lazily loaded reference data sources.
+    """
+    return {
+        "status": "ok" if reference.ready else "loading",
+        "reference_data": reference.health()
+    }
+
 @app.get("/", response_class=HTMLResponse)
 def read_root():
     return """
@@ -145,181 +268,220 @@ def read_root():
     """
 
 @app.post("/upload")
-async def upload_file(file: UploadFile = File(...), graph_index: int = 0):
-    global shared_genes_cache
-    # Clear the shared genes cache when a graph is updated
-    shared_genes_cache = None
-    
-    content = await file.read()
-    decoded = content.decode("utf-8")
-    reader = csv.reader(io.StringIO(decoded), delimiter=',' if file.filename.endswith(".csv") else '\t')
+async def upload_file(file: UploadFile = File(...), graph_index: str = "0", workspace=Depends(get_workspace)):
+    # Any valid name is accepted; uploading to a new one adds a graph
+    if not valid_name(graph_index):
+        return JSONResponse(
+            status_code=400,
+            content={"message": "Invalid graph index. Use 1-64 letters, digits, '_', '-' or '.'."}
+        )
 
-    nodes = set()
-    links = []
-    header_skipped = False
-    for row in reader:
-        if not header_skipped:
-            header_skipped = True
-            continue
-        if len(row) < 3:
-            continue
-        gene1, gene2, weight = row[0], row[1], float(row[2])
-        nodes.add(gene1)
-        nodes.add(gene2)
-        links.append({"source": gene1, "target": gene2, "weight": weight})
-
-    # Calculate node degrees and get cancer driver info
-    node_degrees = {}
-    node_cancer_drivers = {}
-    for link in links:
-        source = link["source"]
-        target = link["target"]
-        node_degrees[source] = node_degrees.get(source, 0) + 1
-        node_degrees[target] = node_degrees.get(target, 0) + 1
-        
-        # Get cancer driver info from gene_info_db
-        for gene in [source, target]:
-            if gene not in node_cancer_drivers:
-                gene_info = gene_info_db.get(gene.upper(), {})
-                cancer_drivers = gene_info.get('cancer', [])
-                node_cancer_drivers[gene] = len(cancer_drivers) if isinstance(cancer_drivers, list) else 1 if cancer_drivers else 0
-
-    node_list = [{
-        "id": n,
-        "val": node_degrees.get(n, 0),
-        "cancer_drivers": node_cancer_drivers.get(n, 0)
-    } for n in nodes]
-    
-    # Ensure graph_index is valid
-    if graph_index < 0 or graph_index >= len(original_graphs):
+    sep = ',' if file.filename.endswith(".csv") else '\t'
+    status = {"status": "parsing", "bytes_read": 0, "total_bytes": file.size, "edges": 0}
+    # Polled via /upload-progress; kept on the workspace so it goes away with it
+    workspace.upload_progress[graph_index] = status
+
+    def report(bytes_read, edges):
+        status["bytes_read"] = bytes_read
+        status["edges"] = edges
+
+    def build_graph():
+        # Parse the spooled upload in chunks instead of reading it into memory
+        reference.require("appic")  # cancer driver counts
+        file.file.seek(0)
+        genes, sources, targets, weights = parse_interaction_file(file.file, sep=sep, progress=report)
+        return CompactGraph.from_edges(
+            genes, sources, targets, weights,
+            [count_cancer_drivers(gene) for gene in genes]
+        )
+
+    # Parsing is CPU-bound, keep it off the event loop
+    try:
+        graph = await run_in_threadpool(build_graph)
+    except (ValueError, UnicodeDecodeError) as e:
+        status["status"] = "failed"
         return JSONResponse(
             status_code=400,
-            content={"message": f"Invalid graph index. Must be between 0 and {len(original_graphs)-1}"}
+            content={"message": f"Could not parse interaction file: {e}"}
         )
-    
-    # Update both original and current graphs
-    original_graphs[graph_index]["nodes"] = node_list.copy()
-    original_graphs[graph_index]["links"] = links.copy()
-    current_graphs[graph_index]["nodes"] = node_list.copy()
-    current_graphs[graph_index]["links"] = links.copy()
+    status["status"] = "done"
+
+    # Update both original and current graphs; the current graph shares the
+    # CSR arrays and only owns its removal state
+    workspace.set_graph(graph_index, graph)
     
     return {
         "message": f"File processed successfully for graph {graph_index}", 
-        "node_count": len(nodes), 
-        "nodes": list(nodes)
+        "node_count": graph.num_nodes, 
+        "nodes": graph.genes
     }
 
+@app.get("/upload-progress/{graph_index}")
+def get_upload_progress(graph_index: str, workspace=Depends(get_workspace)):
+    if graph_index not in workspace.upload_progress:
+        raise HTTPException(status_code=404, detail="No upload recorded for this graph.")
+    return workspace.upload_progress[graph_index]
+
+def count_cancer_drivers(gene):
+    """Number of cancer driver annotations for a gene in gene_info_db."""
+    gene_info = gene_info_db.get(gene.upper(), {})
+    cancer_drivers = gene_info.get('cancer', [])
+    return len(cancer_drivers) if isinstance(cancer_drivers, list) else 1 if cancer_drivers else 0
+
+def graph_response(graph):
+    """Serve the cached JSON view of a graph without re-encoding it."""
+    return Response(content=graph.json_bytes(), media_type="application/json")
+
 @app.get("/graph-data/{graph_index}")
-def get_graph(graph_index: int):
-    if graph_index < 0 or graph_index >= len(current_graphs):
-        return JSONResponse(
-            status_code=400,
-            content={"message": f"Invalid graph index. Must be between 0 and {len(current_graphs)-1}"}
-        )
-    return current_graphs[graph_index]
+def get_graph(graph_index: str, workspace=Depends(get_workspace)):
+    error = invalid_graph_index(workspace, graph_index)
+    if error is not None:
+        return error
+    return graph_response(workspace.current_graphs[graph_index])
 
 @app.get("/original-graph-data")
-def get_original_graph(graph_index: int = 0):
-    if graph_index < 0 or graph_index >= len(original_graphs):
-        return JSONResponse(
-            status_code=400,
-            content={"message": f"Invalid graph index. Must be between 0 and {len(original_graphs)-1}"}
-        )
-    return original_graphs[graph_index]
+def get_original_graph(graph_index: str = "0", workspace=Depends(get_workspace)):
+    error = invalid_graph_index(workspace, graph_index)
+    if error is not None:
+        return error
+    return graph_response(workspace.original_graphs[graph_index])
+
+@app.get("/graphs")
+def list_graphs(workspace=Depends(get_workspace)):
+    """The graphs of the caller's workspace with their current sizes."""
+    return {
+        "session_id": workspace.session_id,
+        "graphs": [{
+            "graph_index": name,
+            "num_nodes": graph.num_nodes,
+            "num_edges": graph.num_edges,
+            "original_num_nodes": workspace.original_graphs[name].num_nodes,
+            "has_expression_data": name in workspace.expression_data
+        } for name, graph in workspace.current_graphs.items()],
+        "memory_bytes": workspace.nbytes
+    }
+
+@app.delete("/graphs/{graph_index}")
+def delete_graph(graph_index: str, workspace=Depends(get_workspace)):
+    error = invalid_graph_index(workspace, graph_index)
+    if error is not None:
+        return error
+    workspace.delete_graph(graph_index)
+    return {"message": f"Graph {graph_index} deleted", "graphs": workspace.names()}
+
+@app.get("/workspace-stats")
+def get_workspace_stats():
+    """Sessions held in memory, their memory use and eviction counters."""
+    return workspaces.stats()
 
 @app.post("/remove-node")
-def remove_nodes(node: NodeRequest):
-    global shared_genes_cache
-    # Clear the shared genes cache when a node is removed
-    shared_genes_cache = None
-    
-    graph_index = node.graph_index
+def remove_nodes(node: NodeRequest, workspace=Depends(get_workspace)):
+    graph_index = str(node.graph_index)
     node_id = node.node_id
     
-    if graph_index < 0 or graph_index >= len(current_graphs):
-        return JSONResponse(
-            status_code=400,
-            content={"message": f"Invalid graph index. Must be between 0 and {len(current_graphs)-1}"}
-        )
+    error = invalid_graph_index(workspace, graph_index)
+    if error is not None:
+        return error
     
-    current_graphs[graph_index]["nodes"] = [n for n in current_graphs[graph_index]["nodes"] if n["id"] != node_id]
-    current_graphs[graph_index]["links"] = [l for l in current_graphs[graph_index]["links"] if l["source"] != node_id and l["target"] != node_id]
-    return current_graphs[graph_index]
+    # O(degree) update; bumps the graph version so cached analyses expire
+    workspace.remove_node(graph_index, node_id)
+    return graph_response(workspace.current_graphs[graph_index])
 
 @app.post("/reset-graph")
-def reset_graph(request: GraphIndexRequest):
-    global shared_genes_cache
-    # Clear the shared genes cache when a graph is reset
-    shared_genes_cache = None
+def reset_graph(request: GraphIndexRequest, workspace=Depends(get_workspace)):
+    graph_index = str(request.graph_index)
     
-    graph_index = request.graph_index
+    error = invalid_graph_index(workspace, graph_index)
+    if error is not None:
+        return error
     
-    if graph_index < 0 or graph_index >= len(original_graphs):
-        return JSONResponse(
-            status_code=400,
-            content={"message": f"Invalid graph index. Must be between 0 and {len(original_graphs)-1}"}
-        )
-    
-    current_graphs[graph_index]["nodes"] = original_graphs[graph_index]["nodes"].copy()
-    current_graphs[graph_index]["links"] = original_graphs[graph_index]["links"].copy()
-    return current_graphs[graph_index]
+    workspace.reset_graph(graph_index)
+    return graph_response(workspace.current_graphs[graph_index])
 
 @app.post("/analyze-graph")
-def analyze_graph(request: GraphIndexRequest):
-    graph_index = request.graph_index
+def analyze_graph(request: GraphIndexRequest, workspace=Depends(get_workspace)):
+    graph_index = str(request.graph_index)
     
-    if graph_index < 0 or graph_index >= len(current_graphs):
-        return JSONResponse(
-            status_code=400,
-            content={"message": f"Invalid graph index. Must be between 0 and {len(current_graphs)-1}"}
-        )
+    error = invalid_graph_index(workspace, graph_index)
+    if error is not None:
+        return error
     
     # Dummy ML score for now
     return {"score": 0.76, "cancer_like": True, "method": "GCN (dummy)", "graph_index": graph_index}
 
-def clean_gene_info(raw: dict) -> dict:
-    """
-    Normalize any list/np.ndarray/pd.Series into JSON‑serializable strings;
-    turn pandas NA into None; cast everything else to str.
-    """
-    clean: dict = {}
-    for k, v in raw.items():
-        # list, numpy array, or pandas Series → JSONable list → string
-        if isinstance(v, (list, np.ndarray, pd.Series)):
-            array = v.tolist() if hasattr(v, "tolist") else list(v)
-            clean[k] = ", ".join(str(x) for x in array)
-        # pandas NA (or numpy NaN) → None
-        elif pd.isna(v):
-            clean[k] = None
-        # otherwise → string
-        else:
-            clean[k] = str(v)
-    return clean
+def get_reference_search_index():
+    """
+    Inverted index over the precomputed gene records, rebuilt only when more
+    reference data has been loaded since it was built.
+    """
+    documents = gene_records.cleaned()
+    entry = search_index_cache.get("reference")
+    if entry is None or entry[0] != gene_records.generation:
+        index = TextIndex(documents)
+        entry = search_index_cache["reference"] = (gene_records.generation, index)
+    return entry[1]
+
+def get_symbol_search_index(workspace, graph_index):
+    """
+    Inverted index over the gene symbols of a graph. Removing nodes does not
+    change the gene table, so it only needs rebuilding after an upload.
+    """
+    graph = workspace.current_graphs[graph_index]
+    entry = workspace.symbol_index_cache.get(graph_index)
+    if entry is None or entry[0] is not graph.genes:
+        index = TextIndex((gene, {"symbol": gene}) for gene in graph.genes)
+        entry = workspace.symbol_index_cache[graph_index] = (graph.genes, index)
+    return entry[1]
+
+def genes_in_degree_range(workspace, graph_index, min_degree, max_degree):
+    """
+    Genes whose degree lies in [min_degree, max_degree], found by binary
+    search over the graph's degrees sorted once per version.
+    """
+    graph = workspace.current_graphs[graph_index]
+
+    def sort_by_degree():
+        ids = graph.node_ids()
+        order = np.argsort(graph.degrees()[ids], kind="stable")
+        return graph.degrees()[ids][order], ids[order]
+
+    sorted_degrees, sorted_ids = cached_for_graph(workspace.degree_order_cache, graph_index, graph, sort_by_degree)
+    lo = np.searchsorted(sorted_degrees, min_degree, side="left")
+    hi = np.searchsorted(sorted_degrees, max_degree, side="right")
+    return [graph.genes[i] for i in sorted_ids[lo:hi].tolist()]
 
 @app.get("/search")
-def search_genes(keyword: str = "", min_degree: int = 0, max_degree: int = 20, graph_index: int = 0):
+def search_genes(keyword: str = "", min_degree: int = 0, max_degree: int = 20, graph_index: str = "0",
+                 workspace=Depends(get_workspace)):
     """
     Search for genes in the database based on a keyword.
     If keyword is empty, return all genes within the degree range.
+
+    The keyword is matched as a substring of the gene symbol or of any
+    annotation field; `field:term` restricts it to one field (e.g.
+    `cancer_type:glioma`) and a trailing `*` makes it a word prefix search.
     """
-    results = set()
-    for gene in current_graphs[graph_index]["nodes"]:
-        # First check if the gene's degree is within range
-        if gene["val"] >= min_degree and gene["val"] <= max_degree:
-            # If keyword is empty, include all genes within degree range
-            if not keyword:
-                results.add(gene["id"])
-                continue
-                
-            # Otherwise, check if gene matches the keyword
-            if gene["id"] in gene_info_db:
-                info = gene_info_db[gene["id"]]
-                clean_info = clean_gene_info(info)
-                for key, value in clean_info.items():
-                    if keyword.lower() in value.lower():
-                        results.add(gene["id"])
-            if keyword.lower() in gene["id"].lower():
-                results.add(gene["id"])
+    error = invalid_graph_index(workspace, graph_index)
+    if error is not None:
+        return error
+
+    if not keyword:
+        results = genes_in_degree_range(workspace, graph_index, min_degree, max_degree)
+    else:
+        reference_index = get_reference_search_index()
+        symbol_index = get_symbol_search_index(workspace, graph_index)
+        query = parse_query(keyword, reference_index.fields | symbol_index.fields)
+        if query is None:
+            return JSONResponse(status_code=400, content={"message": "Search keyword has no term to match"})
+        matches = reference_index.search(query) | symbol_index.search(query)
+
+        # Only the matches need their degree checked
+        graph = workspace.current_graphs[graph_index]
+        degrees = graph.degrees()
+        results = [
+            gene for gene in matches
+            if graph.has_gene(gene) and min_degree <= degrees[graph.gene_index[gene]] <= max_degree
+        ]
                 
     return JSONResponse(
             content={"gene": list(results)},
@@ -375,10 +537,21 @@ def get_gene_enrichment(gene_symbol: str):
         )
 
 @app.get("/gene/{gene_name}")
-def get_gene_details(gene_name: str):
+def get_gene_details(gene_name: str, request: Request):
+    """
+    Serve the precomputed record of a gene. Clients revalidating with
+    If-None-Match get a 304 while the reference data is unchanged.
+    """
     gene = gene_name.upper()
-    info = gene_info_db.get(gene)
-    if info is None:
+    try:
+        record = gene_records.get(gene)
+    except Exception as e:
+        return JSONResponse(
+            status_code=500,
+            content={"error": str(e), "gene": gene_name},
+            headers={"Access-Control-Allow-Origin": api_url}
+        )
+    if record is None:
         return JSONResponse(
             content={
                 "gene": gene,
@@ -388,57 +561,156 @@ def get_gene_details(gene_name: str):
             headers={"Access-Control-Allow-Origin": api_url}
         )
 
-    try:
-        cleaned = clean_gene_info(info)
-        return JSONResponse(
-            content={"gene": gene, "data": cleaned},
-            headers={"Access-Control-Allow-Origin": api_url}
-        )
-    except Exception as e:
-        return JSONResponse(
-            status_code=500,
-            content={"error": str(e), "gene": gene_name},
-            headers={"Access-Control-Allow-Origin": api_url}
-        )
+    body, etag = record
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "no-cache",
+        "Access-Control-Allow-Origin": api_url
+    }
+    if etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
     
 @app.get("/interaction/{gene1}/{gene2}")
 def get_interaction(gene1: str, gene2: str):
-    if gene1 not in interaction_info_db or gene2 not in interaction_info_db[gene1]:
+    sources = reference.interactions().sources(gene1, gene2)
+    if sources is None:
         return JSONResponse(
             content={"message": "No interaction found between the two genes"},
             headers={"Access-Control-Allow-Origin": api_url}
         )
     return JSONResponse(
             content={
-                "sources": list(set(interaction_info_db[gene1][gene2]))
+                "sources": sources
+            },
+            headers={"Access-Control-Allow-Origin": api_url}
+        )
+
+@app.get("/interaction-evidence/{graph_index}")
+def get_interaction_evidence(graph_index: str, workspace=Depends(get_workspace)):
+    """
+    Reference evidence for every link of a graph in one call: the sources
+    reporting each pair and their scores, in the same order as the links of
+    /graph-data.
+    """
+    error = invalid_graph_index(workspace, graph_index)
+    if error is not None:
+        return error
+
+    graph = workspace.current_graphs[graph_index]
+    sources, targets, _ = graph.edges()
+    annotations = reference.interactions().annotate(graph.genes, sources, targets)
+
+    links = []
+    counts = Counter()
+    for s, t, annotation in zip(sources.tolist(), targets.tolist(), annotations):
+        links.append({"source": graph.genes[s], "target": graph.genes[t], **annotation})
+        counts.update(annotation["sources"])
+
+    return JSONResponse(
+            content={
+                "links": links,
+                "summary": {
+                    "total_links": len(links),
+                    "supported_links": sum(1 for link in links if link["sources"]),
+                    "by_source": dict(counts)
+                }
             },
             headers={"Access-Control-Allow-Origin": api_url}
         )
 
 
+def graphlet_items(workspace, graph_indices, size):
+    """(graphlet_cache key, graph) pairs, filling in 3-node counts that are free to compute."""
+    items = []
+    for graph_index in graph_indices:
+        graph = workspace.current_graphs[graph_index]
+        if size == 3 and graph.has_motif_counts:
+            # Triangle and wedge totals are kept up to date across removals
+            cached_for_graph(workspace.graphlet_cache, (graph_index, size), graph,
+                             lambda: graphlet_summary(graph, size))
+        items.append(((graph_index, size), graph))
+    return items
+
+MAX_TIME_BUDGET = 60.0
+
+def invalid_graphlet_mode(mode, max_error, time_budget):
+    """A 400 response for bad mode=approx parameters, or None."""
+    if mode not in ("exact", "approx"):
+        return JSONResponse(status_code=400, content={"message": "Mode must be exact or approx"})
+    if not 0 < max_error <= 1:
+        return JSONResponse(status_code=400, content={"message": "max_error must be in (0, 1]"})
+    if not 0 < time_budget <= MAX_TIME_BUDGET:
+        return JSONResponse(status_code=400, content={"message": f"time_budget must be in (0, {MAX_TIME_BUDGET:g}] seconds"})
+    return None
+
+def graphlet_estimates(workspace, kind, graph_indices, size, max_error, time_budget, refine, build):
+    """
+    run_on_graphs for mode=approx: build(estimates), one estimate (see
+    analytics/graphlet_sampling.py) per graph index.
+
+    3-node counts and 4-node counts already known exactly are returned as
+    exact estimates. Otherwise the sampling state cached for the graph's
+    version is used, and refining (or a first call) runs a job that samples
+    further and adds its batches to that state.
+    """
+    if size == 3:
+        # Exact 3-node counts are linear-time, and kept up to date across removals
+        return run_on_graphs(workspace, kind, "graphlets", workspace.graphlet_cache,
+                             graphlet_items(workspace, graph_indices, size), {"size": size},
+                             lambda results: build([exact_estimate(result, max_error) for result in results]))
+
+    exact = {}
+    for graph_index in graph_indices:
+        entry = workspace.graphlet_cache.get((graph_index, size))
+        if entry is not None and entry[0] == workspace.current_graphs[graph_index].version:
+            exact[graph_index] = entry[1]
+    items = [((graph_index, size, "approx"), workspace.current_graphs[graph_index])
+             for graph_index in graph_indices if graph_index not in exact]
+
+    def estimates(states):
+        sampled = dict(zip([key[0] for key, _ in items], states))
+        return build([exact_estimate(exact[graph_index], max_error) if graph_index in exact
+                      else estimate_graphlets(sampled[graph_index], max_error) for graph_index in graph_indices])
+
+    # Refinements draw fresh samples (and are never deduplicated)
+    params = {"size": size, "max_error": max_error, "time_budget": time_budget,
+              "seed": int(uuid.uuid4().int % 2 ** 32) if refine else 0}
+    return run_on_graphs(workspace, kind, "graphlets-approx", workspace.graphlet_cache, items, params,
+                         estimates, refresh=refine, combine=merge_samples)
+
 @app.get("/graphlet-analysis")
-def perform_graphlet_analysis(graph_index: int = 0, size: int = 3):
+async def perform_graphlet_analysis(graph_index: str = "0", size: int = 3, wait: bool = True,
+                                    mode: str = "exact", max_error: float = DEFAULT_MAX_ERROR,
+                                    time_budget: float = DEFAULT_TIME_BUDGET, refine: bool = False,
+                                    workspace=Depends(get_workspace)):
     """
     Perform graphlet analysis on the specified graph.
     
     Args:
         graph_index: Index of the graph to analyze
         size: Size of graphlets to analyze (3 or 4)
+        wait: If false and the counts are not cached, return the analytics
+            job right away (202) instead of waiting for it
+        mode: "exact", or "approx" to estimate 4-node counts by path sampling
+        max_error: approx mode: target relative half-width of the 95%
+            confidence intervals
+        time_budget: approx mode: seconds of sampling at most per call
+        refine: approx mode: sample again and pool the new samples with the
+            earlier ones for this graph version, narrowing the intervals
         
     Returns:
-        Dictionary containing graphlet counts and frequencies
+        Dictionary containing graphlet counts and frequencies (in approx mode
+        also their confidence intervals)
     """
     print(f"\n=== Starting graphlet analysis ===")
     print(f"Graph index: {graph_index}")
     print(f"Size: {size}")
-    print(f"Current graphs length: {len(current_graphs)}")
     
-    if graph_index < 0 or graph_index >= len(current_graphs):
+    error = invalid_graph_index(workspace, graph_index)
+    if error is not None:
         print(f"Invalid graph index {graph_index}")
-        return JSONResponse(
-            status_code=400,
-            content={"message": f"Invalid graph index. Must be between 0 and {len(current_graphs)-1}"}
-        )
+        return error
     
     if size not in [3, 4]:
         print(f"Invalid graphlet size {size}")
@@ -446,203 +718,62 @@ def perform_graphlet_analysis(graph_index: int = 0, size: int = 3):
             status_code=400,
             content={"message": "Graphlet size must be 3 or 4"}
         )
+    error = invalid_graphlet_mode(mode, max_error, time_budget)
+    if error is not None:
+        return error
     
-    # Check cache first
-    cache_key = f"{graph_index}_{size}"
-    if cache_key in graphlet_cache:
-        print(f"Using cached graphlet analysis for graph {graph_index} with size {size}")
-        return graphlet_cache[cache_key]
-    
-    # Get the graph data
-    graph_data = current_graphs[graph_index]
-    print(f"\nGraph data for index {graph_index}:")
-    print(f"Number of nodes: {len(graph_data['nodes'])}")
-    print(f"Number of links: {len(graph_data['links'])}")
-    print(f"First few nodes: {graph_data['nodes'][:3]}")
-    print(f"First few links: {graph_data['links'][:3]}")
-    
-    # Create a NetworkX graph
-    G = nx.Graph()
-    
-    # Add nodes
-    for node in graph_data["nodes"]:
-        G.add_node(node["id"])
-    
-    # Add edges
-    for link in graph_data["links"]:
-        G.add_edge(link["source"], link["target"])
-    
-    print(f"\nNetworkX graph created:")
-    print(f"Number of nodes: {G.number_of_nodes()}")
-    print(f"Number of edges: {G.number_of_edges()}")
-    print(f"First few nodes: {list(G.nodes())[:3]}")
-    print(f"First few edges: {list(G.edges())[:3]}")
-    
-    # Perform graphlet analysis
-    if size == 3:
-        print("\nAnalyzing 3-node graphlets...")
-        result = analyze_graphlets_3(G)
+    # Cached per graph version, otherwise counted in a worker process
+    if mode == "approx":
+        result, job = graphlet_estimates(workspace, "graphlet-analysis", [graph_index], size,
+                                         max_error, time_budget, refine, lambda results: results[0])
     else:
-        print("\nAnalyzing 4-node graphlets...")
-        result = analyze_graphlets_4(G)
-    
-    # Cache the result
-    graphlet_cache[cache_key] = result
-    
-    print(f"\nAnalysis result: {result}")
-    print("=== End of graphlet analysis ===\n")
+        result, job = run_on_graphs(workspace, "graphlet-analysis", "graphlets", workspace.graphlet_cache,
+                                    graphlet_items(workspace, [graph_index], size), {"size": size},
+                                    lambda results: results[0])
+    if job is not None:
+        return await analytics_response(job, wait)
     return result
 
-def analyze_graphlets_3(G):
+def graphlet_comparison(graph_index1, graph_index2, size, analysis1, analysis2):
     """
-    Analyze 3-node graphlets in the graph.
-    
-    Returns:
-        Dictionary with graphlet counts and frequencies
+    Distances between the graphlet frequency distributions of two graphs.
     """
-    print("\n=== Starting 3-node graphlet analysis ===")
-    
-    # Define the 3-node graphlets
-    # G0: Empty graph (3 isolated nodes)
-    # G1: One edge
-    # G2: Two edges (path)
-    # G3: Three edges (triangle)
-    
-    # Initialize counters
-    counts = {
-        "G0": 0,  # 3 isolated nodes
-        "G1": 0,  # 1 edge
-        "G2": 0,  # 2 edges (path)
-        "G3": 0   # 3 edges (triangle)
-    }
-    
-    # Get all 3-node combinations
-    node_combinations = list(itertools.combinations(G.nodes(), 3))
-    print(f"Number of 3-node combinations: {len(node_combinations)}")
-    
-    for i, nodes in enumerate(node_combinations):
-        # Get the subgraph induced by these nodes
-        subgraph = G.subgraph(nodes)
-        
-        # Count edges in the subgraph
-        edge_count = subgraph.number_of_edges()
-        
-        # Classify the graphlet
-        if edge_count == 0:
-            counts["G0"] += 1
-        elif edge_count == 1:
-            counts["G1"] += 1
-        elif edge_count == 2:
-            counts["G2"] += 1
-        elif edge_count == 3:
-            counts["G3"] += 1
-            
-        if i < 5:  # Print first 5 combinations for debugging
-            print(f"Combination {i}: nodes={nodes}, edges={edge_count}")
-    
-    # Calculate frequencies
-    total = sum(counts.values())
-    frequencies = {k: v/total for k, v in counts.items()} if total > 0 else counts
-    
-    print(f"Final counts: {counts}")
-    print(f"Final frequencies: {frequencies}")
-    print("=== End of 3-node graphlet analysis ===\n")
-    
-    return {
-        "counts": counts,
-        "frequencies": frequencies,
-        "total_graphlets": total
-    }
-
-def analyze_graphlets_4(G):
-    """
-    Analyze 4-node graphlets in the graph.
-    
-    Returns:
-        Dictionary with graphlet counts and frequencies
-    """
-    print("\n=== Starting 4-node graphlet analysis ===")
-    
-    # Define the 4-node graphlets
-    # G0: Empty graph (4 isolated nodes)
-    # G1: One edge
-    # G2: Two edges (disconnected)
-    # G3: Two edges (path)
-    # G4: Three edges (star)
-    # G5: Three edges (path)
-    # G6: Four edges (cycle)
-    # G7: Five edges (claw)
-    # G8: Six edges (complete)
-    
-    # Initialize counters
-    counts = {
-        "G0": 0,  # 4 isolated nodes
-        "G1": 0,  # 1 edge
-        "G2": 0,  # 2 edges (disconnected)
-        "G3": 0,  # 2 edges (path)
-        "G4": 0,  # 3 edges (star)
-        "G5": 0,  # 3 edges (path)
-        "G6": 0,  # 4 edges (cycle)
-        "G7": 0,  # 5 edges (claw)
-        "G8": 0   # 6 edges (complete)
-    }
+    # Calculate similarity metrics
+    frequencies1 = analysis1["frequencies"]
+    frequencies2 = analysis2["frequencies"]
     
-    # Get all 4-node combinations
-    node_combinations = list(itertools.combinations(G.nodes(), 4))
-    print(f"Number of 4-node combinations: {len(node_combinations)}")
+    # Calculate Euclidean distance between frequency distributions
+    euclidean_distance = sum((frequencies1.get(k, 0) - frequencies2.get(k, 0))**2 
+                            for k in set(frequencies1.keys()) | set(frequencies2.keys())) ** 0.5
     
-    for i, nodes in enumerate(node_combinations):
-        # Get the subgraph induced by these nodes
-        subgraph = G.subgraph(nodes)
-        
-        # Count edges in the subgraph
-        edge_count = subgraph.number_of_edges()
-        
-        # Classify the graphlet based on edge count and structure
-        if edge_count == 0:
-            counts["G0"] += 1
-        elif edge_count == 1:
-            counts["G1"] += 1
-        elif edge_count == 2:
-            # Check if the edges are connected or disconnected
-            components = list(nx.connected_components(subgraph))
-            if len(components) == 2:
-                counts["G2"] += 1
-            else:
-                counts["G3"] += 1
-        elif edge_count == 3:
-            # Check if it's a star or a path
-            degrees = [d for n, d in subgraph.degree()]
-            if max(degrees) == 3:
-                counts["G4"] += 1
-            else:
-                counts["G5"] += 1
-        elif edge_count == 4:
-            counts["G6"] += 1
-        elif edge_count == 5:
-            counts["G7"] += 1
-        elif edge_count == 6:
-            counts["G8"] += 1
-            
-        if i < 5:  # Print first 5 combinations for debugging
-            print(f"Combination {i}: nodes={nodes}, edges={edge_count}")
+    # Calculate Manhattan distance
+    manhattan_distance = sum(abs(frequencies1.get(k, 0) - frequencies2.get(k, 0)) 
+                           for k in set(frequencies1.keys()) | set(frequencies2.keys()))
     
-    # Calculate frequencies
-    total = sum(counts.values())
-    frequencies = {k: v/total for k, v in counts.items()} if total > 0 else counts
+    # Calculate cosine similarity
+    dot_product = sum(frequencies1.get(k, 0) * frequencies2.get(k, 0) 
+                     for k in set(frequencies1.keys()) & set(frequencies2.keys()))
+    norm1 = sum(v**2 for v in frequencies1.values()) ** 0.5
+    norm2 = sum(v**2 for v in frequencies2.values()) ** 0.5
     
-    print(f"Final counts: {counts}")
-    print(f"Final frequencies: {frequencies}")
-    print("=== End of 4-node graphlet analysis ===\n")
+    cosine_similarity = dot_product / (norm1 * norm2) if norm1 > 0 and norm2 > 0 else 0
     
     return {
-        "counts": counts,
-        "frequencies": frequencies,
-        "total_graphlets": total
+        "graph1_index": graph_index1,
+        "graph2_index": graph_index2,
+        "graphlet_size": size,
+        "euclidean_distance": euclidean_distance,
+        "manhattan_distance": manhattan_distance,
+        "cosine_similarity": cosine_similarity,
+        "graph1_analysis": analysis1,
+        "graph2_analysis": analysis2
     }
 
 @app.get("/compare-graphlets")
-def compare_graphlets(graph_index1: int = 0, graph_index2: int = 1, size: int = 3):
+async def compare_graphlets(graph_index1: str = "0", graph_index2: str = "1", size: int = 3, wait: bool = True,
+                            mode: str = "exact", max_error: float = DEFAULT_MAX_ERROR,
+                            time_budget: float = DEFAULT_TIME_BUDGET, refine: bool = False,
+                            workspace=Depends(get_workspace)):
     """
     Compare graphlet distributions between two graphs.
     
@@ -650,19 +781,19 @@ def compare_graphlets(graph_index1: int = 0, graph_index2: int = 1, size: int =
         graph_index1: Index of the first graph
         graph_index2: Index of the second graph
         size: Size of graphlets to analyze (3 or 4)
+        wait: If false and the counts are not cached, return the analytics
+            job right away (202) instead of waiting for it
+        mode, max_error, time_budget, refine: as for /graphlet-analysis
         
     Returns:
         Dictionary containing comparison metrics
     """
     print(f"Comparing graphlets between graphs {graph_index1} and {graph_index2} with size {size}")
     
-    if graph_index1 < 0 or graph_index1 >= len(current_graphs) or \
-       graph_index2 < 0 or graph_index2 >= len(current_graphs):
+    error = invalid_graph_index(workspace, graph_index1, graph_index2)
+    if error is not None:
         print(f"Invalid graph indices: {graph_index1}, {graph_index2}")
-        return JSONResponse(
-            status_code=400,
-            content={"message": "Invalid graph index"}
-        )
+        return error
     
     if size not in [3, 4]:
         print(f"Invalid graphlet size: {size}")
@@ -670,126 +801,227 @@ def compare_graphlets(graph_index1: int = 0, graph_index2: int = 1, size: int =
             status_code=400,
             content={"message": "Graphlet size must be 3 or 4"}
         )
+    error = invalid_graphlet_mode(mode, max_error, time_budget)
+    if error is not None:
+        return error
     
     # Get graphlet analysis for both graphs
-    print(f"Getting analysis for graph {graph_index1}")
-    analysis1 = perform_graphlet_analysis(graph_index1, size)
-    print(f"Analysis for graph {graph_index1}: {analysis1}")
-    
-    print(f"Getting analysis for graph {graph_index2}")
-    analysis2 = perform_graphlet_analysis(graph_index2, size)
-    print(f"Analysis for graph {graph_index2}: {analysis2}")
-    
-    # Calculate similarity metrics
-    frequencies1 = analysis1["frequencies"]
-    frequencies2 = analysis2["frequencies"]
-    
-    # Calculate Euclidean distance between frequency distributions
-    euclidean_distance = sum((frequencies1.get(k, 0) - frequencies2.get(k, 0))**2 
-                            for k in set(frequencies1.keys()) | set(frequencies2.keys())) ** 0.5
-    
-    # Calculate Manhattan distance
-    manhattan_distance = sum(abs(frequencies1.get(k, 0) - frequencies2.get(k, 0)) 
-                           for k in set(frequencies1.keys()) | set(frequencies2.keys()))
-    
-    # Calculate cosine similarity
-    dot_product = sum(frequencies1.get(k, 0) * frequencies2.get(k, 0) 
-                     for k in set(frequencies1.keys()) & set(frequencies2.keys()))
-    norm1 = sum(v**2 for v in frequencies1.values()) ** 0.5
-    norm2 = sum(v**2 for v in frequencies2.values()) ** 0.5
-    
-    cosine_similarity = dot_product / (norm1 * norm2) if norm1 > 0 and norm2 > 0 else 0
-    
-    result = {
-        "graph1_index": graph_index1,
-        "graph2_index": graph_index2,
-        "graphlet_size": size,
-        "euclidean_distance": euclidean_distance,
-        "manhattan_distance": manhattan_distance,
-        "cosine_similarity": cosine_similarity,
-        "graph1_analysis": analysis1,
-        "graph2_analysis": analysis2
-    }
-    
-    print(f"Comparison result: {result}")
+    indices = list(dict.fromkeys([graph_index1, graph_index2]))
+    by_index = lambda results: dict(zip(indices, results))
+    build = lambda results: graphlet_comparison(graph_index1, graph_index2, size,
+                                                by_index(results)[graph_index1], by_index(results)[graph_index2])
+    if mode == "approx":
+        result, job = graphlet_estimates(workspace, "compare-graphlets", indices, size,
+                                         max_error, time_budget, refine, build)
+    else:
+        result, job = run_on_graphs(workspace, "compare-graphlets", "graphlets", workspace.graphlet_cache,
+                                    graphlet_items(workspace, indices, size), {"size": size}, build)
+    if job is not None:
+        return await analytics_response(job, wait)
     return result
 
-@app.get("/shared-genes")
-def get_shared_genes():
+@app.get("/analytics-jobs/{job_id}")
+def get_analytics_job(job_id: str, workspace=Depends(get_workspace)):
     """
-    Get the set of genes that exist in both graphs.
-    Returns empty set if either graph is empty.
+    Status of an analytics job of the caller's session; its "result" is the
+    endpoint's response once the status is "done".
+    """
+    job = analytics_jobs.get(job_id, owner=workspace.session_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown analytics job.")
+    return job
+
+@app.delete("/analytics-jobs/{job_id}")
+def cancel_analytics_job(job_id: str, workspace=Depends(get_workspace)):
+    job = analytics_jobs.cancel(job_id, owner=workspace.session_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown analytics job.")
+    return job
+
+def compute_shared_genes(workspace, graph_index1="0", graph_index2="1"):
     """
-    global shared_genes_cache
+    Return the (cached) set of genes present in both graphs.
+    Empty if either graph is empty.
+    """
+    graph1 = workspace.current_graphs[graph_index1]
+    graph2 = workspace.current_graphs[graph_index2]
+    versions = (graph1.version, graph2.version)
     
-    # If we have a cached result, return it
-    if shared_genes_cache is not None:
-        return JSONResponse(
-            content={"genes": list(shared_genes_cache)},
-            headers={"Access-Control-Allow-Origin": api_url}
-        )
+    # If we have a result for the current graph versions, return it
+    entry = workspace.shared_genes_cache.get((graph_index1, graph_index2))
+    if entry is not None and entry[:2] == versions:
+        return entry[2]
     
     # Check if both graphs have nodes
-    if not current_graphs[0]["nodes"] or not current_graphs[1]["nodes"]:
-        return JSONResponse(
-            content={"genes": []},
-            headers={"Access-Control-Allow-Origin": api_url}
-        )
+    if not graph1.num_nodes or not graph2.num_nodes:
+        return set()
     
     # Get sets of genes from both graphs
-    genes1 = {node["id"] for node in current_graphs[0]["nodes"]}
-    genes2 = {node["id"] for node in current_graphs[1]["nodes"]}
+    genes1 = set(graph1.live_genes())
+    genes2 = set(graph2.live_genes())
     
     # Calculate intersection
-    shared_genes_cache = genes1.intersection(genes2)
-    
+    entry = workspace.shared_genes_cache[(graph_index1, graph_index2)] = (*versions, genes1.intersection(genes2))
+    return entry[2]
+
+@app.get("/shared-genes")
+def get_shared_genes(graph_index1: str = "0", graph_index2: str = "1", workspace=Depends(get_workspace)):
+    """
+    Get the set of genes that exist in both graphs.
+    Returns empty set if either graph is empty.
+    """
+    error = invalid_graph_index(workspace, graph_index1, graph_index2)
+    if error is not None:
+        return error
     return JSONResponse(
-        content={"genes": list(shared_genes_cache)},
+        content={"genes": list(compute_shared_genes(workspace, graph_index1, graph_index2))},
         headers={"Access-Control-Allow-Origin": api_url}
     )
 
-# New function to calculate graph theory metrics
-def calculate_graph_metrics(graph_data):
-    if not graph_data or not graph_data["nodes"] or not graph_data["links"]:
-        return {
-            "density": 0.0,
-            "avg_clustering_coefficient": 0.0,
-            "avg_degree_centrality": 0.0,
-            "num_nodes": 0,
-            "num_edges": 0,
-        }
+MAX_DIFF_PAGE = 1000
+
+def compute_network_diff(workspace, graph_index1="0", graph_index2="1"):
+    """Return the (cached) NetworkDiff of two graphs' current versions."""
+    graph1 = workspace.current_graphs[graph_index1]
+    graph2 = workspace.current_graphs[graph_index2]
+    versions = (graph1.version, graph2.version)
+    entry = workspace.diff_cache.get((graph_index1, graph_index2))
+    if entry is not None and entry[:2] == versions:
+        return entry[2]
+    entry = workspace.diff_cache[(graph_index1, graph_index2)] = (*versions, NetworkDiff(graph1, graph2))
+    return entry[2]
+
+@app.get("/differential-network")
+def get_differential_network(graph_index1: str = "0", graph_index2: str = "1", view: str = "genes",
+                             sort: str = "rewired_edges", min_weight_change: float = 0.0,
+                             offset: int = 0, limit: int = 100, workspace=Depends(get_workspace)):
+    """
+    Differences between two graphs over the genes they share.
 
-    G = nx.Graph()
-    for node in graph_data["nodes"]:
-        G.add_node(node["id"])
-    for link in graph_data["links"]:
-        G.add_edge(link["source"], link["target"])
+    Args:
+        view: "genes" for the shared genes ranked by rewiring, or "gained",
+            "lost" or "reweighted" for the edges that differ
+        sort: gene ranking, "rewired_edges", "jaccard" or "degree_change"
+        min_weight_change: edges kept in both graphs count as reweighted
+            when their weight changes by more than this
+        offset, limit: page of the view (limit at most MAX_DIFF_PAGE)
 
-    num_nodes = G.number_of_nodes()
-    num_edges = G.number_of_edges()
+    Returns:
+        Summary counts of the whole diff plus one page of the view
+    """
+    error = invalid_graph_index(workspace, graph_index1, graph_index2)
+    if error is not None:
+        return error
+    if view != "genes" and view not in EDGE_VIEWS:
+        return JSONResponse(status_code=400, content={"message": f"View must be one of: genes, {', '.join(EDGE_VIEWS)}"})
+    if sort not in GENE_SORTS:
+        return JSONResponse(status_code=400, content={"message": f"Sort must be one of: {', '.join(GENE_SORTS)}"})
+    if offset < 0 or not 0 < limit <= MAX_DIFF_PAGE or min_weight_change < 0:
+        return JSONResponse(status_code=400, content={
+            "message": f"Need offset >= 0, 0 < limit <= {MAX_DIFF_PAGE} and min_weight_change >= 0"})
+
+    diff = compute_network_diff(workspace, graph_index1, graph_index2)
+    if view == "genes":
+        total, items = diff.gene_page(sort, offset, limit)
+    else:
+        total, items = diff.edge_page(view, offset, limit, min_weight_change)
+    return {
+        "graph1_index": graph_index1,
+        "graph2_index": graph_index2,
+        "summary": diff.summary(min_weight_change),
+        "view": view,
+        "sort": sort if view == "genes" else None,
+        "offset": offset,
+        "limit": limit,
+        "total": total,
+        "items": items
+    }
 
-    density = nx.density(G)
-    avg_clustering_coefficient = nx.average_clustering(G)
+def get_orbit_matrix(workspace, graph_index):
+    """
+    Return (node ids, GDV matrix) for a graph, computing it once per version.
+    """
+    graph = workspace.current_graphs[graph_index]
+    return cached_for_graph(workspace.orbit_cache, graph_index, graph, lambda: (
+        {graph.genes[i]: i for i in graph.node_ids().tolist()},
+        compute_gdv(graph.adjacency_matrix())
+    ))
+
+@app.get("/graphlet-orbits/{graph_index}")
+def get_graphlet_orbits(graph_index: str, workspace=Depends(get_workspace)):
+    """
+    Per-gene graphlet degree vectors (orbits 0-14, up to 4-node graphlets).
+    """
+    error = invalid_graph_index(workspace, graph_index)
+    if error is not None:
+        return error
 
-    degree_centralities = nx.degree_centrality(G)
-    avg_degree_centrality = sum(degree_centralities.values()) / num_nodes if num_nodes > 0 else 0.0
-    
+    node_index, gdv = get_orbit_matrix(workspace, graph_index)
     return {
-        "density": density,
-        "avg_clustering_coefficient": avg_clustering_coefficient,
-        "avg_degree_centrality": avg_degree_centrality,
-        "num_nodes": num_nodes,
-        "num_edges": num_edges,
+        "graph_index": graph_index,
+        "orbits": list(range(ORBIT_COUNT)),
+        "gdv": {node: gdv[i].tolist() for node, i in node_index.items()}
     }
 
-@app.get("/comparative-analysis")
-async def get_comparative_analysis(graph_index1: int = 0, graph_index2: int = 1):
-    graph_data1 = original_graphs[graph_index1]
-    graph_data2 = original_graphs[graph_index2]
+@app.get("/gdv-similarity")
+def compare_shared_gene_orbits(graph_index1: str = "0", graph_index2: str = "1", limit: Optional[int] = None,
+                               workspace=Depends(get_workspace)):
+    """
+    Compare the graphlet degree vectors of the shared genes between two graphs.
+
+    Genes are ranked by ascending GDV similarity, so the genes whose
+    topological role changed the most come first.
+    """
+    error = invalid_graph_index(workspace, graph_index1, graph_index2)
+    if error is not None:
+        return error
 
-    metrics1 = calculate_graph_metrics(graph_data1)
-    metrics2 = calculate_graph_metrics(graph_data2)
+    genes = sorted(compute_shared_genes(workspace, graph_index1, graph_index2))
+    if not genes:
+        return {"graph1_index": graph_index1, "graph2_index": graph_index2, "genes": []}
 
+    index1, gdv1 = get_orbit_matrix(workspace, graph_index1)
+    index2, gdv2 = get_orbit_matrix(workspace, graph_index2)
+    rows1 = gdv1[[index1[g] for g in genes]]
+    rows2 = gdv2[[index2[g] for g in genes]]
+    similarity = gdv_similarity(rows1, rows2)
+
+    order = np.argsort(similarity, kind="stable")
+    if limit is not None:
+        order = order[:limit]
+
+    return {
+        "graph1_index": graph_index1,
+        "graph2_index": graph_index2,
+        "genes": [{
+            "gene": genes[i],
+            "similarity": float(similarity[i]),
+            "gdv1": rows1[i].tolist(),
+            "gdv2": rows2[i].tolist()
+        } for i in order]
+    }
+
+EXTENDED_METRIC_LABELS = ["Density", "Clustering Coefficient", "Degree Centrality", "Transitivity",
+                          "k-Core Degeneracy", "Max PageRank", "Max Betweenness", "Degree Assortativity"]
+
+def normalized_metrics(metrics, max_degeneracy):
+    """
+    The EXTENDED_METRIC_LABELS metrics of one graph, each scaled to [0, 1].
+    An undefined degree assortativity is placed at 0.5 (no correlation).
+    """
+    assortativity = metrics["degree_assortativity"]
+    return [
+        metrics["density"],
+        metrics["avg_clustering_coefficient"],
+        metrics["avg_degree_centrality"],
+        metrics["transitivity"],
+        metrics["degeneracy"] / max_degeneracy,
+        metrics["max_pagerank"],
+        metrics["max_betweenness"],
+        0.5 if assortativity is None else (assortativity + 1) / 2,
+    ]
+
+def comparative_metrics(metrics1, metrics2):
     max_density = 1.0
     max_avg_clustering = 1.0
     max_avg_degree_centrality = 1.0
@@ -807,6 +1039,12 @@ async def get_comparative_analysis(graph_index1: int = 0, graph_index2: int = 1)
     
     separation_score = float(np.linalg.norm(np.array(normalized_metrics1) - np.array(normalized_metrics2)))
 
+    # Extended comparison over every metric scaled to [0, 1]; degeneracy is
+    # relative to the larger of the two graphs
+    max_degeneracy = max(metrics1["degeneracy"], metrics2["degeneracy"], 1)
+    extended = lambda metrics: normalized_metrics(metrics, max_degeneracy)
+    extended_metrics1, extended_metrics2 = extended(metrics1), extended(metrics2)
+
     return {
         "graph1_metrics": metrics1,
         "graph2_metrics": metrics2,
@@ -814,22 +1052,53 @@ async def get_comparative_analysis(graph_index1: int = 0, graph_index2: int = 1)
         "normalized_metrics1": normalized_metrics1,
         "normalized_metrics2": normalized_metrics2,
         "metric_labels": ["Density", "Clustering Coefficient", "Degree Centrality"],
+        "extended_metric_labels": EXTENDED_METRIC_LABELS,
+        "extended_normalized_metrics1": extended_metrics1,
+        "extended_normalized_metrics2": extended_metrics2,
+        "extended_separation_score": float(np.linalg.norm(np.array(extended_metrics1) - np.array(extended_metrics2))),
+        "metric_differences": {
+            key: metrics2[key] - value for key, value in metrics1.items()
+            if isinstance(value, (int, float)) and isinstance(metrics2[key], (int, float))
+            and key != "betweenness_samples"
+        },
     }
 
+@app.get("/comparative-analysis")
+async def get_comparative_analysis(graph_index1: str = "0", graph_index2: str = "1", wait: bool = True,
+                                   workspace=Depends(get_workspace)):
+    """
+    Summary metrics of the two original graphs and how far apart they are.
+    Metrics not cached for the graphs' versions are computed in a worker
+    process; with wait=false the analytics job is returned right away (202).
+    """
+    error = invalid_graph_index(workspace, graph_index1, graph_index2)
+    if error is not None:
+        return error
+
+    items = [(("original", i), workspace.original_graphs[i]) for i in dict.fromkeys([graph_index1, graph_index2])]
+    by_index = lambda results: dict(zip([key[1] for key, _ in items], results))
+    result, job = run_on_graphs(
+        workspace, "comparative-analysis", "metrics", workspace.metrics_cache, items, {},
+        lambda results: comparative_metrics(by_index(results)[graph_index1], by_index(results)[graph_index2]))
+    if job is not None:
+        return await analytics_response(job, wait)
+    return result
+
 @app.post("/expression-data/{graph_index}")
-async def upload_expression_data(graph_index: int, payload: Dict[str, Dict[str, float]]):
-    if graph_index not in [0, 1]:
-        raise HTTPException(status_code=400, detail="Invalid graph index. Must be 0 or 1.")
+async def upload_expression_data(graph_index: str, payload: Dict[str, Dict[str, float]],
+                                 workspace=Depends(get_workspace)):
+    if graph_index not in workspace.current_graphs:
+        raise HTTPException(status_code=400, detail=f"Invalid graph index. Must be one of: {', '.join(workspace.names())}")
 
     print(f"Received expression data for graph {graph_index}")
-    expression_data_store[graph_index] = payload
+    workspace.set_expression(graph_index, payload)
     return {"message": f"Expression data for graph {graph_index} stored successfully."}
 
 @app.get("/expression-data/{graph_index}")
-async def get_expression_data(graph_index: int):
-    if graph_index not in expression_data_store:
+async def get_expression_data(graph_index: str, workspace=Depends(get_workspace)):
+    if graph_index not in workspace.expression_data:
         raise HTTPException(status_code=404, detail="Expression data not found for this graph.")
-    return expression_data_store[graph_index]
+    return workspace.expression_data[graph_index]
 
 VALID_VIEWS = {"function", "pathway", "disease"}
 
@@ -851,7 +1120,7 @@ async def annotate(
 
     # 2) For pathway view, use KEGG instead of vector search
         # 2) Retrieve the top-k passages for function or disease view
-    passages = get_passages(gene=gene, context=view, k=k)
+    passages = await call_upstream(get_passages, gene=gene, context=view, k=k)
     if not passages:
         raise HTTPException(404, f"No {view} passages found for gene '{gene}'.")
 
@@ -860,7 +1129,7 @@ async def annotate(
 
     # 4) Call the LLM
     try:
-        summary = call_llm(prompt)
+        summary = await call_upstream(call_llm, prompt)
     except Exception as e:
         raise HTTPException(502, f"LLM error: {e}")
 
@@ -872,96 +1141,275 @@ async def annotate(
         "summary": summary
     }
 
+@app.get("/annotate/stream")
+async def annotate_stream(
+    gene: str = Query(..., description="Gene symbol, e.g. TP53"),
+    view: str = Query(..., description="One of: function, pathway, disease"),
+    k: int = Query(5, ge=1, le=20, description="Number of passages to retrieve")
+):
+    """
+    Streaming variant of /annotate as server-sent events (see stream_completion).
+    """
+    view = view.lower()
+    if view not in VALID_VIEWS:
+        raise HTTPException(400, f"Invalid view '{view}'. Choose from {', '.join(VALID_VIEWS)}.")
+    if gene.upper() not in indexed_genes:
+        record_not_indexed_gene(gene)
+        raise HTTPException(404, f"Gene '{gene}' is not indexed. Added to not_indexed_gene.txt.")
+
+    async def retrieve():
+        passages = await call_upstream(get_passages, gene=gene, context=view, k=k)
+        if not passages:
+            raise ValueError(f"No {view} passages found for gene '{gene}'.")
+        return passages
+
+    return sse_response(stream_completion(
+        retrieve,
+        lambda passages: ("You are a helpful genomics assistant.",
+                          build_prompt(gene=gene, view=view, passages=passages, extra={}))
+    ))
+
+async def annotate_view(gene: str, view: str, k: int) -> dict:
+    """
+    Retrieve passages and summarize one view of a gene. Upstream calls run
+    in the shared upstream pool, so views of the same gene proceed in parallel.
+    """
+    passages = await call_upstream(get_passages, gene=gene, context=view, k=k)
+    if not passages:
+        return {"error": f"No {view} passages found for gene '{gene}'."}
+    prompt = build_prompt(gene=gene, view=view, passages=passages, extra={})
+    summary = await call_upstream(call_llm, prompt)
+    return {
+        "gene": gene,
+        "view": view,
+        "retrieved_passages": passages,
+        "summary": summary
+    }
+
 @app.post("/annotate_all_views")
 async def annotate_all_views(gene: str = Body(..., embed=True), k: int = Query(5, ge=1, le=20)):
     """
     Given a gene, return all annotation types (function, disease, pathway) for that gene, using a persistent cache.
+    Missing views are computed concurrently, each with its own timeout.
     """
     gene = gene.upper()
-    cache = load_annotation_cache()
+    views = ["function", "disease", "pathway"]
+    keys = {view: annotation_key(gene, view, k) for view in views}
     gene_result = {"gene": gene}
-    cache_updated = False
-    if gene in cache and all(view in cache[gene] for view in ["function", "disease", "pathway"]):
-        # Return cached result
-        for view in ["function", "disease", "pathway"]:
-            gene_result[view] = cache[gene][view]
+    missing = []
+    for view in views:
+        cached = annotation_cache.get(keys[view])
+        if cached is None:
+            missing.append(view)
+        else:
+            gene_result[view] = cached
+    if not missing:
         return gene_result
+
     # Otherwise, compute missing views and update cache
-    cache.setdefault(gene, {})
-    for view in ["function", "disease", "pathway"]:
-        if view in cache[gene]:
-            gene_result[view] = cache[gene][view]
+    if gene not in indexed_genes:
+        record_not_indexed_gene(gene)
+        for view in missing:
+            gene_result[view] = {"error": f"Gene '{gene}' is not indexed."}
+            annotation_cache.put(keys[view], gene_result[view], ttl_seconds=ANNOTATION_ERROR_TTL_SECONDS)
+        return gene_result
+
+    results = await asyncio.gather(
+        *(asyncio.wait_for(annotate_view(gene, view, k), VIEW_TIMEOUT_SECONDS) for view in missing),
+        return_exceptions=True
+    )
+    for view, result in zip(missing, results):
+        if isinstance(result, asyncio.TimeoutError):
+            # Transient, so it is not cached
+            gene_result[view] = {"error": f"Timed out after {VIEW_TIMEOUT_SECONDS:g}s computing the {view} view."}
             continue
-        try:
-            if gene.upper() not in indexed_genes:
-                record_not_indexed_gene(gene)
-                gene_result[view] = {"error": f"Gene '{gene}' is not indexed."}
-                cache[gene][view] = gene_result[view]
-                cache_updated = True
-                continue
-            passages = get_passages(gene=gene, context=view, k=k)
-            if not passages:
-                gene_result[view] = {"error": f"No {view} passages found for gene '{gene}'."}
-                cache[gene][view] = gene_result[view]
-                cache_updated = True
-                continue
-            prompt = build_prompt(gene=gene, view=view, passages=passages, extra={})
-            summary = call_llm(prompt)
-            gene_result[view] = {
-                "gene": gene,
-                "view": view,
-                "retrieved_passages": passages,
-                "summary": summary
-            }
-            cache[gene][view] = gene_result[view]
-            cache_updated = True
-        except Exception as e:
-            gene_result[view] = {"error": str(e)}
-            cache[gene][view] = gene_result[view]
-            cache_updated = True
-    if cache_updated:
-        save_annotation_cache(cache)
+        if isinstance(result, Exception):
+            result = {"error": str(result)}
+        gene_result[view] = result
+        ttl = ANNOTATION_ERROR_TTL_SECONDS if "error" in result else None
+        annotation_cache.put(keys[view], result, ttl_seconds=ttl)
     return gene_result
 
+# Batch annotation jobs: at most BATCH_LLM_WORKERS LLM calls at a time, sharing a rate limit
+BATCH_LLM_WORKERS = 4
+BATCH_LLM_RATE = float(os.getenv("BATCH_LLM_RATE", "5"))  # LLM calls per second
+# Job records, oldest first; the inputs are only kept while a job runs
+annotation_jobs: Dict[str, dict] = {}
+annotation_job_inputs: Dict[str, tuple] = {}
+_annotation_tasks = set()
+
+def evict_annotation_jobs(max_finished=MAX_FINISHED_JOBS):
+    """Forget the oldest finished annotation jobs beyond `max_finished`."""
+    finished = [job_id for job_id, job in annotation_jobs.items() if job["status"] != "running"]
+    for job_id in finished[:max(0, len(finished) - max_finished)]:
+        del annotation_jobs[job_id]
+
+async def run_annotation_job(job, genes, k):
+    """
+    Annotate every view of `genes`: one batched embedding pass, concurrent
+    vector queries, then rate-limited LLM calls. Results go to the
+    annotation cache; `job` is updated in place for progress polling.
+    """
+    views = ["function", "disease", "pathway"]
+
+    def finish(result):
+        job["completed"] += 1
+        if "error" in result:
+            job["failed"] += 1
+
+    try:
+        # 1) Skip cached views; views of genes that are not indexed fail right away
+        pending = []
+        for gene in genes:
+            if gene not in indexed_genes:
+                record_not_indexed_gene(gene)
+            for view in views:
+                key = annotation_key(gene, view, k)
+                if annotation_cache.get(key) is not None:
+                    job["cached"] += 1
+                    job["completed"] += 1
+                elif gene not in indexed_genes:
+                    result = {"error": f"Gene '{gene}' is not indexed."}
+                    annotation_cache.put(key, result, ttl_seconds=ANNOTATION_ERROR_TTL_SECONDS)
+                    finish(result)
+                else:
+                    pending.append((gene, view))
+
+        if pending:
+            # 2) Embed every query in a few batched requests
+            job["stage"] = "embedding"
+            vectors = await call_upstream(embed_queries, [query_text(gene, view) for gene, view in pending])
+
+            # 3) Vector queries run concurrently, bounded by the upstream semaphore
+            job["stage"] = "retrieval"
+            found = await asyncio.gather(
+                *(call_upstream(query_passages, vector, gene, view, k) for vector, (gene, view) in zip(vectors, pending)),
+                return_exceptions=True
+            )
+
+            # 4) Summaries, at most BATCH_LLM_WORKERS at a time under a shared rate limit
+            job["stage"] = "summarizing"
+            slots = asyncio.Semaphore(BATCH_LLM_WORKERS)
+            limiter = RateLimiter(BATCH_LLM_RATE, burst=BATCH_LLM_WORKERS)
+
+            async def summarize(gene, view, passages):
+                key = annotation_key(gene, view, k)
+                if isinstance(passages, Exception):
+                    result = {"error": str(passages)}
+                elif not passages:
+                    result = {"error": f"No {view} passages found for gene '{gene}'."}
+                else:
+                    prompt = build_prompt(gene=gene, view=view, passages=passages, extra={})
+                    async with slots:
+                        await limiter.acquire()
+                        try:
+                            summary = await asyncio.wait_for(call_upstream(call_llm, prompt), VIEW_TIMEOUT_SECONDS)
+                            result = {"gene": gene, "view": view, "retrieved_passages": passages, "summary": summary}
+                        except asyncio.TimeoutError:
+                            # Transient, so it is not cached
+                            finish({"error": "timeout"})
+                            return
+                        except Exception as e:
+                            result = {"error": str(e)}
+                ttl = ANNOTATION_ERROR_TTL_SECONDS if "error" in result else None
+                annotation_cache.put(key, result, ttl_seconds=ttl)
+                finish(result)
+
+            await asyncio.gather(*(summarize(gene, view, passages) for (gene, view), passages in zip(pending, found)))
+        job["status"] = "done"
+    except Exception as e:
+        print(f"Annotation job {job['job_id']} failed: {e}")
+        job["status"] = "failed"
+        job["error"] = str(e)
+    job["stage"] = None
+    annotation_job_inputs.pop(job["job_id"], None)
+    evict_annotation_jobs()
+
+@app.post("/annotate-batch")
+async def annotate_batch(request: BatchAnnotationRequest, k: int = Query(5, ge=1, le=20),
+                         workspace=Depends(get_workspace)):
+    """
+    Start a background job annotating all views of many genes (a list, or
+    every gene of an uploaded graph). Poll /annotate-batch/{job_id}.
+    """
+    if request.graph_index is not None:
+        error = invalid_graph_index(workspace, str(request.graph_index))
+        if error is not None:
+            return error
+        genes = workspace.current_graphs[str(request.graph_index)].live_genes()
+    else:
+        genes = request.genes or []
+    genes = list(dict.fromkeys(gene.upper() for gene in genes))
+    if not genes:
+        raise HTTPException(400, "No genes to annotate.")
+
+    job_id = uuid.uuid4().hex[:12]
+    job = {
+        "job_id": job_id,
+        "status": "running",
+        "stage": "queued",
+        "genes": len(genes),
+        "k": k,
+        "total": 3 * len(genes),
+        "completed": 0,
+        "cached": 0,
+        "failed": 0,
+        "error": None
+    }
+    annotation_jobs[job_id] = job
+    annotation_job_inputs[job_id] = (genes, k)
+
+    # Keep a reference so the task is not garbage collected while running
+    task = asyncio.create_task(run_annotation_job(job, genes, k))
+    _annotation_tasks.add(task)
+    task.add_done_callback(_annotation_tasks.discard)
+    return job
+
+@app.get("/annotate-batch/{job_id}")
+def get_annotation_job(job_id: str, include_results: bool = False):
+    """
+    Progress of an annotation job. `include_results` lists the annotations
+    found so far while the job runs; once it has finished they are read from
+    the annotation cache per gene (/annotate_all_views).
+    """
+    if job_id not in annotation_jobs:
+        raise HTTPException(status_code=404, detail="Unknown annotation job.")
+    job = dict(annotation_jobs[job_id])
+    if include_results:
+        if job_id not in annotation_job_inputs:
+            raise HTTPException(status_code=409, detail="Annotation job has finished; read its genes through /annotate_all_views.")
+        genes, k = annotation_job_inputs[job_id]
+        job["results"] = {
+            gene: {view: annotation_cache.get(annotation_key(gene, view, k)) for view in ["function", "disease", "pathway"]}
+            for gene in genes
+        }
+    return job
+
 @app.post("/multi-annotate")
 async def multi_annotate(genes: List[str] = Body(..., embed=True)):
     """
     Given a list of genes, aggregate their pathways and diseases, and use the LLM to score and summarize the most important pathways and disease for the set.
     """
-    # 1. Aggregate pathways for the selected genes
-    pathway_file = "data/chunks/pathway.jsonl"
-    pathway_entries = []
+    # 1. Rank the pathways and diseases shared by the genes by enrichment
     try:
-        with open(pathway_file, "r") as f:
-            for line in f:
-                entry = json.loads(line)
-                if entry["gene"] in genes and entry["type"] == "pathway":
-                    pathway_entries.append(entry)
+        pathways, pathway_hits = await run_in_threadpool(
+            lambda: pathway_disease_index.pathways().rank(genes, MULTI_ANNOTATE_MAX_CANDIDATES))
+        diseases, disease_hits = await run_in_threadpool(
+            lambda: pathway_disease_index.diseases().rank(genes, MULTI_ANNOTATE_MAX_CANDIDATES))
     except Exception as e:
-        return JSONResponse(status_code=500, content={"error": f"Failed to read pathway data: {e}"})
+        return JSONResponse(status_code=500, content={"error": f"Failed to read pathway/disease data: {e}"})
 
-    # 2. Aggregate diseases for the selected genes
-    disease_file = "gene_data/general/appic_gene_data.tsv"
-    disease_entries = []
-    try:
-        import pandas as pd
-        df = pd.read_csv(disease_file, sep="\t")
-        for gene in genes:
-            gene_rows = df[df["gene"].str.upper() == gene.upper()]
-            for _, row in gene_rows.iterrows():
-                disease_entries.append({
-                    "gene": row["gene"],
-                    "disease": row["cancer"] if "cancer" in row else row.get("subtype", ""),
-                    "subtype": row.get("subtype", "")
-                })
-    except Exception as e:
-        return JSONResponse(status_code=500, content={"error": f"Failed to read disease data: {e}"})
+    # 2. One line per candidate with its overlap and significance
+    def candidate_line(entry, hits):
+        line = (f"{entry['term']} — {entry['overlap']}/{hits} genes ({', '.join(entry['genes'])}), "
+                f"{entry['term_size']} genes in term, p={entry['p_value']:.2g}")
+        return f"{line}; subtypes: {entry['details']}" if entry["details"] else line
 
     # 3. Prepare prompt for LLM
-    pathway_texts = [f"{entry['gene']}: {entry['text']}" for entry in pathway_entries]
-    disease_texts = [f"{entry['gene']}: {entry['disease']} ({entry['subtype']})" for entry in disease_entries]
+    pathway_texts = [candidate_line(entry, pathway_hits) for entry in pathways]
+    disease_texts = [candidate_line(entry, disease_hits) for entry in diseases]
     prompt = f"""
-You are a genomics expert. Given the following genes: {', '.join(genes)}, and their associated pathways and diseases, analyze and rank the 3 important pathways that all (or most) genes in the set are involved in. For each, provide a confidence score between 0 and 1, and a brief description.
+You are a genomics expert. Given the following genes: {', '.join(genes)}, and their associated pathways and diseases (ranked by hypergeometric enrichment, most significant first), analyze and rank the 3 important pathways that all (or most) genes in the set are involved in. For each, provide a confidence score between 0 and 1, and a brief description.
 
 Pathway candidates:
 {chr(10).join(pathway_texts) if pathway_texts else 'None'}
@@ -979,7 +1427,7 @@ Output JSON in the following format:
 }}
 """
     try:
-        llm_response = call_llm(prompt, system="You are a genomics expert.", model="gpt-4o-mini", temperature=0.2, max_tokens=600)
+        llm_response = await call_upstream(call_llm, prompt, system="You are a genomics expert.", model="gpt-4o-mini", temperature=0.2, max_tokens=600)
         # Try to parse the LLM's JSON output
         match = re.search(r'\{[\s\S]*\}', llm_response)
         if match:
@@ -989,29 +1437,25 @@ Output JSON in the following format:
             except Exception:
                 # Try ast.literal_eval as fallback
                 result = ast.literal_eval(result_json)
+            if isinstance(result, dict):
+                result["candidates"] = {"pathways": pathways, "diseases": diseases}
             return result
         else:
             return {"error": "LLM did not return valid JSON.", "raw": llm_response}
     except Exception as e:
         return {"error": f"LLM error: {e}"}
 
-@app.post("/chat")
-async def chat_with_gene(request: ChatRequest) -> dict:
+def chat_prompts(request: ChatRequest, passages: List[str]):
     """
-    Chat with the AI about a specific gene, maintaining conversation context.
+    Build the (system, user) prompts of a gene chat turn.
     """
-    try:
-        # Get relevant passages for the gene
-        passages = get_passages(gene=request.gene, context="general", k=3)
-        
-        # Build a conversational prompt
-        system_prompt = f"""You are a helpful genomics assistant specializing in gene analysis. 
+    system_prompt = f"""You are a helpful genomics assistant specializing in gene analysis. 
         You have access to information about the gene {request.gene}. 
         Answer questions conversationally and naturally, as if in a chat interface.
         Use the provided passages to inform your responses, but also draw from your general knowledge.
         Keep responses concise but informative."""
         
-        user_prompt = f"""Gene: {request.gene}
+    user_prompt = f"""Gene: {request.gene}
 
 Available information:
 {chr(10).join(passages) if passages else "Limited specific information available."}
@@ -1022,21 +1466,160 @@ Conversation history:
 User: {request.message}
 
 Please provide a helpful, conversational response about {request.gene} based on the user's question."""
+    return system_prompt, user_prompt
+
+# Answers reused for near-identical questions about the same gene
+chat_cache = SemanticCache(
+    threshold=float(os.getenv("CHAT_CACHE_THRESHOLD", "0.95")),
+    max_entries=int(os.getenv("CHAT_CACHE_SIZE", "2048"))
+)
+
+async def embed_chat_turn(request: ChatRequest):
+    """
+    Embed the question (for the answer cache) together with the gene's
+    retrieval query in one request. Only the query goes through the
+    on-disk embedding cache; free-text questions are never stored.
+
+    Returns:
+        (question vector, query vector), both None if embedding failed
+    """
+    try:
+        questions, queries = await call_upstream(
+            embed_with_queries, [request.message], [query_text(request.gene, "general")])
+        return questions[0], queries[0]
+    except Exception as e:
+        print(f"Chat cache skipped, could not embed the message: {e}")
+        return None, None
+
+async def chat_passages(request: ChatRequest, query):
+    """Passages for a chat turn, reusing the query vector when there is one."""
+    if query is None:
+        return await call_upstream(get_passages, gene=request.gene, context="general", k=3)
+    return await call_upstream(query_passages, query, request.gene, "general", 3)
+
+@app.post("/chat")
+async def chat_with_gene(request: ChatRequest) -> dict:
+    """
+    Chat with the AI about a specific gene, maintaining conversation context.
+    A stored answer is returned when an equivalent conversation asked a
+    semantically near-identical question before.
+    """
+    try:
+        # 1) Look for a cached answer to a similar question
+        question, query = await embed_chat_turn(request)
+        if question is not None:
+            cached = chat_cache.lookup(request.gene, request.conversation_history, question)
+            if cached is not None:
+                return {
+                    "gene": request.gene,
+                    "response": cached[0],
+                    "conversation_history": request.conversation_history,
+                    "cached": True
+                }
+
+        # 2) Get relevant passages for the gene
+        passages = await chat_passages(request, query)
+        
+        # Build a conversational prompt
+        system_prompt, user_prompt = chat_prompts(request, passages)
 
         # Call the LLM
-        response = call_llm(
+        response = await call_upstream(
+            call_llm,
             prompt=user_prompt,
             system=system_prompt,
             temperature=0.7,
             max_tokens=500
         )
+        if question is not None:
+            chat_cache.store(request.gene, request.conversation_history, question, response)
         
         return {
             "gene": request.gene,
             "response": response,
-            "conversation_history": request.conversation_history
+            "conversation_history": request.conversation_history,
+            "cached": False
         }
         
     except Exception as e:
         raise HTTPException(502, f"Chat error: {e}")
 
+@app.get("/upstream-metrics")
+def get_upstream_metrics():
+    """
+    Calls, failures, retries, coalesced calls, token usage and recent latency
+    percentiles per upstream (e.g. "chat:gpt-4o-mini", "pinecone:query").
+    """
+    return upstream_metrics.snapshot()
+
+@app.get("/chat/cache-stats")
+def chat_cache_stats():
+    return chat_cache.metrics()
+
+def sse_event(event: str, data) -> str:
+    """Format one server-sent event with a JSON payload."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def stream_completion(retrieve, prompts, on_done=None, **llm_options):
+    """
+    Server-sent events for a retrieval + LLM round trip: a `passages` event
+    as soon as retrieval finishes, one `token` event per piece of the reply
+    as the LLM generates it, then `done` with the full text (or `error`).
+
+    Args:
+        retrieve: coroutine function returning the passages
+        prompts: function passages -> (system, user) prompts
+        on_done: optional function called with the full text of a completed reply
+    """
+    try:
+        passages = await retrieve()
+        yield sse_event("passages", passages)
+        system_prompt, user_prompt = prompts(passages)
+        pieces = []
+        async for piece in iterate_upstream(call_llm_stream, prompt=user_prompt, system=system_prompt, **llm_options):
+            pieces.append(piece)
+            yield sse_event("token", piece)
+        text = "".join(pieces).strip()
+        if on_done is not None:
+            on_done(text)
+        yield sse_event("done", text)
+    except Exception as e:
+        yield sse_event("error", str(e))
+
+def sse_response(events):
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        # Ask proxies not to buffer the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/chat/stream")
+async def chat_with_gene_stream(request: ChatRequest):
+    """
+    Streaming variant of /chat as server-sent events (see stream_completion).
+    It shares /chat's answer cache: a cached answer is sent as a single
+    `done` event, and completed replies are stored for later turns.
+    """
+    async def events():
+        question, query = await embed_chat_turn(request)
+        if question is not None:
+            cached = chat_cache.lookup(request.gene, request.conversation_history, question)
+            if cached is not None:
+                yield sse_event("done", cached[0])
+                return
+
+        def store(response):
+            if question is not None:
+                chat_cache.store(request.gene, request.conversation_history, question, response)
+
+        async for event in stream_completion(
+            lambda: chat_passages(request, query),
+            lambda passages: chat_prompts(request, passages),
+            on_done=store,
+            temperature=0.7,
+            max_tokens=500
+        ):
+            yield event
+
+    return sse_response(events())
@@ -0,0 +1,174 @@
+# pathway_index.py
+"""
+Gene → pathway / disease term index for /multi-annotate.
+
+Each index stores its (gene, term) pairs as two integer code arrays. A gene
+set is then answered with one vectorized `isin` over the gene codes and a
+bincount over the matching term codes, which gives the overlap of the set
+with every term at once. Terms are ranked by the hypergeometric probability
+of seeing at least that overlap by chance (the universe being every gene in
+the index), with Benjamini-Hochberg q-values over the terms hit.
+
+Pathways come from the pathway chunk file (parsed once, through a snapshot),
+diseases from the APPI-C reference source; the disease index is rebuilt when
+the reference registry's gene generation changes.
+"""
+import json
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+from scipy.stats import hypergeom
+
+from file_utils import load_with_snapshot
+
+PATHWAY_CHUNKS = os.path.join("data", "chunks", "pathway.jsonl")
+
+
+class TermIndex:
+    def __init__(self, genes, terms, details=None):
+        """
+        Args:
+            genes, terms: parallel sequences, one (gene, term) pair each
+            details: optional text per pair (e.g. a disease subtype)
+        """
+        pairs = pd.DataFrame({
+            "gene": pd.Series(genes, dtype=object).astype(str).str.upper().to_numpy(),
+            "term": pd.Series(terms, dtype=object).astype(str).to_numpy(),
+            "detail": pd.Series(details if details is not None else [""] * len(genes), dtype=object)
+                        .fillna("").astype(str).to_numpy(),
+        })
+        pairs = pairs[(pairs["term"] != "") & (pairs["term"] != "nan")]
+        details = pairs.groupby(["gene", "term"], sort=False)["detail"].agg(
+            lambda values: ", ".join(dict.fromkeys(v for v in values if v)))
+        self.gene_codes, self.genes = pd.factorize(details.index.get_level_values("gene"))
+        self.term_codes, self.terms = pd.factorize(details.index.get_level_values("term"))
+        self.details = details.to_numpy()
+        self.term_sizes = np.bincount(self.term_codes, minlength=len(self.terms))
+
+    def __len__(self):
+        return len(self.terms)
+
+    def rank(self, genes, limit=20):
+        """
+        Terms shared by `genes`, most significantly enriched first.
+
+        Returns:
+            (ranked terms, number of query genes found in the index); each term
+            is {"term", "overlap", "term_size", "genes", "details",
+            "fold_enrichment", "p_value", "q_value"}
+        """
+        query = self.genes.get_indexer(pd.Index([g.upper() for g in genes]).unique())
+        query = query[query >= 0]
+        if len(query) == 0 or len(self.terms) == 0:
+            return [], len(query)
+
+        # 1) One isin join for the whole set, overlaps per term by bincount
+        rows = np.flatnonzero(np.isin(self.gene_codes, query))
+        overlap = np.bincount(self.term_codes[rows], minlength=len(self.terms))
+        hit = np.flatnonzero(overlap)
+
+        # 2) P(X >= overlap) drawing len(query) genes from the universe
+        universe = len(self.genes)
+        p_values = hypergeom.sf(overlap[hit] - 1, universe, self.term_sizes[hit], len(query))
+        order = np.lexsort((-overlap[hit], p_values))
+        q_values = np.empty(len(hit))
+        ranked = p_values[order] * len(hit) / np.arange(1, len(hit) + 1)
+        q_values[order] = np.minimum(np.minimum.accumulate(ranked[::-1])[::-1], 1.0)
+
+        # 3) Member genes and details of the top terms only
+        top = order[:limit]
+        members = {}
+        for row in rows[np.isin(self.term_codes[rows], hit[top])]:
+            members.setdefault(self.term_codes[row], []).append(row)
+        results = []
+        for i in top:
+            term = hit[i]
+            term_rows = members[term]
+            results.append({
+                "term": self.terms[term],
+                "overlap": int(overlap[term]),
+                "term_size": int(self.term_sizes[term]),
+                "genes": [self.genes[self.gene_codes[row]] for row in term_rows],
+                "details": ", ".join(dict.fromkeys(d for row in term_rows for d in self.details[row].split(", ") if d)),
+                "fold_enrichment": float(overlap[term] * universe / (len(query) * self.term_sizes[term])),
+                "p_value": float(p_values[i]),
+                "q_value": float(q_values[i]),
+            })
+        return results, len(query)
+
+
+def load_pathway_pairs(path=PATHWAY_CHUNKS):
+    """
+    (gene, pathway, text) triples of the "pathway" chunks in a JSONL file,
+    grouped by the pathway they name ("pathway" or "name"). Chunks naming no
+    pathway are skipped: as terms of their own they would each hold about
+    one gene and make the enrichment statistics meaningless.
+    """
+    def build():
+        triples = []
+        unnamed = 0
+        with open(path, "r") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if entry.get("type") != "pathway":
+                    continue
+                term = entry.get("pathway") or entry.get("name")
+                if not term:
+                    unnamed += 1
+                    continue
+                triples.append((entry["gene"], term, entry["text"]))
+        if unnamed:
+            print(f"Warning: skipped {unnamed} pathway chunks in {path} that name no pathway.")
+        return triples
+
+    return load_with_snapshot(path, build)
+
+
+class PathwayDiseaseIndex:
+    def __init__(self, reference, pathway_path=PATHWAY_CHUNKS):
+        """
+        Args:
+            reference: ReferenceRegistry providing the "appic" source
+            pathway_path: JSONL pathway chunk file; missing means no pathways
+        """
+        self.reference = reference
+        self.pathway_path = pathway_path
+        self._pathways = None
+        self._diseases = None
+        self._generation = None
+        self._lock = threading.Lock()
+
+    def pathways(self):
+        if self._pathways is None:
+            with self._lock:
+                if self._pathways is None:
+                    triples = []
+                    if os.path.exists(self.pathway_path):
+                        triples = load_pathway_pairs(self.pathway_path)
+                    else:
+                        print(f"Warning: pathway chunks {self.pathway_path} not found; no pathway candidates.")
+                    genes, terms, _ = zip(*triples) if triples else ((), (), ())
+                    self._pathways = TermIndex(list(genes), list(terms))
+        return self._pathways
+
+    def diseases(self):
+        self.reference.require("appic")
+        if self._generation != self.reference.gene_generation:
+            with self._lock:
+                generation = self.reference.gene_generation
+                if self._generation != generation:
+                    genes, cancers, subtypes = [], [], []
+                    for gene, info in list(self.reference.gene_info_db.items()):
+                        # appic rows fill "cancer" and "subtype" side by side
+                        for cancer, subtype in zip(info.get("cancer", ()), info.get("subtype", ())):
+                            if not pd.isna(cancer):
+                                genes.append(gene)
+                                cancers.append(cancer)
+                                subtypes.append("" if pd.isna(subtype) else subtype)
+                    self._diseases = TermIndex(genes, cancers, subtypes)
+                    self._generation = generation
+        return self._diseases
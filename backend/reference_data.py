@@ -0,0 +1,142 @@
+# reference_data.py
+"""
+Lazy registry of the reference data sources (GO, Reactome, CancerDrivers,
+APPI-C, STRING, IntAct, ...).
+
+Nothing is read at import time. Each source is loaded (from its binary
+snapshot when available, see file_utils.load_with_snapshot) the first time an
+endpoint asks for it, or by the background warm-up thread started with the
+app. Loaded gene sources are merged into `gene_info_db` (the structure the
+endpoints used before) and interaction sources are added to the
+`interaction_evidence` matrix.
+"""
+import os
+import threading
+import time
+
+from file_utils import get_keys_from_file, load_gene_data, load_link_data, merge_data_dict
+from interaction_evidence import InteractionEvidence
+
+GENE_KIND = "gene"
+LINK_KIND = "link"
+# A source that failed to load is only tried again after this long
+RETRY_FAILED_SECONDS = float(os.getenv("REFERENCE_RETRY_SECONDS", "300"))
+
+
+class ReferenceRegistry:
+    def __init__(self, gene_dirs, interaction_dir):
+        self.gene_info_db = {}
+        self.interaction_evidence = InteractionEvidence()
+        self.sources = {}
+        # Bumped whenever more data is merged in, so derived indexes know to rebuild;
+        # gene_generation only counts the annotation sources merged into gene_info_db
+        self.generation = 0
+        self.gene_generation = 0
+        self._merge_lock = threading.Lock()
+
+        for data_dir in gene_dirs:
+            self._discover(data_dir, GENE_KIND)
+        self._discover(interaction_dir, LINK_KIND)
+
+    def _discover(self, data_dir, kind):
+        if not os.path.isdir(data_dir):
+            print(f"Warning: reference data directory {data_dir} not found.")
+            return
+        for fname in sorted(os.listdir(data_dir)):
+            if not fname.endswith((".csv", ".tsv")):
+                continue
+            name, _ = get_keys_from_file(fname)
+            # Interaction files have always been read comma-separated
+            sep = "\t" if fname.endswith(".tsv") and kind == GENE_KIND else ","
+            self.sources[name] = {
+                "kind": kind,
+                "data_dir": data_dir,
+                "fname": fname,
+                "sep": sep,
+                "status": "pending",
+                "load_seconds": None,
+                "error": None,
+                "failed_at": None,
+                "lock": threading.Lock(),
+            }
+
+    def names(self, kind=None):
+        return [name for name, source in self.sources.items() if kind is None or source["kind"] == kind]
+
+    def require(self, *names):
+        """
+        Make sure the given sources are loaded, loading them in the calling
+        thread if nobody has yet. Unknown names are ignored, and a source that
+        failed is skipped until RETRY_FAILED_SECONDS have passed (its error is
+        reported by health()).
+        """
+        for name in names:
+            source = self.sources.get(name)
+            if source is None or not self._should_load(source):
+                continue
+            with source["lock"]:
+                if self._should_load(source):
+                    self._load(name, source)
+
+    def _should_load(self, source):
+        if source["status"] == "ready":
+            return False
+        if source["status"] == "failed":
+            return time.monotonic() - source["failed_at"] >= RETRY_FAILED_SECONDS
+        return True
+
+    def _load(self, name, source):
+        source["status"] = "loading"
+        start = time.perf_counter()
+        try:
+            if source["kind"] == GENE_KIND:
+                data = load_gene_data(source["data_dir"], source["fname"], source["sep"])
+            else:
+                data = load_link_data(source["data_dir"], source["fname"], source["sep"])
+            with self._merge_lock:
+                if source["kind"] == GENE_KIND:
+                    merge_data_dict(self.gene_info_db, data)
+                    self.gene_generation += 1
+                else:
+                    self.interaction_evidence.add_source(data)
+                self.generation += 1
+        except Exception as e:
+            source["status"] = "failed"
+            source["error"] = str(e)
+            source["failed_at"] = time.monotonic()
+            print(f"Failed to load reference source {name}: {e}")
+            return
+        source["load_seconds"] = time.perf_counter() - start
+        source["error"] = None
+        source["status"] = "ready"
+
+    def gene_info(self):
+        """gene_info_db with every annotation source loaded."""
+        self.require(*self.names(GENE_KIND))
+        return self.gene_info_db
+
+    def interactions(self):
+        """InteractionEvidence with every interaction source loaded."""
+        self.require(*self.names(LINK_KIND))
+        return self.interaction_evidence
+
+    def load_in_background(self):
+        """Warm up every source in a daemon thread."""
+        thread = threading.Thread(target=self.require, args=self.names(), name="reference-loader", daemon=True)
+        thread.start()
+        return thread
+
+    @property
+    def ready(self):
+        return all(source["status"] == "ready" for source in self.sources.values())
+
+    def health(self):
+        return {
+            name: {
+                "kind": source["kind"],
+                "status": source["status"],
+                "load_seconds": source["load_seconds"],
+                "error": source["error"],
+            }
+            for name, source in self.sources.items()
+        }
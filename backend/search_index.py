@@ -0,0 +1,122 @@
+# search_index.py
+"""
+Inverted index for the gene search box.
+
+Documents are genes made of named text fields (the cleaned annotation values
+from gene_info_db, or just the symbol). Every field is indexed twice:
+  - character trigram postings, so substring queries only verify the few
+    documents containing all of the query's trigrams;
+  - sorted word tokens, so prefix queries are a binary search.
+
+Query syntax:
+    glioma              substring match in any field
+    cancer_type:glioma  substring match in one field
+    onco*               word prefix match (optionally field-scoped too)
+"""
+import re
+from bisect import bisect_left
+from collections import defaultdict, namedtuple
+
+NGRAM = 3
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+FIELD_PATTERN = re.compile(r"^([a-z_]+):(.*)$")
+
+SearchQuery = namedtuple("SearchQuery", ["field", "term", "prefix"])
+
+
+def parse_query(keyword, fields):
+    """
+    Split a raw keyword into (field, term, prefix). A `name:` prefix is only
+    treated as a field scope when `name` is one of `fields`.
+
+    Returns:
+        SearchQuery, or None when nothing is left to match (a blank keyword,
+        a lone `*` or a bare `field:`), which would otherwise match every gene
+    """
+    term = keyword.strip().lower()
+    field = None
+    match = FIELD_PATTERN.match(term)
+    if match and match.group(1) in fields:
+        field, term = match.group(1), match.group(2).strip()
+    prefix = term.endswith("*")
+    term = term.rstrip("*")
+    if not term:
+        return None
+    return SearchQuery(field, term, prefix)
+
+
+def _ngrams(text):
+    return {text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+
+
+class TextIndex:
+    def __init__(self, documents):
+        """
+        Args:
+            documents: iterable of (key, {field: text}); None texts are skipped
+        """
+        self.keys = []
+        self.texts = []
+        self.grams = defaultdict(lambda: defaultdict(set))
+        tokens = defaultdict(lambda: defaultdict(set))
+
+        for doc, (key, fields) in enumerate(documents):
+            self.keys.append(key)
+            texts = {}
+            for field, text in fields.items():
+                if text is None:
+                    continue
+                text = str(text).lower()
+                texts[field] = text
+                for gram in _ngrams(text):
+                    self.grams[field][gram].add(doc)
+                for token in TOKEN_PATTERN.findall(text):
+                    tokens[field][token].add(doc)
+            self.texts.append(texts)
+
+        self.tokens = {field: dict(postings) for field, postings in tokens.items()}
+        self.sorted_tokens = {field: sorted(postings) for field, postings in self.tokens.items()}
+
+    @property
+    def fields(self):
+        return set(self.grams) | set(self.tokens)
+
+    def _substring(self, field, term):
+        grams = self.grams.get(field)
+        if not grams:
+            return set()
+        if len(term) >= NGRAM:
+            postings = sorted((grams.get(gram, set()) for gram in _ngrams(term)), key=len)
+            candidates = set.intersection(*postings)
+        else:
+            # Shorter than one n-gram: any n-gram containing the term
+            candidates = set()
+            for gram, docs in grams.items():
+                if term in gram:
+                    candidates |= docs
+        # Trigrams can match out of order, so verify against the text
+        return {doc for doc in candidates if term in self.texts[doc].get(field, "")}
+
+    def _prefix(self, field, term):
+        tokens = self.sorted_tokens.get(field, [])
+        docs = set()
+        for i in range(bisect_left(tokens, term), len(tokens)):
+            if not tokens[i].startswith(term):
+                break
+            docs |= self.tokens[field][tokens[i]]
+        return docs
+
+    def search(self, query):
+        """
+        Return the keys of the documents matching a SearchQuery.
+        """
+        if query.field is not None and query.field not in self.fields:
+            return set()
+        fields = [query.field] if query.field is not None else self.fields
+        docs = set()
+        for field in fields:
+            if query.prefix:
+                docs |= self._prefix(field, query.term)
+            else:
+                docs |= self._substring(field, query.term)
+        return {self.keys[doc] for doc in docs}
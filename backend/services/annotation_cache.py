@@ -0,0 +1,131 @@
+# services/annotation_cache.py
+"""
+Persistent cache of LLM gene annotations.
+
+Entries live in a SQLite database in WAL mode, so several workers can read
+and write single entries concurrently instead of rewriting one JSON file.
+An entry is keyed by everything that affects the answer: (gene, view, k,
+model, prompt template hash). A small in-process LRU sits in front of the
+database, and entries expire after a TTL.
+
+The JSON file used by earlier versions is imported once, the first time the
+database is opened.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+DEFAULT_TTL_SECONDS = float(os.getenv("ANNOTATION_CACHE_TTL", 30 * 24 * 3600))
+DEFAULT_LRU_SIZE = 1024
+
+AnnotationKey = namedtuple("AnnotationKey", ["gene", "view", "k", "model", "prompt_hash"])
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS annotations (
+    gene TEXT NOT NULL,
+    view TEXT NOT NULL,
+    k INTEGER NOT NULL,
+    model TEXT NOT NULL,
+    prompt_hash TEXT NOT NULL,
+    value TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    PRIMARY KEY (gene, view, k, model, prompt_hash)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    name TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class AnnotationCache:
+    def __init__(self, path, ttl_seconds=DEFAULT_TTL_SECONDS, lru_size=DEFAULT_LRU_SIZE):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.lru_size = lru_size
+        self._lru = OrderedDict()  # AnnotationKey -> (value, expires_at)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+    def _remember(self, key, value, expires_at):
+        self._lru[key] = (value, expires_at)
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def get(self, key):
+        """The cached value for an AnnotationKey, or None if absent or expired."""
+        now = time.time()
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is not None:
+                if entry[1] > now:
+                    self._lru.move_to_end(key)
+                    return entry[0]
+                del self._lru[key]
+
+            row = self._db.execute(
+                "SELECT value, expires_at FROM annotations "
+                "WHERE gene = ? AND view = ? AND k = ? AND model = ? AND prompt_hash = ?",
+                tuple(key)).fetchone()
+            if row is None or row[1] <= now:
+                return None
+            value = json.loads(row[0])
+            self._remember(key, value, row[1])
+            return value
+
+    def put(self, key, value, ttl_seconds=None):
+        expires_at = time.time() + (self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO annotations VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (*key, json.dumps(value), expires_at))
+            self._remember(key, value, expires_at)
+
+    def purge_expired(self):
+        """Delete expired entries; returns how many were removed."""
+        with self._lock:
+            return self._db.execute("DELETE FROM annotations WHERE expires_at <= ?", (time.time(),)).rowcount
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM annotations").fetchone()[0]
+
+    def migrate_json(self, json_path, key_for):
+        """
+        Import the legacy {gene: {view: value}} JSON cache once.
+
+        Args:
+            json_path: path of the old annotation_cache.json
+            key_for: function (gene, view) -> AnnotationKey the entry was computed with
+
+        Returns:
+            number of imported entries (0 if already migrated or no file)
+        """
+        with self._lock:
+            done = self._db.execute("SELECT 1 FROM meta WHERE name = 'json_migrated'").fetchone()
+        if done or not os.path.exists(json_path):
+            return 0
+
+        try:
+            with open(json_path, "r") as f:
+                legacy = json.load(f)
+        except Exception as e:
+            print(f"Could not migrate annotation cache {json_path}: {e}")
+            legacy = {}
+
+        expires_at = time.time() + self.ttl_seconds
+        rows = [(*key_for(gene, view), json.dumps(value), expires_at)
+                for gene, views in legacy.items() for view, value in views.items()]
+        with self._lock:
+            self._db.execute("BEGIN")
+            self._db.executemany("INSERT OR IGNORE INTO annotations VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES ('json_migrated', ?)", (json_path,))
+            self._db.execute("COMMIT")
+        return len(rows)
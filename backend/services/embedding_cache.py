@@ -0,0 +1,83 @@
+# services/embedding_cache.py
+"""
+Persistent cache of query embeddings.
+
+Retriever queries are deterministic strings ("function of TP53", ...), so
+their embeddings are stored once, keyed by (model, text), as float32 blobs in
+a WAL-mode SQLite database, with an in-process LRU in front.
+"""
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+DEFAULT_LRU_SIZE = 4096
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    model TEXT NOT NULL,
+    text TEXT NOT NULL,
+    vector BLOB NOT NULL,
+    PRIMARY KEY (model, text)
+);
+"""
+
+
+class EmbeddingCache:
+    def __init__(self, path, lru_size=DEFAULT_LRU_SIZE):
+        self.path = path
+        self.lru_size = lru_size
+        self.hits = 0
+        self.misses = 0
+        self._lru = OrderedDict()  # (model, text) -> float32 vector
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+    def _remember(self, key, vector):
+        self._lru[key] = vector
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def get_many(self, model, texts):
+        """
+        Returns:
+            one float32 vector per text, None where it is not cached
+        """
+        vectors = [None] * len(texts)
+        with self._lock:
+            lookup = []
+            for i, text in enumerate(texts):
+                vector = self._lru.get((model, text))
+                if vector is None:
+                    lookup.append(i)
+                else:
+                    self._lru.move_to_end((model, text))
+                    vectors[i] = vector
+            for i in lookup:
+                row = self._db.execute(
+                    "SELECT vector FROM embeddings WHERE model = ? AND text = ?", (model, texts[i])).fetchone()
+                if row is not None:
+                    vectors[i] = np.frombuffer(row[0], dtype=np.float32)
+                    self._remember((model, texts[i]), vectors[i])
+            found = sum(vector is not None for vector in vectors)
+            self.hits += found
+            self.misses += len(texts) - found
+        return vectors
+
+    def put_many(self, model, texts, vectors):
+        rows = []
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                vector = np.asarray(vector, dtype=np.float32)
+                rows.append((model, text, vector.tobytes()))
+                self._remember((model, text), vector)
+            self._db.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)", rows)
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
@@ -2,23 +2,56 @@
 import os
 from openai import OpenAI
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+from services.upstream import guarded, metrics, UPSTREAM_TIMEOUT_SECONDS
+
+# One shared client, so HTTP connections are pooled across calls. Retries are
+# done by the upstream gateway (with jitter and rate limits), not the SDK.
+client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), timeout=UPSTREAM_TIMEOUT_SECONDS, max_retries=0)
+
+DEFAULT_MODEL = "gpt-4o-mini"
 
 # Load your API key
 
 def call_llm(prompt: str, system: str = "You are a helpful genomics assistant.", 
-             model: str = "gpt-4o-mini", temperature: float = 0.2, max_tokens: int = 300) -> str:
+             model: str = DEFAULT_MODEL, temperature: float = 0.2, max_tokens: int = 300) -> str:
     """
     Sends `prompt` to the LLM and returns the generated text.
     - `system` sets the system message (context/role of the assistant).
     - `model`, `temperature`, and `max_tokens` are tunable.
     """
-    response = client.chat.completions.create(model=model,
+    name = f"chat:{model}"
+    response = guarded(name, client.chat.completions.create, model=model,
     messages=[
         {"role": "system", "content": system},
         {"role": "user",   "content": prompt}
     ],
     temperature=temperature,
     max_tokens=max_tokens)
+    if response.usage is not None:
+        metrics.record_tokens(name, response.usage.prompt_tokens, response.usage.completion_tokens)
     # Extract and return the assistant’s reply
     return response.choices[0].message.content.strip()
+
+def call_llm_stream(prompt: str, system: str = "You are a helpful genomics assistant.",
+                    model: str = DEFAULT_MODEL, temperature: float = 0.2, max_tokens: int = 300):
+    """
+    Streaming counterpart of `call_llm`: yields the reply text piece by
+    piece as the completion is generated. Same arguments as `call_llm`.
+    Only opening the stream is retried.
+    """
+    name = f"chat:{model}"
+    stream = guarded(name, client.chat.completions.create, model=model,
+    messages=[
+        {"role": "system", "content": system},
+        {"role": "user",   "content": prompt}
+    ],
+    temperature=temperature,
+    max_tokens=max_tokens,
+    stream=True,
+    stream_options={"include_usage": True})
+    for chunk in stream:
+        # The last chunk carries the token usage and no choices
+        if chunk.usage is not None:
+            metrics.record_tokens(name, chunk.usage.prompt_tokens, chunk.usage.completion_tokens)
+        if chunk.choices and chunk.choices[0].delta.content:
+            yield chunk.choices[0].delta.content
@@ -0,0 +1,113 @@
+# services/local_index.py
+"""
+In-process passage index, a local alternative to the Pinecone `gene-chunks`
+index.
+
+Passages are sorted by (gene, context) so every metadata filter the
+retriever uses maps to one contiguous row range. On disk an index directory
+holds:
+    vectors.npy   float32 (n, dim) embeddings, memory-mapped when loaded
+    passages.json passage texts, in row order
+    ranges.json   {"<gene>|<context>": [start, end]}
+
+A query is then a slice of the matrix, one dot product and an argpartition.
+
+Build an index from JSONL chunk files (one {"gene", "type", "text"} object
+per line, optionally with a precomputed "embedding"), from the backend
+directory:
+    python -m services.local_index data/chunks/*.jsonl --out data/local_index
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+
+
+def range_key(gene, context):
+    return f"{gene.upper()}|{context}"
+
+
+def load_chunks(paths):
+    """Read chunk records from JSONL files, skipping blank lines."""
+    chunks = []
+    for path in paths:
+        with open(path, "r") as f:
+            for line in f:
+                if line.strip():
+                    chunks.append(json.loads(line))
+    return chunks
+
+
+def build_local_index(chunks, out_dir, embed=None):
+    """
+    Write an index directory for `chunks`.
+
+    Args:
+        chunks: dicts with "gene", "type" (the context) and "text", and
+            optionally "embedding"
+        out_dir: directory to write to
+        embed: function list[str] -> list[vector], used for chunks without
+            an embedding
+
+    Returns:
+        number of indexed passages
+    """
+    chunks = sorted(chunks, key=lambda chunk: (chunk["gene"].upper(), chunk["type"]))
+    missing = [i for i, chunk in enumerate(chunks) if "embedding" not in chunk]
+    if missing:
+        if embed is None:
+            raise ValueError(f"{len(missing)} chunks have no embedding and no embed function was given")
+        for i, vector in zip(missing, embed([chunks[i]["text"] for i in missing])):
+            chunks[i]["embedding"] = vector
+
+    vectors = np.asarray([chunk["embedding"] for chunk in chunks], dtype=np.float32)
+    ranges = {}
+    for row, chunk in enumerate(chunks):
+        key = range_key(chunk["gene"], chunk["type"])
+        ranges.setdefault(key, [row, row])[1] = row + 1
+
+    os.makedirs(out_dir, exist_ok=True)
+    np.save(os.path.join(out_dir, "vectors.npy"), vectors)
+    with open(os.path.join(out_dir, "passages.json"), "w") as f:
+        json.dump([chunk["text"] for chunk in chunks], f)
+    with open(os.path.join(out_dir, "ranges.json"), "w") as f:
+        json.dump(ranges, f)
+    return len(chunks)
+
+
+class LocalIndex:
+    def __init__(self, index_dir):
+        self.index_dir = index_dir
+        self.vectors = np.load(os.path.join(index_dir, "vectors.npy"), mmap_mode="r")
+        with open(os.path.join(index_dir, "passages.json"), "r") as f:
+            self.passages = json.load(f)
+        with open(os.path.join(index_dir, "ranges.json"), "r") as f:
+            self.ranges = json.load(f)
+
+    def query(self, vector, gene, context, k=5):
+        """
+        Texts of the k passages of (gene, context) with the highest dot
+        product with `vector`, best first.
+        """
+        start, end = self.ranges.get(range_key(gene, context), (0, 0))
+        if end <= start:
+            return []
+        scores = self.vectors[start:end] @ np.asarray(vector, dtype=np.float32)
+        if k < len(scores):
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [self.passages[start + i] for i in top.tolist()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build a local passage index from JSONL chunk files.")
+    parser.add_argument("chunks", nargs="+", help="JSONL chunk files")
+    parser.add_argument("--out", default="data/local_index", help="output directory")
+    args = parser.parse_args()
+
+    from services.retriever import embed_texts
+    count = build_local_index(load_chunks(args.chunks), args.out, embed=embed_texts)
+    print(f"Indexed {count} passages into {args.out}")
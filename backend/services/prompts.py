@@ -1,23 +1,164 @@
 # services/prompts.py
+"""
+Prompt templates for the annotation views, one `{view}.txt` file per view in
+services/prompts/.
+
+All templates are read once into a registry when this module is imported.
+Before handing out a template the registry checks (at most once per
+RELOAD_CHECK_SECONDS) whether its file changed on disk, so edits are picked
+up without a restart. Templates are parsed once into literal text and field
+names, so filling one in is a join. The content hash of a template, together
+with the token budget, is part of the annotation cache keys.
+
+build_prompt keeps prompts within PROMPT_TOKEN_BUDGET tokens by dropping the
+lowest-ranked passages (and cutting the last one kept if needed).
+"""
+import hashlib
 import os
+import threading
+import time
+from string import Formatter
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "prompts")
+RELOAD_CHECK_SECONDS = 1.0
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "3000"))
+PASSAGE_SEPARATOR = "\n\n"
+
+_encoding = tiktoken.get_encoding("cl100k_base") if tiktoken is not None else None
+
+
+def count_tokens(text: str) -> int:
+    """Token count with tiktoken when installed, else ~4 characters per token."""
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return (len(text) + 3) // 4
+
+
+def truncate_tokens(text: str, tokens: int) -> str:
+    if tokens <= 0:
+        return ""
+    if _encoding is not None:
+        return _encoding.decode(_encoding.encode(text)[:tokens])
+    return text[:tokens * 4]
+
+
+class PromptTemplate:
+    def __init__(self, path):
+        self.path = path
+        self.mtime = os.stat(path).st_mtime_ns
+        with open(path, "rb") as f:
+            raw = f.read()
+        self.text = raw.decode("utf-8")
+        self.hash = hashlib.sha1(raw).hexdigest()[:12]
+        self.parts = self._compile(self.text)
+
+    @staticmethod
+    def _compile(text):
+        """
+        (literal text, field name or None) pairs, or None when a field uses a
+        conversion, format spec or index (left to str.format).
+        """
+        parts = []
+        for literal, field, spec, conversion in Formatter().parse(text):
+            if field is not None and (spec or conversion or not field.isidentifier()):
+                return None
+            parts.append((literal, field))
+        return parts
+
+    def format(self, **data) -> str:
+        if self.parts is None:
+            return self.text.format(**data)
+        return "".join(literal if field is None else literal + str(data[field]) for literal, field in self.parts)
+
 
-TEMPLATE_DIR = "services/prompts"
+class TemplateRegistry:
+    def __init__(self, template_dir=TEMPLATE_DIR):
+        self.template_dir = template_dir
+        self.templates = {}
+        self._checked = {}
+        self._lock = threading.Lock()
+        for fname in sorted(os.listdir(template_dir)):
+            if fname.endswith(".txt"):
+                view = fname[:-len(".txt")]
+                self.templates[view] = PromptTemplate(os.path.join(template_dir, fname))
+                self._checked[view] = time.monotonic()
 
-def build_prompt(gene: str, view: str, passages: list[str], extra: dict = None) -> str:
+    def get(self, view: str) -> PromptTemplate:
+        """The current template of a view, reloaded if its file changed."""
+        now = time.monotonic()
+        template = self.templates.get(view)
+        if template is not None and now - self._checked[view] < RELOAD_CHECK_SECONDS:
+            return template
+
+        path = os.path.join(self.template_dir, f"{view}.txt")
+        with self._lock:
+            self._checked[view] = now
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except FileNotFoundError:
+                if template is None:
+                    raise KeyError(f"No prompt template for view '{view}'")
+                # Keep serving the last version if the file is briefly missing
+                return template
+            if template is None or template.mtime != mtime:
+                template = self.templates[view] = PromptTemplate(path)
+        return template
+
+
+registry = TemplateRegistry()
+
+
+def fit_passages(passages: list[str], budget: int) -> list[str]:
+    """
+    The leading passages that fit in `budget` tokens (passages are best
+    ranked first). If not even the first one fits, it is cut short.
+    """
+    kept = []
+    remaining = budget
+    separator = count_tokens(PASSAGE_SEPARATOR)
+    for passage in passages:
+        cost = count_tokens(passage) + (separator if kept else 0)
+        if cost <= remaining:
+            kept.append(passage)
+            remaining -= cost
+            continue
+        if not kept:
+            kept.append(truncate_tokens(passage, remaining))
+        break
+    return kept
+
+
+def build_prompt(gene: str, view: str, passages: list[str], extra: dict = None,
+                 token_budget: int = PROMPT_TOKEN_BUDGET) -> str:
     """
     - view: one of "function", "disease", "pathway"
-    - passages: list of text snippets
+    - passages: list of text snippets, best first
     - extra: optional dict for additional template variables (e.g. {"disease": "ovarian cancer"})
+    - token_budget: upper bound on the prompt size; passages are trimmed to fit
     """
-    # 1) Load the template file
-    path = os.path.join(TEMPLATE_DIR, f"{view}.txt")
-    template = open(path).read()
+    # 1) Get the (cached) template
+    template = registry.get(view)
 
-    # 2) Prepare replacements
-    joined = "\n\n".join(passages)
-    data = {"gene": gene, "passages": joined}
+    # 2) Prepare replacements, fitting the passages in what the template leaves
+    data = {"gene": gene, "passages": ""}
     if extra:
         data.update(extra)
+    base = count_tokens(template.format(**data))
+    data["passages"] = PASSAGE_SEPARATOR.join(fit_passages(passages, token_budget - base))
 
     # 3) Fill it in
     return template.format(**data)
+
+
+def prompt_version(view: str, token_budget: int = PROMPT_TOKEN_BUDGET) -> str:
+    """
+    Short digest of a view's template plus the token budget, used to key
+    cached annotations so that editing a template or changing the budget
+    invalidates them.
+    """
+    return f"{registry.get(view).hash}.{token_budget}"
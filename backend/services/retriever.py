@@ -1,30 +1,143 @@
 import os
-import openai
+import numpy as np
 from pinecone import Pinecone
 
-pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
-index = pc.Index("gene-chunks")
+from services.embedding_cache import EmbeddingCache
+from services.llm import client
+from services.local_index import LocalIndex
+from services.upstream import guarded, metrics
+
+EMBEDDING_MODEL = "text-embedding-ada-002"
+# Inputs per embeddings request when embedding many queries at once
+EMBED_BATCH_SIZE = 256
+# Every context the endpoints query with
+QUERY_CONTEXTS = ["function", "disease", "pathway", "general"]
+
+# Query strings are deterministic, so their embeddings are kept on disk
+embedding_cache = EmbeddingCache(os.getenv("EMBEDDING_CACHE_DB", "embedding_cache.db"))
+
+# "pinecone" (the remote gene-chunks index) or "local" (see services/local_index.py)
+RETRIEVER_BACKEND = os.getenv("RETRIEVER_BACKEND", "pinecone")
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "data/local_index")
+
+class PineconeRetriever:
+    def __init__(self, index_name: str = "gene-chunks"):
+        pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
+        self.index = pc.Index(index_name)
+
+    def query(self, vector: list[float], gene: str, context: str, k: int = 5) -> list[str]:
+        # Retrieve top-k vectors filtered by gene & context
+        results = guarded(
+            "pinecone:query",
+            self.index.query,
+            vector=vector,
+            top_k=k,
+            include_metadata=True,
+            filter={
+                "gene": {"$eq": gene},
+                "context": {"$eq": context}
+            }
+        )
+        snippets = []
+        for match in results.matches:
+            snippets.append(match.metadata.get("text", "[no text available]"))
+        return snippets
+
+_retriever = None
+
+def get_retriever():
+    """
+    The configured retriever backend, created on first use. Any backend
+    provides query(vector, gene, context, k) -> list of passage texts.
+    """
+    global _retriever
+    if _retriever is None:
+        if RETRIEVER_BACKEND == "local":
+            _retriever = LocalIndex(LOCAL_INDEX_DIR)
+        elif RETRIEVER_BACKEND == "pinecone":
+            _retriever = PineconeRetriever()
+        else:
+            raise ValueError(f"Unknown RETRIEVER_BACKEND '{RETRIEVER_BACKEND}'")
+    return _retriever
+
+def query_text(gene: str, context: str) -> str:
+    # A query that scopes to this gene+context
+    return f"{context} of {gene}"
+
+def embed_texts(texts: list[str]) -> list[list[float]]:
+    """
+    Embed texts in batched embeddings requests, without caching.
+    """
+    name = f"embeddings:{EMBEDDING_MODEL}"
+    vectors = []
+    for start in range(0, len(texts), EMBED_BATCH_SIZE):
+        resp = guarded(
+            name,
+            client.embeddings.create,
+            model=EMBEDDING_MODEL,
+            input=texts[start:start + EMBED_BATCH_SIZE]
+        )
+        if resp.usage is not None:
+            metrics.record_tokens(name, resp.usage.prompt_tokens)
+        # The API may return items out of order; `index` is the input position
+        vectors.extend(item.embedding for item in sorted(resp.data, key=lambda item: item.index))
+    return vectors
+
+def embed_queries(texts: list[str]) -> list[list[float]]:
+    """
+    Embed many query strings with as few embeddings requests as possible,
+    only sending the ones missing from the embedding cache.
+    """
+    vectors = embedding_cache.get_many(EMBEDDING_MODEL, texts)
+    missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+    fresh = {}
+    for start in range(0, len(missing), EMBED_BATCH_SIZE):
+        batch = missing[start:start + EMBED_BATCH_SIZE]
+        embedded = embed_texts(batch)
+        embedding_cache.put_many(EMBEDDING_MODEL, batch, embedded)
+        fresh.update(zip(batch, embedded))
+    # Cached vectors are float32, so round fresh ones the same way for stable results
+    return [(vector if vector is not None else np.asarray(fresh[text], dtype=np.float32)).tolist()
+            for text, vector in zip(texts, vectors)]
+
+def embed_with_queries(texts: list[str], queries: list[str]) -> tuple[list, list]:
+    """
+    Embed free texts (e.g. chat questions, never cached) together with query
+    strings (through the embedding cache), in one request when any query is
+    missing from the cache.
+
+    Returns:
+        (vectors of `texts`, vectors of `queries`)
+    """
+    vectors = embedding_cache.get_many(EMBEDDING_MODEL, queries)
+    missing = list(dict.fromkeys(query for query, vector in zip(queries, vectors) if vector is None))
+    embedded = embed_texts(list(texts) + missing)
+    if missing:
+        embedding_cache.put_many(EMBEDDING_MODEL, missing, embedded[len(texts):])
+    fresh = dict(zip(missing, embedded[len(texts):]))
+    # Cached vectors are float32, so round fresh ones the same way for stable results
+    return embedded[:len(texts)], [(vector if vector is not None else np.asarray(fresh[query], dtype=np.float32)).tolist()
+                                   for query, vector in zip(queries, vectors)]
+
+def warm_embeddings(genes) -> int:
+    """
+    Embed the queries of every context for `genes` ahead of time.
+
+    Returns:
+        number of queries that were not cached yet
+    """
+    texts = [query_text(gene, context) for gene in genes for context in QUERY_CONTEXTS]
+    misses = embedding_cache.misses
+    embed_queries(texts)
+    return embedding_cache.misses - misses
+
+def query_passages(vector: list[float], gene: str, context: str, k: int = 5) -> list[str]:
+    # Retrieve top-k passages of this gene & context from the configured backend
+    return get_retriever().query(vector, gene, context, k)
 
 def get_passages(gene: str, context: str, k: int = 5) -> list[str]:
     # 1) Embed a query that scopes to this gene+context
-    query_text = f"{context} of {gene}"
-    resp = openai.embeddings.create(
-        model="text-embedding-ada-002",
-        input=[query_text]
-    )
-    q_vec = resp.data[0].embedding
+    q_vec = embed_queries([query_text(gene, context)])[0]
 
     # 2) Retrieve top-k vectors filtered by gene & context
-    results = index.query(
-        vector=q_vec,
-        top_k=k,
-        include_metadata=True,
-        filter={
-            "gene": {"$eq": gene},
-            "context": {"$eq": context}
-        }
-    )
-    snippets = []
-    for match in results.matches:
-        snippets.append(match.metadata.get("text", "[no text available]"))
-    return snippets
+    return query_passages(q_vec, gene, context, k)
@@ -0,0 +1,82 @@
+# services/semantic_cache.py
+"""
+Semantic cache of /chat answers.
+
+An answer is reused for a new question about the same gene when the cosine
+similarity between the two question embeddings reaches `threshold` and the
+conversation histories are equivalent (same text up to case and whitespace,
+so in practice mostly empty histories). The cache holds at most
+`max_entries` answers and evicts the least recently used.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def history_key(history: str) -> str:
+    normalized = " ".join((history or "").lower().split())
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:16]
+
+
+class SemanticCache:
+    def __init__(self, threshold=0.95, max_entries=2048):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # entry id -> (scope, unit vector, answer)
+        self._scopes = {}  # (gene, history key) -> {entry id, ...}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def lookup(self, gene, history, vector):
+        """
+        Returns:
+            (answer, similarity) of the closest cached question, or None on a miss
+        """
+        scope = (gene.upper(), history_key(history))
+        vector = np.asarray(vector, dtype=np.float32)
+        vector = vector / (np.linalg.norm(vector) or 1.0)
+        with self._lock:
+            ids = list(self._scopes.get(scope, ()))
+            if ids:
+                similarities = np.stack([self._entries[i][1] for i in ids]) @ vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    self.hits += 1
+                    self._entries.move_to_end(ids[best])
+                    return self._entries[ids[best]][2], float(similarities[best])
+            self.misses += 1
+            return None
+
+    def store(self, gene, history, vector, answer):
+        scope = (gene.upper(), history_key(history))
+        vector = np.asarray(vector, dtype=np.float32)
+        vector = vector / (np.linalg.norm(vector) or 1.0)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (scope, vector, answer)
+            self._scopes.setdefault(scope, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                old_id, (old_scope, _, _) = self._entries.popitem(last=False)
+                self._scopes[old_scope].discard(old_id)
+                if not self._scopes[old_scope]:
+                    del self._scopes[old_scope]
+                self.evictions += 1
+
+    def metrics(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else None,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,274 @@
+# services/upstream.py
+"""
+Gateway for every call to the upstream services (OpenAI chat completions and
+embeddings, Pinecone).
+
+At the client call sites (`guarded`):
+  - a token bucket per upstream and model limits the request rate;
+  - retryable failures (429, 5xx, timeouts, connection errors) are retried
+    with exponential backoff and full jitter, honouring Retry-After;
+  - latency, failures, retries and token usage are recorded in `metrics`.
+
+From async endpoints (`call_upstream`, `iterate_upstream`):
+  - the blocking clients run in a bounded thread pool, and a semaphore shared
+    by every request caps how many calls are in flight. A slot is only given
+    back when the call really finishes, so a caller that times out does not
+    let more requests pile onto a slow upstream;
+  - identical concurrent calls are coalesced into one (single-flight).
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+import weakref
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+MAX_IN_FLIGHT = int(os.getenv("UPSTREAM_MAX_IN_FLIGHT", "8"))
+VIEW_TIMEOUT_SECONDS = float(os.getenv("ANNOTATION_VIEW_TIMEOUT", "30"))
+UPSTREAM_TIMEOUT_SECONDS = float(os.getenv("UPSTREAM_TIMEOUT", "60"))
+MAX_RETRIES = int(os.getenv("UPSTREAM_MAX_RETRIES", "4"))
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 20.0
+
+# (requests per second, burst) per upstream kind; each model gets its own bucket
+RATE_LIMITS = {
+    "chat": (float(os.getenv("CHAT_RATE_LIMIT", "8")), 8),
+    "embeddings": (float(os.getenv("EMBEDDINGS_RATE_LIMIT", "20")), 20),
+    "pinecone": (float(os.getenv("PINECONE_RATE_LIMIT", "50")), 50),
+}
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+RETRYABLE_ERRORS = {"APITimeoutError", "APIConnectionError", "RateLimitError", "InternalServerError",
+                    "Timeout", "TimeoutError", "ConnectionError"}
+
+_executor = ThreadPoolExecutor(max_workers=MAX_IN_FLIGHT, thread_name_prefix="upstream")
+_semaphores = weakref.WeakKeyDictionary()
+_inflight = weakref.WeakKeyDictionary()
+
+
+class RateLimiter:
+    """
+    Token bucket: `rate` acquisitions per second on average, with bursts of
+    up to `burst`. Safe to share between threads and event loops; callers
+    reserve a token and then wait out their delay, so they are served in
+    order.
+    """
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Take a token, returning how many seconds to wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def wait(self):
+        delay = self.reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire(self):
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class UpstreamMetrics:
+    def __init__(self, window=1000):
+        self._lock = threading.Lock()
+        self._stats = defaultdict(lambda: {
+            "calls": 0, "failures": 0, "retries": 0, "coalesced": 0,
+            "prompt_tokens": 0, "completion_tokens": 0,
+            "latencies": deque(maxlen=window),
+        })
+
+    def record_call(self, name, seconds, ok=True):
+        with self._lock:
+            stats = self._stats[name]
+            stats["calls"] += 1
+            stats["failures"] += 0 if ok else 1
+            stats["latencies"].append(seconds)
+
+    def record_retry(self, name):
+        with self._lock:
+            self._stats[name]["retries"] += 1
+
+    def record_coalesced(self, name):
+        with self._lock:
+            self._stats[name]["coalesced"] += 1
+
+    def record_tokens(self, name, prompt_tokens=0, completion_tokens=0):
+        with self._lock:
+            self._stats[name]["prompt_tokens"] += prompt_tokens or 0
+            self._stats[name]["completion_tokens"] += completion_tokens or 0
+
+    def snapshot(self):
+        """Per upstream counters plus latency percentiles over the recent window."""
+        with self._lock:
+            result = {}
+            for name, stats in self._stats.items():
+                latencies = sorted(stats["latencies"])
+                entry = {key: value for key, value in stats.items() if key != "latencies"}
+                for label, q in (("p50_ms", 0.5), ("p95_ms", 0.95)):
+                    entry[label] = round(1000 * latencies[int(q * (len(latencies) - 1))], 1) if latencies else None
+                result[name] = entry
+            return result
+
+
+metrics = UpstreamMetrics()
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def rate_limiter(name):
+    """The token bucket of an upstream, e.g. "chat:gpt-4o-mini"."""
+    with _limiters_lock:
+        if name not in _limiters:
+            rate, burst = RATE_LIMITS.get(name.split(":")[0], (10.0, 10))
+            _limiters[name] = RateLimiter(rate, burst)
+        return _limiters[name]
+
+
+def is_retryable(error):
+    status = getattr(error, "status_code", None) or getattr(error, "status", None)
+    if isinstance(status, int):
+        return status in RETRYABLE_STATUS
+    return any(cls.__name__ in RETRYABLE_ERRORS for cls in type(error).__mro__)
+
+
+def backoff_delay(attempt, error=None):
+    """Full-jitter exponential backoff, or the server's Retry-After if it sent one."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return min(float(headers.get("retry-after")), BACKOFF_MAX_SECONDS)
+    except (TypeError, ValueError):
+        return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+
+def guarded(name, fn, *args, **kwargs):
+    """
+    Call fn(*args, **kwargs) for upstream `name` under its rate limit,
+    retrying retryable errors up to MAX_RETRIES times.
+    """
+    limiter = rate_limiter(name)
+    for attempt in range(MAX_RETRIES + 1):
+        limiter.wait()
+        start = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            metrics.record_call(name, time.perf_counter() - start, ok=False)
+            if attempt == MAX_RETRIES or not is_retryable(e):
+                raise
+            metrics.record_retry(name)
+            time.sleep(backoff_delay(attempt, e))
+            continue
+        metrics.record_call(name, time.perf_counter() - start)
+        return result
+
+
+def _semaphore(loop):
+    # asyncio primitives belong to one event loop
+    if loop not in _semaphores:
+        _semaphores[loop] = asyncio.Semaphore(MAX_IN_FLIGHT)
+    return _semaphores[loop]
+
+
+def _release(loop, semaphore):
+    # Runs in the worker thread once the call has finished
+    if not loop.is_closed():
+        loop.call_soon_threadsafe(semaphore.release)
+
+
+async def _run_in_pool(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphore(loop)
+    await semaphore.acquire()
+    try:
+        future = _executor.submit(partial(fn, *args, **kwargs))
+    except BaseException:
+        semaphore.release()
+        raise
+    future.add_done_callback(lambda _: _release(loop, semaphore))
+    return await asyncio.wrap_future(future)
+
+
+async def call_upstream(fn, *args, **kwargs):
+    """
+    Await fn(*args, **kwargs) running in the upstream thread pool. While an
+    identical call (same function and hashable arguments) is in flight,
+    callers share its result instead of issuing another one.
+    """
+    key = (fn, args, tuple(sorted(kwargs.items())))
+    try:
+        hash(key)
+    except TypeError:
+        return await _run_in_pool(fn, *args, **kwargs)
+
+    loop = asyncio.get_running_loop()
+    inflight = _inflight.setdefault(loop, {})
+    task = inflight.get(key)
+    if task is None:
+        task = inflight[key] = loop.create_task(_run_in_pool(fn, *args, **kwargs))
+        task.add_done_callback(lambda done: inflight.pop(key, None) if inflight.get(key) is done else None)
+        # Mark the exception as retrieved in case every caller gave up waiting
+        task.add_done_callback(lambda done: done.cancelled() or done.exception())
+    else:
+        metrics.record_coalesced(getattr(fn, "__name__", repr(fn)))
+    # A caller timing out must not cancel the call for the others
+    return await asyncio.shield(task)
+
+
+async def iterate_upstream(fn, *args, **kwargs):
+    """
+    Async iterator over the items of the blocking generator
+    fn(*args, **kwargs), which runs in the upstream thread pool. Leaving the
+    loop early stops the generator at its next item.
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphore(loop)
+    queue = asyncio.Queue()
+    finished = object()
+    stop = threading.Event()
+
+    def put(item, error=None):
+        if not loop.is_closed():
+            loop.call_soon_threadsafe(queue.put_nowait, (item, error))
+
+    def produce():
+        try:
+            for item in fn(*args, **kwargs):
+                if stop.is_set():
+                    break
+                put(item)
+            put(finished)
+        except Exception as e:
+            put(finished, e)
+
+    await semaphore.acquire()
+    try:
+        future = _executor.submit(produce)
+    except BaseException:
+        semaphore.release()
+        raise
+    future.add_done_callback(lambda _: _release(loop, semaphore))
+    try:
+        while True:
+            item, error = await queue.get()
+            if item is finished:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
@@ -0,0 +1,49 @@
+import os
+import sys
+import uuid
+
+import pytest
+
+# The backend is a flat set of modules run from backend/
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+
+
+@pytest.fixture(scope="session")
+def app_dir(tmp_path_factory):
+    """Working directory for the app: its caches and spill files go here, not into backend/."""
+    path = tmp_path_factory.mktemp("app")
+    (path / "gene_data").symlink_to(os.path.join(BACKEND, "gene_data"))
+    return path
+
+
+@pytest.fixture(scope="session")
+def main(app_dir):
+    """The FastAPI app module, imported without upstream credentials or warm-up."""
+    os.environ.setdefault("OPENAI_API_KEY", "test")
+    os.environ["EMBEDDING_WARMUP"] = "0"
+    os.environ["EMBEDDING_CACHE_DB"] = str(app_dir / "embedding_cache.db")
+    os.environ["WORKSPACE_SPILL_DIR"] = str(app_dir / "workspace_spill")
+    cwd = os.getcwd()
+    os.chdir(app_dir)
+    try:
+        import main
+    finally:
+        os.chdir(cwd)
+    return main
+
+
+@pytest.fixture
+def client(main, app_dir, monkeypatch):
+    """A TestClient on a fresh session workspace."""
+    from fastapi.testclient import TestClient
+    monkeypatch.chdir(app_dir)
+    return TestClient(main.app, headers={"X-Session-ID": uuid.uuid4().hex})
+
+
+def upload_edges(client, graph_index, edges):
+    """Upload (source, target, weight) rows as an interaction file."""
+    data = "source,target,weight\n" + "".join(f"{a},{b},{w}\n" for a, b, w in edges)
+    response = client.post(f"/upload?graph_index={graph_index}", files={"file": ("edges.csv", data)})
+    assert response.status_code == 200, response.text
+    return response
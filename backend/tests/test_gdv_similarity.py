@@ -0,0 +1,22 @@
+from conftest import upload_edges
+
+
+def test_gdv_similarity_uses_the_requested_pair(client):
+    upload_edges(client, "0", [("X1", "X2", 1), ("X2", "X3", 1)])
+    upload_edges(client, "1", [("Y1", "Y2", 1)])
+    upload_edges(client, "a", [("A", "B", 1), ("B", "C", 1), ("C", "A", 1), ("C", "D", 1)])
+    upload_edges(client, "b", [("A", "B", 1), ("B", "C", 1), ("C", "E", 1)])
+
+    result = client.get("/gdv-similarity?graph_index1=a&graph_index2=b").json()
+    # Genes shared by a and b, not by the default graphs 0 and 1
+    assert sorted(entry["gene"] for entry in result["genes"]) == ["A", "B", "C"]
+
+    orbits_a = client.get("/graphlet-orbits/a").json()["gdv"]
+    orbits_b = client.get("/graphlet-orbits/b").json()["gdv"]
+    for entry in result["genes"]:
+        assert entry["gdv1"] == orbits_a[entry["gene"]]
+        assert entry["gdv2"] == orbits_b[entry["gene"]]
+
+
+def test_gdv_similarity_rejects_unknown_graphs(client):
+    assert client.get("/gdv-similarity?graph_index1=a&graph_index2=zz").status_code == 400
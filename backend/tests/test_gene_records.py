@@ -0,0 +1,15 @@
+import pytest
+
+from gene_records import etag_for, etag_matches
+
+ETAG = etag_for(b'{"gene":"TP53"}')
+
+
+@pytest.mark.parametrize("header", [ETAG, "W/" + ETAG, '"other", ' + ETAG, f' W/"x" ,{ETAG} ', "*"])
+def test_etag_matches(header):
+    assert etag_matches(header, ETAG)
+
+
+@pytest.mark.parametrize("header", ["", '"other"', ETAG[:-2] + '"', ETAG + "x", '"' + ETAG + '"', ETAG[1:-1]])
+def test_etag_mismatch(header):
+    assert not etag_matches(header, ETAG)
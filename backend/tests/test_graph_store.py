@@ -0,0 +1,56 @@
+import networkx as nx
+import numpy as np
+import pytest
+
+from analytics.graphlets import count_graphlets_from_adjacency, enumerate_graphlets
+from graph_store import CompactGraph
+
+
+def compact(G):
+    genes = [str(node) for node in G.nodes()]
+    index = {node: i for i, node in enumerate(G.nodes())}
+    sources = [index[u] for u, _ in G.edges()]
+    targets = [index[v] for _, v in G.edges()]
+    return CompactGraph.from_edges(genes, sources, targets, np.ones(len(sources)), np.zeros(len(genes)))
+
+
+def reference(G, removed):
+    H = G.copy()
+    H.remove_nodes_from(removed)
+    return H
+
+
+@pytest.mark.parametrize("seed", range(10))
+@pytest.mark.parametrize("size", [3, 4])
+def test_counts_after_removal_on_fresh_copy(seed, size):
+    G = nx.gnp_random_graph(9, 0.5, seed=seed)
+    removed = [0, 4]
+    # Views built from scratch after the removals (copy() starts without any)
+    graph = compact(G).copy()
+    for node in removed:
+        assert graph.remove_node(str(node))
+    result = count_graphlets_from_adjacency(graph.adjacency_sets(), size, num_nodes=graph.num_nodes)
+    assert result == enumerate_graphlets(reference(G, removed), size)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_views_patched_across_removals(seed):
+    G = nx.gnp_random_graph(9, 0.5, seed=seed)
+    graph = compact(G)
+    graph.adjacency_sets()
+    graph.motif_counts()
+    for node in (2, 7):
+        graph.remove_node(str(node))
+    H = reference(G, [2, 7])
+    assert graph.adjacency_sets() == compact(G).with_alive(graph.alive).adjacency_sets()
+    assert count_graphlets_from_adjacency(graph.adjacency_sets(), 4, num_nodes=graph.num_nodes) == \
+        enumerate_graphlets(H, 4)
+    assert graph.motif_counts()["triangles"] == sum(nx.triangles(H).values()) // 3
+    assert graph.num_nodes == H.number_of_nodes() and graph.num_edges == H.number_of_edges()
+
+
+def test_removed_genes_have_no_neighbours():
+    graph = compact(nx.complete_graph(4)).copy()
+    graph.remove_node("1")
+    assert graph.adjacency_sets()[1] == set()
+    assert not graph.remove_node("1")
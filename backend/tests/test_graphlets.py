@@ -0,0 +1,49 @@
+import random
+
+import networkx as nx
+import pytest
+
+from analytics.graphlets import (adjacency_sets, count_graphlets, count_graphlets_from_adjacency,
+                                 enumerate_graphlets, graphlet_counts_3, triangles_and_wedges)
+
+
+def random_graphs(count=40, seed=7):
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield nx.gnp_random_graph(rng.randint(4, 9), rng.uniform(0.1, 0.9), seed=rng.randrange(10 ** 6))
+
+
+@pytest.mark.parametrize("size", [3, 4])
+def test_formulas_match_brute_force(size):
+    for G in random_graphs():
+        assert count_graphlets(G, size) == enumerate_graphlets(G, size)
+
+
+@pytest.mark.parametrize("size", [3, 4])
+def test_formulas_match_brute_force_after_removals(size):
+    # Removed nodes stay in the adjacency as empty placeholders
+    rng = random.Random(11)
+    for G in random_graphs(seed=3):
+        removed = rng.sample(list(G.nodes()), rng.randint(1, 2))
+        adj = adjacency_sets(G)
+        for v in removed:
+            for u in adj[v]:
+                adj[u].discard(v)
+            adj[v] = set()
+        H = G.copy()
+        H.remove_nodes_from(removed)
+        result = count_graphlets_from_adjacency(adj, size, num_nodes=H.number_of_nodes())
+        assert result == enumerate_graphlets(H, size)
+
+
+def test_graphlet_counts_3_from_totals():
+    for G in random_graphs(seed=5):
+        triangles, wedges = triangles_and_wedges(adjacency_sets(G))
+        counts = graphlet_counts_3(G.number_of_nodes(), G.number_of_edges(), triangles, wedges)
+        assert counts == enumerate_graphlets(G, 3)["counts"]
+
+
+def test_too_few_nodes_and_bad_size():
+    assert count_graphlets(nx.path_graph(3), 4)["total_graphlets"] == 0
+    with pytest.raises(ValueError):
+        count_graphlets(nx.path_graph(5), 5)
@@ -0,0 +1,117 @@
+import asyncio
+import threading
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+
+import networkx as nx
+import numpy as np
+import pytest
+
+import analytics.jobs as jobs
+from analytics.jobs import AnalyticsJobs, JobCancelled
+from graph_store import CompactGraph
+
+from conftest import upload_edges
+
+
+def compact(G):
+    sources, targets = zip(*G.edges())
+    return CompactGraph.from_edges(list(G.nodes()), sources, targets, np.ones(len(sources)), np.zeros(len(G)))
+
+
+@pytest.fixture
+def exported(monkeypatch):
+    """Names of the shared-memory blocks created by export_graph."""
+    names = []
+    export_graph = jobs.export_graph
+
+    def recording_export(graph):
+        shm, handle = export_graph(graph)
+        names.append(shm.name)
+        return shm, handle
+
+    monkeypatch.setattr(jobs, "export_graph", recording_export)
+    return names
+
+
+def assert_unlinked(names):
+    for name in names:
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name)
+
+
+class FailingPool:
+    def submit(self, *args):
+        raise RuntimeError("cannot schedule new futures after shutdown")
+
+
+def test_blocks_released_when_submit_fails(exported, monkeypatch):
+    manager = AnalyticsJobs()
+    monkeypatch.setattr(manager, "_executor", lambda fresh=False: FailingPool())
+    graphs = [compact(nx.cycle_graph(5)), compact(nx.path_graph(4))]
+    with pytest.raises(RuntimeError):
+        manager.submit("metrics", "metrics", graphs)
+    assert len(exported) == 2
+    assert_unlinked(exported)
+    assert not manager.jobs
+
+
+def test_blocks_released_when_export_fails(exported, monkeypatch):
+    manager = AnalyticsJobs()
+    graph = compact(nx.cycle_graph(5))
+    broken = graph.copy()
+    broken.genes = None  # fails while packing the gene names
+    with pytest.raises(TypeError):
+        manager.submit("metrics", "metrics", [graph, broken])
+    assert len(exported) == 1
+    assert_unlinked(exported)
+    assert manager._pool is None
+
+
+class IdlePool:
+    """A pool that queues jobs without ever running them."""
+    def submit(self, *args):
+        return Future()
+
+
+def test_cancel_queued_job():
+    manager = AnalyticsJobs()
+    manager._executor = lambda fresh=False: IdlePool()
+    job = manager.submit("metrics", "metrics", [compact(nx.cycle_graph(5))], owner="alice")
+    assert manager.cancel(job["job_id"], owner="bob") is None
+    assert manager.cancel(job["job_id"], owner="alice")["status"] == "cancelled"
+    with pytest.raises(JobCancelled):
+        asyncio.run(manager.wait(job))
+
+
+def test_finish_runs_on_the_submitting_event_loop():
+    manager = AnalyticsJobs(max_workers=1)
+    threads = []
+
+    def finish(results):
+        threads.append(threading.get_ident())
+        return results[0]["num_nodes"]
+
+    async def scenario():
+        job = manager.submit("metrics", "metrics", [compact(nx.cycle_graph(5))], finish=finish, owner="alice")
+        return await manager.wait(job), job
+
+    try:
+        result, job = asyncio.run(scenario())
+    finally:
+        manager.shutdown()
+    assert result == 5 and threads == [threading.get_ident()]
+    assert manager.get(job["job_id"], owner="alice")["status"] == "done"
+    assert manager.get(job["job_id"], owner="bob") is None
+
+
+def test_job_endpoints_are_scoped_to_the_session(client):
+    upload_edges(client, 0, [("A", "B", 1), ("B", "C", 1), ("C", "D", 1), ("D", "A", 1)])
+    response = client.get("/graphlet-analysis", params={"size": 4, "wait": False})
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+
+    other = {"X-Session-ID": "someone-else"}
+    assert client.get(f"/analytics-jobs/{job_id}", headers=other).status_code == 404
+    assert client.delete(f"/analytics-jobs/{job_id}", headers=other).status_code == 404
+    assert client.get(f"/analytics-jobs/{job_id}").status_code == 200
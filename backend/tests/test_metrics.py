@@ -0,0 +1,37 @@
+import networkx as nx
+import numpy as np
+import pytest
+
+from analytics.metrics import calculate_graph_metrics, live_adjacency, pagerank
+from graph_store import CompactGraph
+
+
+def compact(edges):
+    genes = sorted({gene for edge in edges for gene in edge[:2]})
+    sources, targets, weights = zip(*edges)
+    return CompactGraph.from_edges(genes, [genes.index(gene) for gene in sources],
+                                   [genes.index(gene) for gene in targets], np.array(weights), np.zeros(len(genes)))
+
+
+def test_pagerank_uses_weight_magnitudes():
+    edges = [("A", "B", -3.0), ("B", "C", 1.0), ("C", "A", 2.0), ("C", "D", -0.5)]
+    graph = compact(edges)
+    ids, _, W = live_adjacency(graph)
+    rank = pagerank(W)
+    G = nx.Graph()
+    G.add_weighted_edges_from((a, b, abs(w)) for a, b, w in edges)
+    expected = nx.pagerank(G)
+    for i, gene_id in enumerate(ids.tolist()):
+        assert rank[i] == pytest.approx(expected[graph.genes[gene_id]], abs=1e-5)
+    assert (rank > 0).all() and rank.sum() == pytest.approx(1.0)
+
+
+def test_degree_assortativity_is_none_when_undefined():
+    # Every edge joins genes of equal degree
+    cycle = calculate_graph_metrics(compact([("A", "B", 1), ("B", "C", 1), ("C", "A", 1)]))
+    assert cycle["degree_assortativity"] is None
+    assert calculate_graph_metrics(None)["degree_assortativity"] is None
+
+    star = calculate_graph_metrics(compact([("A", "B", 1), ("A", "C", 1), ("A", "D", 1), ("D", "E", 1)]))
+    G = nx.Graph([("A", "B"), ("A", "C"), ("A", "D"), ("D", "E")])
+    assert star["degree_assortativity"] == pytest.approx(nx.degree_assortativity_coefficient(G))
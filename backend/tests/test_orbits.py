@@ -0,0 +1,67 @@
+import random
+from itertools import combinations
+
+import networkx as nx
+import numpy as np
+import pytest
+
+from analytics.orbits import ORBIT_COUNT, gdv_similarity, graphlet_degree_vectors
+
+
+def random_graphs(count=40, seed=13):
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield nx.gnp_random_graph(rng.randint(4, 9), rng.uniform(0.1, 0.9), seed=rng.randrange(10 ** 6))
+
+
+def orbit_of(H, node):
+    """Orbit of `node` in the connected induced subgraph H (Przulj's numbering)."""
+    degree = H.degree(node)
+    edges, top = H.number_of_edges(), max(d for _, d in H.degree())
+    if len(H) == 2:
+        return 0
+    if len(H) == 3:
+        return 3 if edges == 3 else {1: 1, 2: 2}[degree]
+    if edges == 3:
+        return {1: 6, 3: 7}[degree] if top == 3 else {1: 4, 2: 5}[degree]
+    if edges == 4:
+        return {1: 9, 2: 10, 3: 11}[degree] if top == 3 else 8
+    if edges == 5:
+        return {2: 12, 3: 13}[degree]
+    return 14
+
+
+def brute_force_gdv(G):
+    """GDVs by visiting every connected induced subgraph on 2 to 4 nodes."""
+    nodes = list(G.nodes())
+    index = {node: i for i, node in enumerate(nodes)}
+    gdv = np.zeros((len(nodes), ORBIT_COUNT), dtype=np.int64)
+    for size in (2, 3, 4):
+        for subset in combinations(nodes, size):
+            H = G.subgraph(subset)
+            if nx.is_connected(H):
+                for node in subset:
+                    gdv[index[node], orbit_of(H, node)] += 1
+    return nodes, gdv
+
+
+def test_orbits_match_brute_force():
+    for G in random_graphs():
+        nodes, gdv = graphlet_degree_vectors(G)
+        expected_nodes, expected = brute_force_gdv(G)
+        assert nodes == expected_nodes
+        np.testing.assert_array_equal(gdv, expected)
+
+
+@pytest.mark.parametrize("G", [nx.complete_graph(4), nx.cycle_graph(4), nx.star_graph(3), nx.path_graph(4),
+                               nx.Graph([(0, 1), (1, 2), (2, 0), (2, 3)]), nx.empty_graph(3)],
+                         ids=["clique", "cycle", "star", "path", "paw", "empty"])
+def test_orbits_of_single_graphlets(G):
+    np.testing.assert_array_equal(graphlet_degree_vectors(G)[1], brute_force_gdv(G)[1])
+
+
+def test_gdv_similarity_bounds():
+    _, gdv = graphlet_degree_vectors(nx.gnp_random_graph(9, 0.5, seed=1))
+    np.testing.assert_allclose(gdv_similarity(gdv, gdv), 1.0)
+    similarity = gdv_similarity(gdv, gdv[::-1])
+    assert ((similarity >= 0) & (similarity <= 1)).all()
@@ -0,0 +1,21 @@
+import json
+
+from pathway_index import TermIndex, load_pathway_pairs
+
+
+def test_unnamed_pathway_chunks_are_skipped(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    chunks = [
+        {"type": "pathway", "gene": "TP53", "pathway": "p53 signaling", "text": "TP53 in p53 signaling"},
+        {"type": "pathway", "gene": "MDM2", "name": "p53 signaling", "text": "MDM2 in p53 signaling"},
+        {"type": "pathway", "gene": "EGFR", "text": "EGFR takes part in several pathways"},
+        {"type": "function", "gene": "EGFR", "pathway": "ignored", "text": "not a pathway chunk"},
+    ]
+    path = tmp_path / "pathway.jsonl"
+    path.write_text("\n".join(json.dumps(chunk) for chunk in chunks) + "\n\n")
+    triples = load_pathway_pairs(str(path))
+    assert [(gene, term) for gene, term, _ in triples] == [("TP53", "p53 signaling"), ("MDM2", "p53 signaling")]
+
+    genes, terms, _ = zip(*triples)
+    ranked, hits = TermIndex(list(genes), list(terms)).rank(["TP53", "MDM2"], 5)
+    assert hits == 2 and ranked[0]["term"] == "p53 signaling" and ranked[0]["overlap"] == 2
@@ -0,0 +1,34 @@
+import pytest
+
+import services.prompts as prompts
+from services.prompts import PromptTemplate, build_prompt, prompt_version, registry
+
+
+def template(tmp_path, text):
+    path = tmp_path / "view.txt"
+    path.write_text(text)
+    return PromptTemplate(str(path))
+
+
+@pytest.mark.parametrize("text", ["Gene {gene}:\n{passages}\nEnd {{braces}}", "{gene}{passages}", "plain", "{gene!r} {n:>4}"])
+def test_compiled_template_matches_str_format(tmp_path, text):
+    assert template(tmp_path, text).format(gene="TP53", passages="a\n\nb", n=7) == text.format(
+        gene="TP53", passages="a\n\nb", n=7)
+
+
+def test_missing_field_raises(tmp_path):
+    with pytest.raises(KeyError):
+        template(tmp_path, "{gene} {passages}").format(gene="TP53")
+
+
+def test_prompt_version_depends_on_budget():
+    assert prompt_version("function", 1000) != prompt_version("function", 2000)
+    assert prompt_version("function").startswith(registry.get("function").hash)
+
+
+def test_budget_trims_passages(monkeypatch):
+    monkeypatch.setattr(prompts, "_encoding", None)
+    passages = ["x" * 400, "y" * 400]
+    base = prompts.count_tokens(build_prompt("TP53", "function", []))
+    assert "y" * 400 in build_prompt("TP53", "function", passages, token_budget=base + 300)
+    assert "y" * 400 not in build_prompt("TP53", "function", passages, token_budget=base + 150)
@@ -0,0 +1,31 @@
+import reference_data
+from reference_data import ReferenceRegistry
+
+
+def test_failed_source_waits_before_retrying(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "genes").mkdir()
+    (tmp_path / "genes" / "go_biological_test.csv").write_text("gene,annotation\nTP53,apoptosis\n")
+    attempts = []
+    load_gene_data = reference_data.load_gene_data
+
+    def flaky_load(*args):
+        attempts.append(args)
+        if len(attempts) == 1:
+            raise ValueError("corrupt file")
+        return load_gene_data(*args)
+
+    monkeypatch.setattr(reference_data, "load_gene_data", flaky_load)
+    reference = ReferenceRegistry(["genes"], "links")
+
+    reference.gene_info()
+    reference.gene_info()
+    assert len(attempts) == 1
+    assert reference.health()["go_biological"] == {
+        "kind": "gene", "status": "failed", "load_seconds": None, "error": "corrupt file"}
+
+    # Once the backoff has passed the source is loaded again
+    monkeypatch.setattr(reference_data, "RETRY_FAILED_SECONDS", 0)
+    assert "TP53" in reference.gene_info()
+    assert len(attempts) == 2
+    assert reference.health()["go_biological"]["error"] is None
@@ -0,0 +1,59 @@
+import pytest
+
+from gene_records import GeneRecordCache
+from reference_data import ReferenceRegistry
+from search_index import TextIndex, parse_query
+
+from conftest import upload_edges
+
+FIELDS = {"symbol", "cancer_type"}
+
+
+@pytest.mark.parametrize("keyword", ["", "   ", "*", "**", "symbol:", "cancer_type: *"])
+def test_parse_query_without_term(keyword):
+    assert parse_query(keyword, FIELDS) is None
+
+
+def test_parse_query_scopes_and_prefixes():
+    assert parse_query(" Cancer_Type:Glio* ", FIELDS) == ("cancer_type", "glio", True)
+    assert parse_query("unknown:tp53", FIELDS) == (None, "unknown:tp53", False)
+
+
+def test_index_search():
+    index = TextIndex([("TP53", {"symbol": "TP53", "cancer_type": "glioma"}),
+                       ("EGFR", {"symbol": "EGFR", "cancer_type": None})])
+    assert index.search(parse_query("cancer_type:gli", index.fields)) == {"TP53"}
+    assert index.search(parse_query("e*", index.fields)) == {"EGFR"}
+    assert index.search(parse_query("53", index.fields)) == {"TP53"}
+
+
+@pytest.mark.parametrize("keyword", ["*", " ", "symbol:"])
+def test_search_rejects_keyword_without_term(client, keyword):
+    upload_edges(client, 0, [("A", "B", 1), ("B", "C", 1)])
+    response = client.get("/search", params={"keyword": keyword})
+    assert response.status_code == 400
+
+
+def test_search_without_keyword_lists_degree_range(client):
+    upload_edges(client, 0, [("A", "B", 1), ("B", "C", 1)])
+    response = client.get("/search", params={"min_degree": 2})
+    assert response.json()["gene"] == ["B"]
+
+
+def test_gene_records_ignore_interaction_loads(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "genes").mkdir()
+    (tmp_path / "links").mkdir()
+    (tmp_path / "genes" / "go_biological_test.csv").write_text("gene,annotation\nTP53,apoptosis\n")
+    (tmp_path / "links" / "biogrid_test.csv").write_text("official_symbol_a,official_symbol_b\nTP53,EGFR\n")
+    reference = ReferenceRegistry(["genes"], "links")
+    records = GeneRecordCache(reference)
+
+    reference.require("go_biological")
+    assert records.get("TP53") is not None
+    table = records.records
+
+    reference.require("biogrid")
+    assert reference.generation == 2 and reference.gene_generation == 1
+    records.get("TP53")
+    assert records.records is table
@@ -0,0 +1,21 @@
+from conftest import upload_edges
+
+
+def test_upload_progress_follows_the_workspace(client):
+    upload_edges(client, "extra", [("A", "B", 1), ("B", "C", 2)])
+    progress = client.get("/upload-progress/extra").json()
+    assert progress["status"] == "done" and progress["edges"] == 2
+
+    assert client.delete("/graphs/extra").status_code == 200
+    assert client.get("/upload-progress/extra").status_code == 404
+
+
+def test_upload_progress_is_per_session(client):
+    upload_edges(client, 0, [("A", "B", 1)])
+    other = client.get("/upload-progress/0", headers={"X-Session-ID": "someone-else"})
+    assert other.status_code == 404
+
+
+def test_upload_progress_validates_the_session(client):
+    response = client.get("/upload-progress/0", headers={"X-Session-ID": "../escape"})
+    assert response.status_code == 400
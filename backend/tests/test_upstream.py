@@ -0,0 +1,251 @@
+"""
+/annotate_all_views, batch annotation jobs and the upstream gateway against
+local stubs of the retriever (embeddings + vector search) and the LLM: no
+network is used.
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from services.annotation_cache import AnnotationCache
+from services.embedding_cache import EmbeddingCache
+from services.upstream import call_upstream
+
+VIEWS = ("function", "disease", "pathway")
+
+
+@pytest.fixture
+def stubs(main, tmp_path, monkeypatch):
+    """
+    Stub get_passages / call_llm on a fresh annotation cache. Every view's
+    retrieval waits on a barrier, so it only gets through if all three views
+    are retrieved concurrently.
+    """
+    state = {
+        "barrier": threading.Barrier(len(VIEWS), timeout=5),
+        "release": threading.Event(),
+        "slow": set(),
+        "failing": set(),
+        "llm_calls": [],
+    }
+
+    def get_passages(gene, context, k):
+        state["barrier"].wait()
+        if context in state["slow"]:
+            state["release"].wait(5)
+        return [f"{context} passage {i} for {gene}" for i in range(k)]
+
+    def call_llm(prompt, **kwargs):
+        view = next(view for view in VIEWS if f"{view} passage" in prompt)
+        state["llm_calls"].append(view)
+        if view in state["failing"]:
+            raise RuntimeError(f"{view} upstream failed")
+        return f"{view} summary"
+
+    monkeypatch.setattr(main, "get_passages", get_passages)
+    monkeypatch.setattr(main, "call_llm", call_llm)
+    monkeypatch.setattr(main, "indexed_genes", {"TP53"})
+    monkeypatch.setattr(main, "annotation_cache", AnnotationCache(str(tmp_path / "annotations.db")))
+    yield state
+    state["release"].set()
+
+
+def annotate(client, gene="TP53", k=2):
+    response = client.post(f"/annotate_all_views?k={k}", json={"gene": gene})
+    assert response.status_code == 200, response.text
+    return response.json()
+
+
+def test_views_are_annotated_concurrently(client, stubs):
+    result = annotate(client)
+    for view in VIEWS:
+        assert result[view]["summary"] == f"{view} summary"
+        assert result[view]["retrieved_passages"] == [f"{view} passage 0 for TP53", f"{view} passage 1 for TP53"]
+
+    # Served from the cache the second time
+    assert annotate(client) == result
+    assert sorted(stubs["llm_calls"]) == sorted(VIEWS)
+
+
+def test_view_timeout_is_reported_and_not_cached(client, stubs, main, monkeypatch):
+    monkeypatch.setattr(main, "VIEW_TIMEOUT_SECONDS", 0.5)
+    stubs["slow"].add("disease")
+    result = annotate(client)
+    assert "Timed out" in result["disease"]["error"]
+    assert result["function"]["summary"] == "function summary"
+    assert result["pathway"]["summary"] == "pathway summary"
+
+    # Only the timed out view is computed again
+    stubs["slow"].clear()
+    stubs["release"].set()
+    stubs["barrier"] = threading.Barrier(1, timeout=5)
+    result = annotate(client)
+    assert result["disease"]["summary"] == "disease summary"
+    assert stubs["llm_calls"].count("function") == 1
+
+
+def test_partial_failure_keeps_other_views(client, stubs):
+    stubs["failing"].add("pathway")
+    result = annotate(client)
+    assert result["pathway"] == {"error": "pathway upstream failed"}
+    assert result["function"]["summary"] == "function summary"
+    assert result["disease"]["summary"] == "disease summary"
+
+    # The error is cached (with its short TTL) like any other result
+    assert annotate(client)["pathway"] == result["pathway"]
+    assert stubs["llm_calls"].count("pathway") == 1
+
+
+def test_gene_not_indexed(client, stubs):
+    result = annotate(client, gene="brca1")
+    assert result["gene"] == "BRCA1"
+    assert all("not indexed" in result[view]["error"] for view in VIEWS)
+    assert not stubs["llm_calls"]
+
+
+def test_call_upstream_coalesces_identical_calls():
+    calls = []
+
+    def fetch(key):
+        calls.append(key)
+        time.sleep(0.2)
+        return key.upper()
+
+    async def scenario():
+        return await asyncio.gather(call_upstream(fetch, "a"), call_upstream(fetch, "a"), call_upstream(fetch, "b"))
+
+    assert asyncio.run(scenario()) == ["A", "A", "B"]
+    assert sorted(calls) == ["a", "b"]
+
+
+def test_caller_timeout_does_not_cancel_shared_call():
+    def fetch(key):
+        time.sleep(0.3)
+        return key
+
+    async def scenario():
+        impatient = asyncio.wait_for(call_upstream(fetch, "shared"), 0.05)
+        patient = call_upstream(fetch, "shared")
+        return await asyncio.gather(impatient, patient, return_exceptions=True)
+
+    impatient, patient = asyncio.run(scenario())
+    assert isinstance(impatient, asyncio.TimeoutError)
+    assert patient == "shared"
+
+
+def test_batch_job_drops_inputs_when_finished(client, stubs, main, monkeypatch):
+    monkeypatch.setattr(main, "embed_queries", lambda texts: [[float(i)] for i in range(len(texts))])
+    monkeypatch.setattr(main, "query_passages", lambda vector, gene, view, k: [f"{view} passage for {gene}"])
+    monkeypatch.setattr(main, "annotation_jobs", {})
+    monkeypatch.setattr(main, "annotation_job_inputs", {})
+    with client:
+        job = client.post("/annotate-batch?k=1", json={"genes": ["tp53"]}).json()
+        for _ in range(100):
+            job = client.get(f"/annotate-batch/{job['job_id']}").json()
+            if job["status"] != "running":
+                break
+            time.sleep(0.05)
+        assert job["status"] == "done" and job["completed"] == 3 and job["failed"] == 0
+        assert main.annotation_job_inputs == {}
+        assert client.get(f"/annotate-batch/{job['job_id']}?include_results=true").status_code == 409
+
+
+def test_batch_job_skips_embedding_when_all_views_are_cached(client, stubs, main, monkeypatch):
+    def embed_queries(texts):
+        raise AssertionError("nothing to embed")
+
+    monkeypatch.setattr(main, "embed_queries", embed_queries)
+    monkeypatch.setattr(main, "annotation_jobs", {})
+    for view in VIEWS:
+        main.annotation_cache.put(main.annotation_key("TP53", view, 1), {"summary": view})
+    with client:
+        job = client.post("/annotate-batch?k=1", json={"genes": ["TP53"]}).json()
+        for _ in range(100):
+            job = client.get(f"/annotate-batch/{job['job_id']}").json()
+            if job["status"] != "running":
+                break
+            time.sleep(0.05)
+    assert job["status"] == "done" and job["cached"] == 3 and job["failed"] == 0
+
+
+def test_finished_batch_jobs_are_evicted_oldest_first(main, monkeypatch):
+    jobs = {f"job{i}": {"status": status} for i, status in enumerate(["done", "running", "failed", "done"])}
+    monkeypatch.setattr(main, "annotation_jobs", jobs)
+    main.evict_annotation_jobs(max_finished=1)
+    assert list(jobs) == ["job1", "job3"]
+
+
+@pytest.fixture
+def retriever(main):
+    """services.retriever, importable once main has set the upstream credentials."""
+    import services.retriever
+    return services.retriever
+
+
+@pytest.fixture
+def chat_stubs(main, retriever, tmp_path, monkeypatch):
+    """
+    Stub the embeddings request, vector search and the LLM for /chat, on
+    empty embedding and answer caches.
+    """
+    calls = {"embed": [], "query": [], "llm": 0}
+
+    def embed_texts(texts):
+        calls["embed"].append(texts)
+        return [[1.0, float(len(text))] for text in texts]
+
+    def query_passages(vector, gene, context, k):
+        calls["query"].append((vector, gene, context, k))
+        return [f"{gene} passage"]
+
+    def call_llm(prompt, **kwargs):
+        calls["llm"] += 1
+        return "answer"
+
+    def call_llm_stream(prompt, **kwargs):
+        calls["llm"] += 1
+        yield from ["ans", "wer"]
+
+    def get_passages(**kwargs):
+        raise AssertionError("the query vector should be reused")
+
+    monkeypatch.setattr(retriever, "embed_texts", embed_texts)
+    monkeypatch.setattr(retriever, "embedding_cache", EmbeddingCache(str(tmp_path / "embeddings.db")))
+    monkeypatch.setattr(main, "query_passages", query_passages)
+    monkeypatch.setattr(main, "get_passages", get_passages)
+    monkeypatch.setattr(main, "call_llm", call_llm)
+    monkeypatch.setattr(main, "call_llm_stream", call_llm_stream)
+    monkeypatch.setattr(main, "chat_cache", main.SemanticCache())
+    return calls
+
+
+def test_chat_embeds_once_and_reuses_the_query_vector(client, chat_stubs, main, retriever):
+    turn = {"gene": "TP53", "message": "What does it do?", "conversation_history": ""}
+    query = main.query_text("TP53", "general")
+    first = client.post("/chat", json=turn).json()
+    assert first["response"] == "answer" and not first["cached"]
+    assert chat_stubs["embed"] == [["What does it do?", query]]
+    assert chat_stubs["query"][0] == ([1.0, float(len(query))], "TP53", "general", 3)
+
+    # Only the query string is kept in the embedding cache
+    model = retriever.EMBEDDING_MODEL
+    assert retriever.embedding_cache.get_many(model, [query, "What does it do?"])[1] is None
+    assert len(retriever.embedding_cache) == 1
+
+    second = client.post("/chat", json=turn).json()
+    assert second["cached"] and second["response"] == "answer"
+    assert chat_stubs["embed"][1] == ["What does it do?"]
+    assert chat_stubs["llm"] == 1 and len(chat_stubs["query"]) == 1
+
+
+def test_chat_stream_shares_the_answer_cache(client, chat_stubs):
+    turn = {"gene": "TP53", "message": "What does it do?", "conversation_history": ""}
+    first = client.post("/chat/stream", json=turn).text
+    assert "event: passages" in first and 'event: done\ndata: "answer"' in first
+
+    second = client.post("/chat/stream", json=turn).text
+    assert second == 'event: done\ndata: "answer"\n\n'
+    assert client.post("/chat", json=turn).json()["cached"]
+    assert chat_stubs["llm"] == 1
@@ -0,0 +1,389 @@
+# workspace.py
+"""
+Per-session workspaces of named graphs.
+
+A session (the X-Session-ID header, or "default") owns a Workspace holding
+any number of named graphs, each as an original/current pair of CompactGraphs,
+plus its expression data and the caches derived from its graphs. New
+workspaces start with the empty graphs "0" and "1", the two slots the
+frontend uses.
+
+WorkspaceStore keeps recently used workspaces in memory within a byte budget.
+Workspaces idle for longer than `idle_seconds`, or the least recently used
+ones once the budget is exceeded, are serialized and dropped from memory;
+workspaces in use by a request are never evicted. Serialized workspaces live
+in a backend:
+  - DirectoryBackend: one file per session in a spill directory. Used by a
+    single process; a workspace is only written when it is evicted.
+  - SQLiteBackend: a key/value table in a WAL-mode SQLite file, standing in
+    for Redis when several server processes on one host share sessions.
+  - RedisBackend: the same on a Redis server (needs the `redis` package).
+With a shared backend (SQLite, Redis) every change is written through and
+stamped with a revision, and a process reloads its in-memory copy when
+another process wrote a newer revision. Concurrent writes to the same session
+from different processes are last-writer-wins.
+
+Serialized workspaces use numpy's .npz container (no pickle): the CSR arrays,
+gene tables and packed removal masks of each graph, plus a JSON header with
+the graph names and expression data.
+"""
+import io
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from graph_store import CompactGraph
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+DEFAULT_SESSION = "default"
+DEFAULT_GRAPHS = ("0", "1")
+WORKSPACE_MEMORY_BYTES = int(os.getenv("WORKSPACE_MEMORY_MB", "1024")) * 1024 * 1024
+WORKSPACE_IDLE_SECONDS = float(os.getenv("WORKSPACE_IDLE_SECONDS", "1800"))
+FORMAT_VERSION = 1
+
+# Session ids and graph names double as file names and store keys
+NAME_PATTERN = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+
+# Rough per-gene cost of the gene table (str object plus gene_index entry)
+GENE_OVERHEAD_BYTES = 120
+
+
+def valid_name(name):
+    return isinstance(name, str) and bool(NAME_PATTERN.match(name)) and name not in (".", "..")
+
+
+class Workspace:
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.original_graphs = {name: CompactGraph.empty() for name in DEFAULT_GRAPHS}
+        self.current_graphs = {name: graph.copy() for name, graph in self.original_graphs.items()}
+        self.expression_data = {}  # graph name -> {gene: {sample: value}}
+        self.upload_progress = {}  # graph name -> status of its latest upload (not serialized)
+        self.revision = None  # revision in a shared backend
+        self.last_used = time.monotonic()
+        self.users = 0
+        self.dirty = False
+
+        # Derived results, keyed like the module-level caches they replace
+        self.graphlet_cache = {}  # (graph name, size) -> (version, result)
+        self.orbit_cache = {}  # graph name -> (version, (node ids, GDV matrix))
+        self.metrics_cache = {}  # ("original", graph name) -> (version, metrics)
+        self.degree_order_cache = {}  # graph name -> (version, (sorted degrees, gene ids))
+        self.symbol_index_cache = {}  # graph name -> (gene table, index)
+        self.shared_genes_cache = {}  # (name1, name2) -> (version1, version2, shared gene set)
+        self.diff_cache = {}  # (name1, name2) -> (version1, version2, NetworkDiff)
+
+    def names(self):
+        return list(self.current_graphs)
+
+    def set_graph(self, name, graph):
+        """Store a freshly uploaded graph; the current graph shares its CSR arrays."""
+        self.original_graphs[name] = graph
+        self.current_graphs[name] = graph.copy()
+        self.dirty = True
+
+    def remove_node(self, name, gene):
+        removed = self.current_graphs[name].remove_node(gene)
+        self.dirty = self.dirty or removed
+        return removed
+
+    def reset_graph(self, name):
+        self.current_graphs[name] = self.original_graphs[name].copy()
+        self.dirty = True
+
+    def delete_graph(self, name):
+        del self.original_graphs[name]
+        del self.current_graphs[name]
+        self.expression_data.pop(name, None)
+        self.upload_progress.pop(name, None)
+        self.dirty = True
+
+    def set_expression(self, name, payload):
+        self.expression_data[name] = payload
+        self.dirty = True
+
+    @property
+    def nbytes(self):
+        """Approximate memory held by the graphs (shared arrays counted once)."""
+        seen = set()
+        total = 0
+        for graph in list(self.original_graphs.values()) + list(self.current_graphs.values()):
+            for array in (graph.indptr, graph.indices, graph.weights, graph.cancer_drivers,
+                          graph.alive, graph.degree):
+                if id(array) not in seen:
+                    seen.add(id(array))
+                    total += array.nbytes
+            if id(graph.genes) not in seen:
+                seen.add(id(graph.genes))
+                total += GENE_OVERHEAD_BYTES * len(graph.genes)
+        return total
+
+    def to_bytes(self):
+        arrays = {}
+        header = {"format": FORMAT_VERSION, "graphs": [], "expression_data": self.expression_data}
+        for i, name in enumerate(self.current_graphs):
+            original, current = self.original_graphs[name], self.current_graphs[name]
+            shared = current.indptr is original.indptr and current.genes is original.genes
+            header["graphs"].append({"name": name, "shared": shared})
+            for role, graph in (("o", original), ("c", current)):
+                if role == "o" or not shared:
+                    arrays[f"{i}.{role}.genes"] = np.frombuffer("\n".join(graph.genes).encode("utf-8"), dtype=np.uint8)
+                    arrays[f"{i}.{role}.indptr"] = graph.indptr
+                    arrays[f"{i}.{role}.indices"] = graph.indices
+                    arrays[f"{i}.{role}.weights"] = graph.weights
+                    arrays[f"{i}.{role}.cancer_drivers"] = graph.cancer_drivers
+                arrays[f"{i}.{role}.alive"] = np.packbits(graph.alive)
+        arrays["header"] = np.frombuffer(json.dumps(header).encode("utf-8"), dtype=np.uint8)
+        buffer = io.BytesIO()
+        np.savez(buffer, **arrays)
+        return buffer.getvalue()
+
+    @classmethod
+    def from_bytes(cls, session_id, data):
+        workspace = cls(session_id)
+        with np.load(io.BytesIO(data), allow_pickle=False) as arrays:
+            header = json.loads(arrays["header"].tobytes().decode("utf-8"))
+            if header.get("format") != FORMAT_VERSION:
+                raise ValueError(f"Unsupported workspace format {header.get('format')}")
+
+            def restore(prefix, base=None):
+                if base is None:
+                    text = arrays[f"{prefix}.genes"].tobytes().decode("utf-8")
+                    base = CompactGraph(text.split("\n") if text else [], arrays[f"{prefix}.indptr"],
+                                        arrays[f"{prefix}.indices"], arrays[f"{prefix}.weights"],
+                                        arrays[f"{prefix}.cancer_drivers"])
+                alive = np.unpackbits(arrays[f"{prefix}.alive"], count=len(base.genes)).astype(bool)
+                return base if alive.all() else base.with_alive(alive)
+
+            workspace.original_graphs, workspace.current_graphs = {}, {}
+            for i, entry in enumerate(header["graphs"]):
+                original = restore(f"{i}.o")
+                if entry["shared"]:
+                    current = restore(f"{i}.c", base=original)
+                    current = current.copy() if current is original else current
+                else:
+                    current = restore(f"{i}.c")
+                workspace.original_graphs[entry["name"]] = original
+                workspace.current_graphs[entry["name"]] = current
+        workspace.expression_data = header["expression_data"]
+        return workspace
+
+
+class DirectoryBackend:
+    """Serialized workspaces as `<session>.npz` files, for a single process."""
+    shared = False
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, session_id):
+        return os.path.join(self.directory, f"{session_id}.npz")
+
+    def load(self, session_id):
+        """(revision, data) of a stored workspace, or None."""
+        try:
+            with open(self._path(session_id), "rb") as f:
+                return None, f.read()
+        except FileNotFoundError:
+            return None
+
+    def revision(self, session_id):
+        return None
+
+    def store(self, session_id, data):
+        tmp = f"{self._path(session_id)}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, self._path(session_id))
+        return None
+
+    def delete(self, session_id):
+        try:
+            os.remove(self._path(session_id))
+        except FileNotFoundError:
+            pass
+
+
+class SQLiteBackend:
+    """
+    Key/value store in a WAL-mode SQLite file, shared by the processes of one
+    host: a local stand-in for RedisBackend.
+    """
+    shared = True
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS workspaces ("
+                         "session TEXT PRIMARY KEY, revision INTEGER NOT NULL, data BLOB NOT NULL)")
+
+    def load(self, session_id):
+        with self._lock:
+            row = self._db.execute("SELECT revision, data FROM workspaces WHERE session = ?",
+                                   (session_id,)).fetchone()
+        return None if row is None else (row[0], bytes(row[1]))
+
+    def revision(self, session_id):
+        with self._lock:
+            row = self._db.execute("SELECT revision FROM workspaces WHERE session = ?", (session_id,)).fetchone()
+        return None if row is None else row[0]
+
+    def store(self, session_id, data):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute(
+                    "INSERT INTO workspaces (session, revision, data) VALUES (?, 1, ?) "
+                    "ON CONFLICT(session) DO UPDATE SET revision = revision + 1, data = excluded.data",
+                    (session_id, data))
+                revision = self._db.execute("SELECT revision FROM workspaces WHERE session = ?",
+                                            (session_id,)).fetchone()[0]
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return revision
+
+    def delete(self, session_id):
+        with self._lock:
+            self._db.execute("DELETE FROM workspaces WHERE session = ?", (session_id,))
+
+
+class RedisBackend:
+    """Workspaces in Redis: `<prefix><session>` holds the data, `...:rev` its revision."""
+    shared = True
+
+    def __init__(self, url, prefix="netcancer:workspace:"):
+        if redis is None:
+            raise RuntimeError("The redis package is required for WORKSPACE_BACKEND=redis")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def load(self, session_id):
+        data, revision = self.client.mget(self.prefix + session_id, f"{self.prefix}{session_id}:rev")
+        return None if data is None else (int(revision or 0), data)
+
+    def revision(self, session_id):
+        revision = self.client.get(f"{self.prefix}{session_id}:rev")
+        return None if revision is None else int(revision)
+
+    def store(self, session_id, data):
+        pipeline = self.client.pipeline(transaction=True)
+        pipeline.set(self.prefix + session_id, data)
+        pipeline.incr(f"{self.prefix}{session_id}:rev")
+        return pipeline.execute()[1]
+
+    def delete(self, session_id):
+        self.client.delete(self.prefix + session_id, f"{self.prefix}{session_id}:rev")
+
+
+def backend_from_env():
+    """The backend named by WORKSPACE_BACKEND: "memory" (default), "sqlite" or "redis"."""
+    kind = os.getenv("WORKSPACE_BACKEND", "memory")
+    if kind == "sqlite":
+        return SQLiteBackend(os.getenv("WORKSPACE_DB", "workspaces.db"))
+    if kind == "redis":
+        return RedisBackend(os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+    if kind != "memory":
+        raise ValueError(f"Unknown WORKSPACE_BACKEND '{kind}'")
+    return DirectoryBackend(os.getenv("WORKSPACE_SPILL_DIR", "workspace_spill"))
+
+
+class WorkspaceStore:
+    def __init__(self, backend, memory_budget=WORKSPACE_MEMORY_BYTES, idle_seconds=WORKSPACE_IDLE_SECONDS):
+        self.backend = backend
+        self.memory_budget = memory_budget
+        self.idle_seconds = idle_seconds
+        self.loads = 0
+        self.evictions = 0
+        self._hot = OrderedDict()  # session id -> Workspace, least recently used first
+        self._lock = threading.Lock()
+
+    def acquire(self, session_id):
+        """
+        The workspace of a session, loaded or created as needed. It stays in
+        memory until the matching release().
+        """
+        with self._lock:
+            workspace = self._hot.get(session_id)
+            if workspace is not None and self.backend.shared and workspace.users == 0:
+                # Another process may have changed it since
+                if self.backend.revision(session_id) != workspace.revision:
+                    workspace = None
+            if workspace is None:
+                workspace = self._load(session_id)
+                self._hot[session_id] = workspace
+            self._hot.move_to_end(session_id)
+            workspace.users += 1
+            workspace.last_used = time.monotonic()
+            self._evict()
+            return workspace
+
+    def release(self, workspace):
+        """Done with a workspace; writes it through to a shared backend if it changed."""
+        if workspace.dirty and self.backend.shared:
+            workspace.dirty = False
+            workspace.revision = self.backend.store(workspace.session_id, workspace.to_bytes())
+        with self._lock:
+            workspace.users -= 1
+            workspace.last_used = time.monotonic()
+            self._evict()
+
+    def _load(self, session_id):
+        entry = self.backend.load(session_id)
+        if entry is None:
+            return Workspace(session_id)
+        revision, data = entry
+        try:
+            workspace = Workspace.from_bytes(session_id, data)
+        except Exception as e:
+            print(f"Discarding unreadable workspace of session {session_id}: {e}")
+            return Workspace(session_id)
+        workspace.revision = revision
+        self.loads += 1
+        if not self.backend.shared:
+            # The copy in memory is the only live one now, written back on eviction
+            self.backend.delete(session_id)
+            workspace.dirty = True
+        return workspace
+
+    def _evict(self):
+        now = time.monotonic()
+        total = sum(workspace.nbytes for workspace in self._hot.values())
+        for session_id, workspace in list(self._hot.items()):
+            if total <= self.memory_budget and now - workspace.last_used < self.idle_seconds:
+                break
+            if workspace.users:
+                continue
+            if workspace.dirty and not self.backend.shared:
+                self.backend.store(session_id, workspace.to_bytes())
+                workspace.dirty = False
+            del self._hot[session_id]
+            total -= workspace.nbytes
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": type(self.backend).__name__,
+                "sessions_in_memory": len(self._hot),
+                "memory_bytes": sum(workspace.nbytes for workspace in self._hot.values()),
+                "memory_budget_bytes": self.memory_budget,
+                "idle_seconds": self.idle_seconds,
+                "loads": self.loads,
+                "evictions": self.evictions,
+            }
@@ -1,6 +1,19 @@
 import axios from 'axios'
 
-const API = axios.create({ baseURL: 'https://netcancer-insight.onrender.com' })
+// Graphs are kept per session on the server; each browser keeps its own id
+const getSessionId = (): string => {
+  let sessionId = localStorage.getItem('netcancer-session-id');
+  if (!sessionId) {
+    sessionId = Math.random().toString(36).slice(2) + Date.now().toString(36);
+    localStorage.setItem('netcancer-session-id', sessionId);
+  }
+  return sessionId;
+};
+
+const API = axios.create({
+  baseURL: 'https://netcancer-insight.onrender.com',
+  headers: { 'X-Session-ID': getSessionId() }
+})
 
 // Add request interceptor for logging
 API.interceptors.request.use(request => {
@@ -46,6 +59,7 @@ export const uploadFileDirect = async (file: File, graphIndex: number) => {
   const response = await axios.post(`https://netcancer-insight.onrender.com/upload?graph_index=${graphIndex}`, formData, {
     headers: {
       'Content-Type': 'multipart/form-data',
+      'X-Session-ID': getSessionId(),
     },
   });
   return response;
@@ -76,22 +90,41 @@ export const removeGene = async (gene: string, graphIndex: number = 0) => {
   return response
 }
 
-export const getGraphletAnalysis = async (graphIndex: number = 0, size: number = 3) => {
+// mode 'approx' estimates 4-node graphlets by sampling, with confidence intervals;
+// refine: true samples again to narrow them
+export interface GraphletOptions {
+  mode?: 'exact' | 'approx'
+  maxError?: number
+  timeBudget?: number
+  refine?: boolean
+}
+
+const graphletParams = (options: GraphletOptions) => ({
+  mode: options.mode,
+  max_error: options.maxError,
+  time_budget: options.timeBudget,
+  refine: options.refine
+})
+
+export const getGraphletAnalysis = async (graphIndex: number = 0, size: number = 3, options: GraphletOptions = {}) => {
   const response = await API.get('/graphlet-analysis', { 
     params: { 
       graph_index: graphIndex,
-      size: size
+      size: size,
+      ...graphletParams(options)
     } 
   })
   return response
 }
 
-export const compareGraphlets = async (graphIndex1: number = 0, graphIndex2: number = 1, size: number = 3) => {
+export const compareGraphlets = async (graphIndex1: number = 0, graphIndex2: number = 1, size: number = 3,
+                                       options: GraphletOptions = {}) => {
   const response = await API.get('/compare-graphlets', { 
     params: { 
       graph_index1: graphIndex1,
       graph_index2: graphIndex2,
-      size: size
+      size: size,
+      ...graphletParams(options)
     } 
   })
   return response
@@ -114,6 +147,27 @@ export const getSharedGenes = async () => {
   return response
 }
 
+// One page of the graph 0 / graph 1 diff over their shared genes: view 'genes' ranks
+// genes by rewiring, 'gained' / 'lost' / 'reweighted' list the edges that differ
+export const getDifferentialNetwork = async (
+  view: 'genes' | 'gained' | 'lost' | 'reweighted' = 'genes',
+  offset: number = 0,
+  limit: number = 100,
+  sort: 'rewired_edges' | 'jaccard' | 'degree_change' = 'rewired_edges',
+  minWeightChange: number = 0
+) => {
+  const response = await API.get('/differential-network', {
+    params: {
+      view: view,
+      offset: offset,
+      limit: limit,
+      sort: sort,
+      min_weight_change: minWeightChange
+    }
+  })
+  return response
+}
+
 export const getGeneEnrichment = async (geneSymbol: string) => {
   const response = await API.get(`/gene-enrichment/${geneSymbol}`);
   return response;
@@ -134,6 +188,11 @@ export const getInteraction = async (gene1: string, gene2: string) => {
   return response;
 }
 
+export const getInteractionEvidence = async (graphIndex: number) => {
+  const response = await API.get(`/interaction-evidence/${graphIndex}`);
+  return response;
+}
+
 export const getExpressionData = async (graphIndex: number) => {
   return await API.get(`/expression-data/${graphIndex}`);
 };
@@ -147,6 +206,28 @@ export const getAllGeneAnnotations = async (gene: string, k: number = 5) => {
   return response;
 };
 
+export const startBatchAnnotation = async (genes: string[], k: number = 5) => {
+  const response = await API.post('/annotate-batch?k=' + k, { genes });
+  return response;
+};
+
+export const getBatchAnnotationJob = async (jobId: string, includeResults: boolean = false) => {
+  const response = await API.get(`/annotate-batch/${jobId}`, {
+    params: { include_results: includeResults }
+  });
+  return response;
+};
+
+export const getAnalyticsJob = async (jobId: string) => {
+  const response = await API.get(`/analytics-jobs/${jobId}`);
+  return response;
+};
+
+export const cancelAnalyticsJob = async (jobId: string) => {
+  const response = await API.delete(`/analytics-jobs/${jobId}`);
+  return response;
+};
+
 export const sendGeneChatMessage = async (gene: string, message: string, conversation_history: string) => {
   const response = await API.post('/chat', {
     gene,